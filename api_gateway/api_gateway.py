@@ -1,18 +1,35 @@
-from flask import Flask, jsonify
-from flask_pymongo import PyMongo
-from flask_restx import Api, Resource, fields
+from flask import request
+from flask_restx import Resource, fields
+import contextvars
 import os
 import requests
+import time
 import uuid
-from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from werkzeug.exceptions import HTTPException
 
+from cache import backend_from_env, cache_from_env
+from common.app import create_service
+from common.indexes import ensure_indexes
+from common.pagination import next_page_headers
+from common.serving import serve
+from common.validation import compile_validator
+from idempotency import IDEMPOTENCY_HEADER, INDEXES as IDEMPOTENCY_INDEXES, REPLAYED_HEADER, IdempotencyStore
+from load_shedding import ConcurrencyLimiter, init_load_shedding
+from order_pipeline import INDEXES as ORDER_JOB_INDEXES, JobQueue, PipelineWorkers
+from pricing import PriceSnapshot, SnapshotRefresher, order_total
+from upstream import client_from_env
 
 
-app = Flask(__name__)
-app.config['MONGO_URI'] = os.getenv("MONGO_URI")
-mongo = PyMongo(app)
 
-api = Api(app, title="API Gateway", version="1.0", doc="/")
+app, mongo, api = create_service(__name__, "gateway", "API Gateway")
+
+# The gateway mostly waits on upstreams, so each worker runs more threads than
+# the other services; requests past GATEWAY_MAX_INFLIGHT concurrent ones get an
+# immediate 503 (0 disables), leaving threads free to turn them away.
+GATEWAY_THREADS = 64
+concurrency_limiter = ConcurrencyLimiter(int(os.getenv("GATEWAY_MAX_INFLIGHT", "48")))
+init_load_shedding(app, concurrency_limiter, exempt_paths=("/metrics", "/stats", "/swagger.json"))
 
 gateway_ns = api.namespace('', description='API Gateway for order creation')
 
@@ -24,117 +41,499 @@ INVENTORY_SERVICE_URL = os.getenv("INVENTORY_SERVICE_URL")
 ORDER_SERVICE_URL = os.getenv("ORDER_SERVICE_URL")
 PAYMENT_SERVICE_URL =os.getenv("PAYMENT_SERVICE_URL")
 
+# Shared keep-alive connection pools, one per upstream service. Unless
+# <NAME>_MAX_CONCURRENT says otherwise, each upstream may have as many calls in
+# flight as the gateway admits requests, so a healthy burst is never turned
+# away by the bulkhead; a slow upstream is cut off by its breaker instead.
+UPSTREAM_MAX_CONCURRENT = concurrency_limiter.max_in_flight or GATEWAY_THREADS
+upstreams = {
+    "customer": client_from_env("customer", CUSTOMER_SERVICE_URL, UPSTREAM_MAX_CONCURRENT),
+    "product": client_from_env("product", PRODUCT_SERVICE_URL, UPSTREAM_MAX_CONCURRENT),
+    "inventory": client_from_env("inventory", INVENTORY_SERVICE_URL, UPSTREAM_MAX_CONCURRENT),
+    "order": client_from_env("order", ORDER_SERVICE_URL, UPSTREAM_MAX_CONCURRENT),
+    "payment": client_from_env("payment", PAYMENT_SERVICE_URL, UPSTREAM_MAX_CONCURRENT),
+}
+
+# Customer and catalog records change rarely. The owning services call
+# /cache/invalidate on writes; the TTL bounds staleness if a notification is lost.
+cache_backend = backend_from_env()
+caches = {
+    "customer": cache_from_env("customer", 60, cache_backend),
+    "product": cache_from_env("product", 300, cache_backend),
+}
+
+# Order validation queries the customer, product and inventory services
+# concurrently on a bounded pool shared by all requests of this process.
+FANOUT_MAX_WORKERS = int(os.getenv("GATEWAY_FANOUT_WORKERS", "16"))
+ORDER_VALIDATION_DEADLINE = float(os.getenv("ORDER_VALIDATION_DEADLINE", "5.0"))
+# Product IDs per /products/batch call; the product service caps a batch at its MAX_BATCH_SIZE.
+PRODUCT_BATCH_SIZE = int(os.getenv("MAX_BATCH_SIZE", "1000"))
+
+fanout_executor = ThreadPoolExecutor(max_workers=FANOUT_MAX_WORKERS, thread_name_prefix="gateway-fanout")
+
+def submit_fanout(fn, *args):
+    """Run ``fn`` on the fan-out pool within a copy of the current context, so the
+    request ID and timing spans follow the call onto the worker thread."""
+    return fanout_executor.submit(contextvars.copy_context().run, fn, *args)
+
+# Responses to POST /create-order are stored per Idempotency-Key, so a client
+# retrying after a timeout gets the original result instead of a second order.
+idempotency = IdempotencyStore(
+    lambda: mongo.db.idempotency_keys,
+    ttl=float(os.getenv("IDEMPOTENCY_TTL", "86400")),
+    lock_timeout=float(os.getenv("IDEMPOTENCY_LOCK_TIMEOUT", "60")),
+)
+
+INDEXES = {
+    "idempotency_keys": IDEMPOTENCY_INDEXES,
+    "order_jobs": ORDER_JOB_INDEXES,
+}
+
+# Orders are priced from an in-memory copy of the catalog's prices kept current
+# from the product change feed. Products missing from it, or every product
+# while it is older than PRICE_SNAPSHOT_MAX_STALENESS, are fetched instead.
+price_snapshot = PriceSnapshot(max_staleness=float(os.getenv("PRICE_SNAPSHOT_MAX_STALENESS", "60")))
+price_refresher = SnapshotRefresher(
+    price_snapshot,
+    upstreams["product"],
+    interval=float(os.getenv("PRICE_REFRESH_INTERVAL", "5")),
+    full_sync_interval=float(os.getenv("PRICE_FULL_SYNC_INTERVAL", "3600")),
+    overlap=float(os.getenv("PRICE_FEED_OVERLAP", "5")),
+)
+
+def start_background_tasks():
+    price_refresher.start()
+    order_pipeline.start()
+
 # Order model
 order_model = api.model('Order', {
     'customer_id': fields.String(required=True, description='Customer ID'),
     'products': fields.List(fields.Raw, required=True, description='List of products with product_id and quantity'),
     'total_amount': fields.Float(required=True, description='Total order amount'),
     'status': fields.String(required=True, description='Order status'),
-    'timestamp': fields.String(required=True, description='Order creation timestamp (ISO 8601)'),
-    'updated': fields.String(required=True, description='Last updated timestamp (ISO 8601)'),
+    'timestamp': fields.DateTime(required=True, description='Order creation timestamp (ISO 8601)'),
+    'updated': fields.DateTime(required=True, description='Last updated timestamp (ISO 8601)'),
     'confirmed': fields.Boolean(required=True, description='Order confirmation status'),
     'tracking_numbers': fields.List(fields.String, required=True, description='Tracking numbers')
 })
+validate_order = compile_validator(order_model)
+
+cache_invalidation_model = api.model('CacheInvalidation', {
+    'cache': fields.String(required=True, description='Cache name (customer or product)'),
+    'keys': fields.List(fields.String, required=True, description='Keys to invalidate')
+})
+
+def cached_lookup(name, path, key, timeout=None):
+    """Return (body, status) for a GET on the named upstream; only 200 responses are cached."""
+    def load():
+        response = upstreams[name].get(path, timeout=timeout)
+        return response.json(), response.status_code
+    return caches[name].get_or_load(key, load, cache_if=lambda result: result[1] == 200)
+
+def check_customer(customer_id, timeout):
+    try:
+        body, status = cached_lookup("customer", f"/customers/{customer_id}", customer_id, timeout)
+        customer_data = body if status < 400 else None
+    except requests.RequestException:
+        api.abort(503, "Customer service unavailable")
+    if not customer_data:
+        api.abort(400, "Invalid customer ID")
+    return customer_data
+
+def fetch_products(product_ids, timeout):
+    cache = caches["product"]
+    products_by_id = {}
+    missing = []
+    for product_id in dict.fromkeys(product_ids):
+        cached = cache.get(product_id)
+        if cached is not None:
+            products_by_id[product_id] = cached[0]
+        else:
+            missing.append(product_id)
+    if not missing:
+        return products_by_id
+
+    fetched = {}
+    try:
+        for start in range(0, len(missing), PRODUCT_BATCH_SIZE):
+            response = upstreams["product"].post(
+                "/products/batch", json={"product_ids": missing[start:start + PRODUCT_BATCH_SIZE]}, timeout=timeout)
+            response.raise_for_status()
+            fetched.update(response.json())
+    except requests.RequestException:
+        api.abort(503, "Product or inventory service unavailable")
+    for product_id, product_data in fetched.items():
+        products_by_id[product_id] = product_data
+        if product_data:
+            cache.set(product_id, (product_data, 200))
+    return products_by_id
+
+def reserve_stock(products, order_id):
+    """Reserve stock for the whole cart; returns the reservation ID."""
+    items = [{"product_id": product['product_id'], "quantity": product.get('quantity', 1)} for product in products]
+    try:
+        response = upstreams["inventory"].post("/inventory/reservations", json={"items": items, "reference": order_id})
+    except requests.RequestException:
+        api.abort(503, "Product or inventory service unavailable")
+    if response.status_code == 409:
+        api.abort(400, f"Product out of stock: {response.json().get('product_id')}")
+    if response.status_code == 400:
+        api.abort(400, response.json().get('message', "Invalid order items"))
+    if not response.ok:
+        api.abort(503, "Product or inventory service unavailable")
+    return response.json()['reservation_id']
+
+def finish_reservation(reservation_id, action):
+    """Commit or release a reservation; if this fails the reservation expires on its own."""
+    try:
+        response = upstreams["inventory"].post(f"/inventory/reservations/{reservation_id}/{action}")
+        if not response.ok:
+            app.logger.warning("Could not %s reservation %s: %s", action, reservation_id, response.status_code)
+    except requests.RequestException:
+        app.logger.warning("Could not %s reservation %s: inventory service unavailable", action, reservation_id)
+
+def parse_order(args):
+    """Check an order request and return the order fields the pipeline stages use."""
+    try:
+        args = validate_order(args)
+    except ValueError as exc:
+        api.abort(400, str(exc))
+
+    products = args['products']
+    if not products:
+        api.abort(400, "An order needs at least one product")
+    for product in products:
+        if not isinstance(product, dict) or 'product_id' not in product:
+            api.abort(400, "Each product requires a product_id")
+        quantity = product.get('quantity', 1)
+        if not isinstance(quantity, int) or isinstance(quantity, bool) or quantity < 1:
+            api.abort(400, f"Invalid quantity for product {product['product_id']}")
+
+    return {
+        "customer_id": args["customer_id"],
+        "products": products,
+        "status": args["status"],
+        "timestamp": args["timestamp"].isoformat(),
+        "updated": args["updated"].isoformat(),
+        "confirmed": args["confirmed"],
+        "tracking_numbers": args["tracking_numbers"]
+    }
+
+def price_order(order):
+    """Check the customer exists and return the cart total."""
+    # One customer lookup and, for products the price snapshot does not cover,
+    # one product batch lookup.
+    products = order['products']
+    product_ids = [product['product_id'] for product in products]
+    prices, _ = price_snapshot.lookup(product_ids)
+    missing = [product_id for product_id in dict.fromkeys(product_ids) if product_id not in prices]
+    deadline = time.monotonic() + ORDER_VALIDATION_DEADLINE
+    checks = [submit_fanout(check_customer, order['customer_id'], ORDER_VALIDATION_DEADLINE)]
+    if missing:
+        checks.append(submit_fanout(fetch_products, missing, ORDER_VALIDATION_DEADLINE))
+
+    # Results are consumed in submission order so the first error reported
+    # is the same one the sequential checks would have hit.
+    results = []
+    try:
+        for check in checks:
+            results.append(check.result(timeout=max(deadline - time.monotonic(), 0)))
+    except FutureTimeoutError:
+        api.abort(503, "Order validation timed out")
+    finally:
+        for check in checks:
+            check.cancel()
+    products_by_id = results[1] if missing else {}
+
+    for product_id in missing:
+        product_data = products_by_id.get(product_id)
+        if not product_data:
+            api.abort(400, f"Invalid product ID: {product_id}")
+        prices[product_id] = product_data.get('price', 0)
+    return order_total(products, prices)
+
+def persist_order(order, order_id, total_amount, idempotency_key=None):
+    """Store the order with the order service; returns (stored document, whether it was stored before)."""
+    order_data = dict(order, order_id=order_id, total_amount=total_amount)
+    try:
+        # The order service dedupes on the key too, covering a retry whose
+        # first attempt stored the order but never got its response back.
+        headers = {IDEMPOTENCY_HEADER: idempotency_key} if idempotency_key else None
+        order_response = upstreams["order"].post("/orders/", json=order_data, headers=headers)
+    except requests.RequestException:
+        api.abort(503, "Order service unavailable")
+    if order_response.status_code == 422:
+        api.abort(422, order_response.json().get('message', "Idempotency-Key was already used"))
+    if not order_response.ok:
+        api.abort(500, "Failed to create order")
+    return order_response.json(), order_response.headers.get(REPLAYED_HEADER) == "true"
+
+def create_payment(order, stored_order, idempotency_key=None):
+    """Open a pending payment for a stored order and return the payment document."""
+    payment_data = {
+        "order_id": stored_order["order_id"],
+        "amount": stored_order["total_amount"],
+        "status": "pending",
+        "timestamp": order["timestamp"],
+        "updated": order["updated"],
+        "expired": False,
+        "payment_methods": [],
+    }
+    try:
+        headers = {IDEMPOTENCY_HEADER: idempotency_key} if idempotency_key else None
+        payment_response = upstreams["payment"].post("/payments/", json=payment_data, headers=headers)
+    except requests.RequestException:
+        api.abort(503, "Payment service unavailable")
+    if not payment_response.ok:
+        api.abort(500, "Failed to create payment")
+    return payment_response.json()
+
+def create_order(args, idempotency_key=None):
+    """Validate, reserve and persist one order; returns (body, status)."""
+    order = parse_order(args)
+    order_id = str(uuid.uuid4())
+    total_amount = price_order(order)
+    reservation_id = reserve_stock(order['products'], order_id)
+    try:
+        stored, replayed = persist_order(order, order_id, total_amount, idempotency_key)
+    except HTTPException:
+        finish_reservation(reservation_id, "release")
+        raise
+    # A replayed order took its stock when it was first created.
+    finish_reservation(reservation_id, "release" if replayed else "commit")
+
+    return {
+        "order_id": stored["order_id"],
+        "total_amount": stored["total_amount"],
+        "status": "order created"
+    }, 201
+
+# Asynchronous order creation: the request is checked and queued, and the
+# pipeline workers run the remaining stages, checkpointing after each one.
+def validate_stage(context):
+    return {"total_amount": price_order(context["order"])}
+
+def reserve_stage(context):
+    return {"reservation_id": reserve_stock(context["order"]["products"], context["job_id"])}
+
+def persist_stage(context):
+    # The job ID doubles as the idempotency key, so a retried stage finds the
+    # order or payment stored by the attempt that lost its response. That
+    # attempt held the same reservation, so it is committed either way.
+    stored, _ = persist_order(context["order"], context["job_id"], context["total_amount"], context["job_id"])
+    finish_reservation(context["reservation_id"], "commit")
+    return {"stored_order": stored, "order_id": stored["order_id"], "total_amount": stored["total_amount"]}
+
+def payment_stage(context):
+    payment = create_payment(context["order"], context["stored_order"], context["job_id"])
+    return {"payment_id": payment["payment_id"]}
+
+def compensate_order(context):
+    """Release stock held by a job that stopped before its order was stored."""
+    if context.get("reservation_id") and not context.get("order_id"):
+        finish_reservation(context["reservation_id"], "release")
+
+def is_retryable(exc):
+    return isinstance(exc, requests.RequestException) or (isinstance(exc, HTTPException) and exc.code >= 500)
+
+ORDER_PIPELINE_MODE = os.getenv("ORDER_PIPELINE_MODE", "sync")
+order_jobs = JobQueue(
+    lambda: mongo.db.order_jobs,
+    lease_seconds=float(os.getenv("ORDER_JOB_LEASE", "30")),
+    max_attempts=int(os.getenv("ORDER_JOB_MAX_ATTEMPTS", "5")),
+    max_backoff=float(os.getenv("ORDER_JOB_MAX_BACKOFF", "60")),
+)
+order_pipeline = PipelineWorkers(
+    order_jobs,
+    [("validate", validate_stage), ("reserve", reserve_stage), ("persist", persist_stage), ("payment", payment_stage)],
+    is_retryable,
+    compensate=compensate_order,
+    workers=int(os.getenv("ORDER_PIPELINE_WORKERS", "4")),
+    poll_interval=float(os.getenv("ORDER_QUEUE_POLL_INTERVAL", "0.5")),
+)
+
+def wants_async():
+    prefer = request.headers.get("Prefer", "")
+    return ORDER_PIPELINE_MODE == "async" or "respond-async" in prefer
+
+def enqueue_order(args):
+    """Check the request and queue it for the pipeline; returns (body, status, headers)."""
+    order = parse_order(args)
+    job_id = str(uuid.uuid4())
+    order_jobs.enqueue(order_pipeline.first_stage, {"job_id": job_id, "order": order}, job_id=job_id)
+    order_pipeline.notify()
+    status_url = api.url_for(OrderJobStatus, job_id=job_id)
+    return {"job_id": job_id, "status": "accepted", "status_url": status_url}, 202, {"Location": status_url}
+
+def job_view(job):
+    context = job.get("context", {})
+    view = {
+        "job_id": job["job_id"],
+        "state": job["state"],
+        "stage": job["stage"],
+        "attempts": job["attempts"],
+        "error": job.get("error"),
+        "created": job["created"],
+        "updated": job["updated"],
+    }
+    for field in ("order_id", "total_amount", "payment_id"):
+        if field in context:
+            view[field] = context[field]
+    return view
 
 @gateway_ns.route('/create-order')
 class OrderCreation(Resource):
     @gateway_ns.expect(order_model)
-    @gateway_ns.doc('create_order')
+    @gateway_ns.doc('create_order', params={IDEMPOTENCY_HEADER: {
+        'in': 'header', 'description': 'Client-chosen key; retries with the same key replay the first response'}})
     def post(self):
-        args = api.payload
-        required_fields = ['customer_id', 'products', 'total_amount', 'status', 'timestamp', 'updated', 'confirmed', 'tracking_numbers']
-        for field in required_fields:
-            if field not in args:
-                api.abort(400, f"Missing required field: {field}")
-        args['order_id'] = str(uuid.uuid4())
-        try:
-            timestamp = datetime.fromisoformat(args['timestamp'])
-            updated = datetime.fromisoformat(args['updated'])
-        except (ValueError, TypeError):
-            api.abort(400, "Invalid timestamp or updated format. Use ISO 8601.")
+        """Create an order, or with Prefer: respond-async queue it and return 202"""
+        idempotency_key = request.headers.get(IDEMPOTENCY_HEADER)
+        if wants_async():
+            handler = lambda: enqueue_order(api.payload)
+        else:
+            handler = lambda: create_order(api.payload, idempotency_key)
+        if idempotency_key is None:
+            return handler()
+        return idempotency.run(idempotency_key, handler)
 
-        try:
-            customer_response = requests.get(f"{CUSTOMER_SERVICE_URL}/customers/{args['customer_id']}")
-            if not customer_response.ok or not customer_response.json():
-                api.abort(400, "Invalid customer ID")
-        except requests.RequestException:
-            api.abort(503, "Customer service unavailable")
+@gateway_ns.route('/order-jobs/<job_id>')
+class OrderJobStatus(Resource):
+    @gateway_ns.doc('order_job_status')
+    def get(self, job_id):
+        """Progress of an order accepted for asynchronous creation"""
+        job = order_jobs.get(job_id)
+        if not job:
+            api.abort(404, "Order job not found")
+        return job_view(job), 200
 
-        total_amount = 0
-        for product in args['products']:
-            try:
-                product_response = requests.get(f"{PRODUCT_SERVICE_URL}/products/{product['product_id']}")
-                if not product_response.ok or not product_response.json():
-                    api.abort(400, f"Invalid product ID: {product['product_id']}")
-                product_data = product_response.json()
-                total_amount += product_data.get('price', 0)
-
-                inventory_response = requests.get(f"{INVENTORY_SERVICE_URL}/inventory/{product['product_id']}")
-                if not inventory_response.ok or not inventory_response.json() or inventory_response.json().get('stock', 0) <= 0:
-                    api.abort(400, f"Product out of stock: {product['product_id']}")
-            except requests.RequestException:
-                api.abort(503, "Product or inventory service unavailable")
-
-        order_data = {
-            "order_id": args["order_id"],
-            "customer_id": args["customer_id"],
-            "products": args["products"],
-            "total_amount": total_amount,
-            "status": args["status"],
-            "timestamp": timestamp.isoformat(),
-            "updated": updated.isoformat(),
-            "confirmed": args["confirmed"],
-            "tracking_numbers": args["tracking_numbers"]
-        }
+@gateway_ns.route('/order-jobs/dead-letter')
+class OrderJobDeadLetters(Resource):
+    @gateway_ns.doc('order_job_dead_letters', params={'limit': 'Maximum jobs to return (default 100)'})
+    def get(self):
+        """Order jobs that ran out of retries"""
         try:
-            order_response = requests.post(f"{ORDER_SERVICE_URL}/orders", json=order_data)
-            if not order_response.ok:
-                api.abort(500, "Failed to create order")
-        except requests.RequestException:
-            api.abort(503, "Order service unavailable")
+            limit = min(int(request.args.get('limit', 100)), 1000)
+        except ValueError:
+            api.abort(400, "limit must be an integer")
+        return [job_view(job) for job in order_jobs.dead_letters(limit)], 200
 
-        return {
-            "order_id": args["order_id"],
-            "total_amount": total_amount,
-            "status": "order created"
-        }, 201
+@gateway_ns.route('/order-jobs/<job_id>/requeue')
+class OrderJobRequeue(Resource):
+    @gateway_ns.doc('requeue_order_job')
+    def post(self, job_id):
+        """Retry a dead-lettered order job from the stage it failed in"""
+        job = order_jobs.get(job_id)
+        # Stock held before the order was stored has been released, so such
+        # jobs start over instead of resuming at the failed stage.
+        stage = job["stage"] if job and "order_id" in job["context"] else order_pipeline.first_stage
+        if not order_jobs.requeue(job_id, stage):
+            api.abort(404, "No dead-lettered order job with this ID")
+        order_pipeline.notify()
+        return job_view(order_jobs.get(job_id)), 200
 
 @gateway_ns.route('/customers/<customer_id>')
 class CustomerLookup(Resource):
     def get(self, customer_id):
         try:
-            response = requests.get(f"{CUSTOMER_SERVICE_URL}/customers/{customer_id}")
-            return response.json(), response.status_code
+            return cached_lookup("customer", f"/customers/{customer_id}", customer_id)
         except requests.RequestException:
             api.abort(503, "Customer service unavailable")
 @gateway_ns.route('/products/<product_id>')
 class ProductLookup(Resource):
     def get(self, product_id):
         try:
-            response = requests.get(f"{PRODUCT_SERVICE_URL}/products/{product_id}")
-            return response.json(), response.status_code
+            return cached_lookup("product", f"/products/{product_id}", product_id)
+        except requests.RequestException:
+            api.abort(503, "Product service unavailable")
+@gateway_ns.route('/products/search')
+class ProductSearch(Resource):
+    @gateway_ns.doc(params={
+        'q': 'Words to match in the name or description',
+        'category': 'Category to match; repeat or comma-separate to match any of several',
+        'min_price': 'Lowest price to include',
+        'max_price': 'Highest price to include',
+        'expired': 'true or false',
+        'sort': 'price, -price or relevance',
+        'limit': 'Page size',
+        'after': 'Cursor from the X-Next-Cursor header of the previous page',
+        'fields': 'Comma-separated list of fields to return',
+    })
+    def get(self):
+        """Search the catalog; results are not cached, as product writes only invalidate single products"""
+        try:
+            response = upstreams["product"].get("/products/search", params=list(request.args.items(multi=True)))
         except requests.RequestException:
             api.abort(503, "Product service unavailable")
+        return response.json(), response.status_code, next_page_headers(response.headers.get("X-Next-Cursor"))
+
 @gateway_ns.route('/inventory/<product_id>')
 class InventoryCheck(Resource):
     def get(self, product_id):
         try:
-            response = requests.get(f"{INVENTORY_SERVICE_URL}/inventory/{product_id}")
+            response = upstreams["inventory"].get(f"/inventory/{product_id}")
             return response.json(), response.status_code
         except requests.RequestException:
             api.abort(503, "Inventory service unavailable")
             
 @gateway_ns.route('/orders/<customer_id>')
 class OrderLookup(Resource):
+    @gateway_ns.doc(params={'limit': 'Most recent orders to return'})
     def get(self, customer_id):
         try:
-            response = requests.get(f"{ORDER_SERVICE_URL}/orders/by_customer/{customer_id}")
+            response = upstreams["order"].get(f"/orders/by_customer/{customer_id}", params=request.args)
             return response.json(), response.status_code
         except requests.RequestException:
             api.abort(503, "Order service unavailable")
 
+@gateway_ns.route('/orders/<customer_id>/summary')
+class OrderSummaryLookup(Resource):
+    @gateway_ns.doc(params={'recent': 'Recent orders to include'})
+    def get(self, customer_id):
+        """Order count, total spend and most recent orders of a customer"""
+        try:
+            response = upstreams["order"].get(f"/orders/summary/{customer_id}", params=request.args)
+            return response.json(), response.status_code
+        except requests.RequestException:
+            api.abort(503, "Order service unavailable")
 
+@gateway_ns.route('/cache/invalidate')
+class CacheInvalidation(Resource):
+    @gateway_ns.expect(cache_invalidation_model)
+    @gateway_ns.doc('invalidate_cache')
+    def post(self):
+        """Drop cached entries after the owning service changed them"""
+        args = api.payload
+        if not isinstance(args, dict) or args.get('cache') not in caches:
+            api.abort(400, f"cache must be one of: {', '.join(caches)}")
+        keys = args.get('keys')
+        if not isinstance(keys, list) or not all(isinstance(key, str) for key in keys):
+            api.abort(400, "keys must be a list of strings")
+        for key in keys:
+            caches[args['cache']].invalidate(key)
+        return {"invalidated": len(keys)}, 200
+
+@gateway_ns.route('/pricing/snapshot')
+class PricingSnapshot(Resource):
+    @gateway_ns.doc('pricing_snapshot')
+    def get(self):
+        """Size, version and staleness of the in-memory price snapshot"""
+        return dict(price_snapshot.stats(), refresher=price_refresher.stats()), 200
+
+@gateway_ns.route('/stats')
+class GatewayStats(Resource):
+    @gateway_ns.doc('gateway_stats')
+    def get(self):
+        """Connection pool, retry, circuit breaker, cache and load shedding counters"""
+        return {
+            "upstreams": {name: client.stats() for name, client in upstreams.items()},
+            "caches": {name: cache.stats() for name, cache in caches.items()},
+            "idempotency": idempotency.stats(),
+            "order_pipeline": dict(order_pipeline.stats(), jobs=order_jobs.counts()),
+            "load_shedding": concurrency_limiter.stats(),
+        }, 200
 
 
 if __name__ == "__main__":
-    app.run(host="0.0.0.0", port=8000, debug=True)
\ No newline at end of file
+    serve(app, 8000, mongo=mongo, threads=GATEWAY_THREADS, on_startup=lambda: ensure_indexes(mongo.db, INDEXES),
+          on_worker_start=start_background_tasks)
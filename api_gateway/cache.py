@@ -0,0 +1,196 @@
+"""Read-through caching for upstream lookups.
+
+ReadThroughCache keeps a bounded in-process LRU with per-entry TTL in front of
+an optional shared backend. Concurrent misses for the same key are collapsed
+into a single upstream fetch.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+
+
+class InMemoryBackend:
+    """Process-local stand-in for a shared cache backend such as Redis.
+
+    A real backend only needs the same get/set/delete methods.
+    """
+
+    def __init__(self, clock=time.monotonic):
+        self._clock = clock
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at <= self._clock():
+                del self._data[key]
+                return None
+            return value
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._data[key] = (value, self._clock() + ttl)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+
+class ReadThroughCache:
+    def __init__(self, name, max_entries=1024, ttl=60.0, backend=None, clock=time.monotonic):
+        self.name = name
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.backend = backend
+        self._clock = clock
+        self._entries = OrderedDict()
+        self._loading = {}
+        self._generation = 0
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._expirations = 0
+        self._invalidations = 0
+        self._coalesced = 0
+
+    def _key(self, key):
+        return f"{self.name}:{key}"
+
+    def get(self, key):
+        """Return the cached value for ``key`` or None, without loading it."""
+        with self._lock:
+            value = self._get_local(key)
+        if value is None and self.backend is not None:
+            value = self.backend.get(self._key(key))
+            if value is not None:
+                with self._lock:
+                    self._store_local(key, value)
+        with self._lock:
+            if value is None:
+                self._misses += 1
+            else:
+                self._hits += 1
+        return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._store_local(key, value)
+        if self.backend is not None:
+            self.backend.set(self._key(key), value, self.ttl)
+
+    def get_or_load(self, key, loader, cache_if=None):
+        """Return the cached value for ``key``, calling ``loader()`` on a miss.
+
+        Only one caller per key runs the loader at a time; the others wait for
+        its result (or exception). Results rejected by ``cache_if`` are returned
+        but not stored.
+        """
+        with self._lock:
+            value = self._get_local(key)
+            if value is not None:
+                self._hits += 1
+                return value
+            generation = self._generation
+            pending = self._loading.get(key)
+            if pending is None:
+                pending = self._loading[key] = Future()
+                leader = True
+            else:
+                self._coalesced += 1
+                leader = False
+        if not leader:
+            return pending.result()
+
+        try:
+            value = self.backend.get(self._key(key)) if self.backend is not None else None
+            if value is not None:
+                with self._lock:
+                    self._hits += 1
+                    self._store_local(key, value)
+            else:
+                with self._lock:
+                    self._misses += 1
+                value = loader()
+                # Skip the store if an invalidation raced with the load.
+                if (cache_if is None or cache_if(value)) and generation == self._generation:
+                    self.set(key, value)
+        except BaseException as exc:
+            pending.set_exception(exc)
+            raise
+        else:
+            pending.set_result(value)
+            return value
+        finally:
+            with self._lock:
+                self._loading.pop(key, None)
+
+    def invalidate(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+            self._generation += 1
+            self._invalidations += 1
+        if self.backend is not None:
+            self.backend.delete(self._key(key))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def _get_local(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if expires_at <= self._clock():
+            del self._entries[key]
+            self._expirations += 1
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def _store_local(self, key, value):
+        self._entries[key] = (value, self._clock() + self.ttl)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self._evictions += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl": self.ttl,
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_rate": self._hits / lookups if lookups else 0.0,
+                "evictions": self._evictions,
+                "expirations": self._expirations,
+                "invalidations": self._invalidations,
+                "coalesced_loads": self._coalesced,
+            }
+
+
+def backend_from_env():
+    """Return the shared backend selected by ``CACHE_BACKEND``, or None for local-only caching."""
+    if os.getenv("CACHE_BACKEND") == "memory":
+        return InMemoryBackend()
+    return None
+
+
+def cache_from_env(name, default_ttl, backend=None):
+    """Build a ReadThroughCache configured from ``<NAME>_CACHE_TTL`` and ``CACHE_MAX_ENTRIES``."""
+    return ReadThroughCache(
+        name,
+        max_entries=int(os.getenv("CACHE_MAX_ENTRIES", "10000")),
+        ttl=float(os.getenv(f"{name.upper()}_CACHE_TTL", default_ttl)),
+        backend=backend,
+    )
@@ -0,0 +1,183 @@
+"""Idempotency-Key support for the gateway's non-idempotent endpoints.
+
+The first request carrying a key claims it in the ``idempotency_keys``
+collection and runs; its response is stored and replayed for every later
+request with the same key until the record expires. Requests that arrive while
+the first one is still running in this process wait for its result instead of
+running again, and ones that reach another process get a 409.
+"""
+import hashlib
+import json
+import threading
+from concurrent.futures import Future
+from datetime import datetime, timedelta
+
+from flask import request
+from pymongo import ASCENDING, IndexModel
+from pymongo.errors import DuplicateKeyError
+from werkzeug.exceptions import HTTPException
+
+IDEMPOTENCY_HEADER = "Idempotency-Key"
+REPLAYED_HEADER = "Idempotent-Replayed"
+MAX_KEY_LENGTH = 255
+
+INDEXES = [
+    IndexModel([("key", ASCENDING)], unique=True),
+    # Records are removed by the TTL monitor once expires_at has passed.
+    IndexModel([("expires_at", ASCENDING)], expireAfterSeconds=0),
+]
+
+
+def request_fingerprint():
+    """Hash of the method, path and JSON body, used to spot a key reused for a different request."""
+    body = json.dumps(request.get_json(silent=True), sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(f"{request.method} {request.path} {body}".encode()).hexdigest()
+
+
+def _call(handler):
+    """Run ``handler`` and return its (body, status, headers), turning aborts into responses."""
+    try:
+        body, status, *headers = handler()
+    except HTTPException as exc:
+        return getattr(exc, "data", None) or {"message": exc.description}, exc.code, {}
+    return body, status, dict(headers[0]) if headers else {}
+
+
+class IdempotencyStore:
+    """Claims, stores and replays responses by idempotency key.
+
+    ``collection`` is a callable returning the Mongo collection, so the store
+    follows the client being recreated after a fork. Server errors are not
+    stored: the claim is dropped so a retry runs the request again. A claim
+    left behind by a crashed process can be taken over after ``lock_timeout``.
+    """
+
+    def __init__(self, collection, ttl=86400.0, lock_timeout=60.0, clock=datetime.utcnow):
+        self.collection = collection
+        self.ttl = ttl
+        self.lock_timeout = lock_timeout
+        self._clock = clock
+        self._running = {}
+        self._lock = threading.Lock()
+        self._claimed = 0
+        self._replayed = 0
+        self._coalesced = 0
+        self._conflicts = 0
+
+    def run(self, key, handler):
+        """Return (body, status, headers) for the request identified by ``key``.
+
+        ``handler()`` returns (body, status) or (body, status, headers) and may
+        abort; it runs at most once per key while the stored response, headers
+        included, is live.
+        """
+        if not key or len(key) > MAX_KEY_LENGTH:
+            return {"message": f"{IDEMPOTENCY_HEADER} must be 1 to {MAX_KEY_LENGTH} characters"}, 400, {}
+        fingerprint = request_fingerprint()
+        with self._lock:
+            pending = self._running.get(key)
+            if pending is None:
+                pending = self._running[key] = Future()
+                leader = True
+            else:
+                self._coalesced += 1
+                leader = False
+        if not leader:
+            owner_fingerprint, body, status, headers = pending.result()
+            if owner_fingerprint != fingerprint:
+                return self._mismatch()
+            return body, status, dict(headers, **{REPLAYED_HEADER: "true"})
+
+        try:
+            result = self._run_once(key, fingerprint, handler)
+        except BaseException as exc:
+            pending.set_exception(exc)
+            raise
+        else:
+            pending.set_result(result)
+            return result[1:]
+        finally:
+            with self._lock:
+                self._running.pop(key, None)
+
+    def _run_once(self, key, fingerprint, handler):
+        record = self._claim(key, fingerprint)
+        if record is not None:
+            if record["fingerprint"] != fingerprint:
+                return (record["fingerprint"], *self._mismatch())
+            if record["state"] == "completed":
+                with self._lock:
+                    self._replayed += 1
+                return (fingerprint, record["body"], record["status"],
+                        dict(record.get("headers", {}), **{REPLAYED_HEADER: "true"}))
+            with self._lock:
+                self._conflicts += 1
+            return (fingerprint, {"message": "A request with this Idempotency-Key is still in progress"},
+                    409, {"Retry-After": "1"})
+
+        try:
+            body, status, headers = _call(handler)
+        except BaseException:
+            self.collection().delete_one({"key": key})
+            raise
+        if status >= 500:
+            self.collection().delete_one({"key": key})
+        else:
+            self.collection().update_one({"key": key}, {"$set": {
+                "state": "completed",
+                "status": status,
+                "body": body,
+                "headers": headers,
+                "expires_at": self._clock() + timedelta(seconds=self.ttl),
+            }})
+        return fingerprint, body, status, headers
+
+    def _claim(self, key, fingerprint):
+        """Claim ``key`` for this request; returns None on success or the existing record."""
+        collection = self.collection()
+        for _ in range(2):
+            now = self._clock()
+            try:
+                collection.insert_one({
+                    "key": key,
+                    "fingerprint": fingerprint,
+                    "state": "in_progress",
+                    "created": now,
+                    "locked_until": now + timedelta(seconds=self.lock_timeout),
+                    "expires_at": now + timedelta(seconds=self.ttl),
+                })
+                with self._lock:
+                    self._claimed += 1
+                return None
+            except DuplicateKeyError:
+                record = collection.find_one({"key": key})
+            if record is None:
+                # Expired and removed between the insert and the read.
+                continue
+            if (record["state"] == "in_progress" and record["fingerprint"] == fingerprint
+                    and record["locked_until"] <= now):
+                taken = collection.update_one(
+                    {"key": key, "state": "in_progress", "locked_until": record["locked_until"]},
+                    {"$set": {"locked_until": now + timedelta(seconds=self.lock_timeout)}},
+                )
+                if taken.modified_count:
+                    with self._lock:
+                        self._claimed += 1
+                    return None
+            return record
+        return record
+
+    def _mismatch(self):
+        with self._lock:
+            self._conflicts += 1
+        return {"message": f"{IDEMPOTENCY_HEADER} was already used for a different request"}, 422, {}
+
+    def stats(self):
+        with self._lock:
+            return {
+                "in_flight": len(self._running),
+                "claimed": self._claimed,
+                "replayed": self._replayed,
+                "coalesced": self._coalesced,
+                "conflicts": self._conflicts,
+            }
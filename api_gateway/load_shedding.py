@@ -0,0 +1,64 @@
+"""Concurrency limit for the gateway's request handlers.
+
+Requests beyond ``max_in_flight`` concurrent ones are turned away straight
+away with a 503 and ``Retry-After`` instead of queueing behind slow work, so
+the gateway keeps answering at its capacity while an upstream is struggling.
+"""
+import threading
+
+from flask import g, jsonify, request
+
+
+class ConcurrencyLimiter:
+    def __init__(self, max_in_flight):
+        self.max_in_flight = max_in_flight
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._peak_in_flight = 0
+        self._admitted = 0
+        self._shed = 0
+
+    def try_acquire(self):
+        with self._lock:
+            if self.max_in_flight and self._in_flight >= self.max_in_flight:
+                self._shed += 1
+                return False
+            self._in_flight += 1
+            self._admitted += 1
+            self._peak_in_flight = max(self._peak_in_flight, self._in_flight)
+            return True
+
+    def release(self):
+        with self._lock:
+            self._in_flight -= 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                "max_in_flight": self.max_in_flight,
+                "in_flight": self._in_flight,
+                "peak_in_flight": self._peak_in_flight,
+                "admitted": self._admitted,
+                "shed": self._shed,
+            }
+
+
+def init_load_shedding(app, limiter, exempt_paths=(), retry_after=1):
+    """Admit requests to ``app`` through ``limiter``; ``exempt_paths`` (e.g. health and metrics) always pass."""
+
+    @app.before_request
+    def admit_request():
+        if request.path in exempt_paths:
+            return None
+        if not limiter.try_acquire():
+            response = jsonify(message="Gateway is at capacity, retry shortly")
+            response.status_code = 503
+            response.headers["Retry-After"] = str(retry_after)
+            return response
+        g.load_shedding_admitted = True
+        return None
+
+    @app.teardown_request
+    def release_request(exc):
+        if g.pop("load_shedding_admitted", False):
+            limiter.release()
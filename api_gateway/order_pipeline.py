@@ -0,0 +1,261 @@
+"""Durable staged job queue for asynchronous order creation.
+
+Jobs live in the ``order_jobs`` collection, so any gateway process can pick up
+work accepted by another and nothing is lost on restart. A worker claims a job
+by leasing it, runs its current stage and records the result before moving on
+to the next stage, so a crash repeats at most the stage that was running.
+Failures that may pass (upstream unavailable) are retried with exponential
+backoff; after ``max_attempts`` the job is dead-lettered for an operator to
+inspect and requeue. Other failures end the job straight away.
+"""
+import logging
+import threading
+import uuid
+from datetime import datetime, timedelta
+
+from pymongo import ASCENDING, IndexModel, ReturnDocument
+
+logger = logging.getLogger(__name__)
+
+QUEUED, RUNNING, SUCCEEDED, FAILED, DEAD = "queued", "running", "succeeded", "failed", "dead"
+
+INDEXES = [
+    IndexModel([("job_id", ASCENDING)], unique=True),
+    IndexModel([("state", ASCENDING), ("available_at", ASCENDING)]),
+    IndexModel([("state", ASCENDING), ("leased_until", ASCENDING)]),
+    # Finished jobs are dropped after their retention period; dead letters are kept.
+    IndexModel([("expires_at", ASCENDING)], expireAfterSeconds=0),
+]
+
+
+class JobQueue:
+    """Mongo-backed queue of staged jobs; ``collection`` is a callable returning the collection."""
+
+    def __init__(self, collection, lease_seconds=30.0, max_attempts=5, base_backoff=0.5, max_backoff=60.0,
+                 retention_seconds=7 * 24 * 3600.0, clock=datetime.utcnow):
+        self.collection = collection
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.retention_seconds = retention_seconds
+        self._clock = clock
+
+    def enqueue(self, stage, context, job_id=None):
+        now = self._clock()
+        job = {
+            "job_id": job_id or str(uuid.uuid4()),
+            "state": QUEUED,
+            "stage": stage,
+            "attempts": 0,
+            "context": context,
+            "error": None,
+            "available_at": now,
+            "created": now,
+            "updated": now,
+        }
+        self.collection().insert_one(job)
+        return job
+
+    def claim(self):
+        """Lease the next runnable job, including ones whose previous lease ran out."""
+        now = self._clock()
+        lease = str(uuid.uuid4())
+        # The document as it was before the update is returned and patched
+        # locally, since the filter no longer matches it afterwards.
+        job = self.collection().find_one_and_update(
+            {"$or": [
+                {"state": QUEUED, "available_at": {"$lte": now}},
+                {"state": RUNNING, "leased_until": {"$lte": now}},
+            ]},
+            {"$set": {"state": RUNNING, "lease": lease, "updated": now,
+                      "leased_until": now + timedelta(seconds=self.lease_seconds)},
+             "$inc": {"attempts": 1}},
+            sort=[("available_at", ASCENDING)],
+            return_document=ReturnDocument.BEFORE,
+        )
+        if job is not None:
+            job.update(state=RUNNING, lease=lease, attempts=job["attempts"] + 1)
+        return job
+
+    def _update(self, job, changes):
+        """Apply ``changes`` if this worker still holds the job's lease; returns whether it did."""
+        changes = dict(changes, updated=self._clock())
+        result = self.collection().update_one({"job_id": job["job_id"], "lease": job["lease"]}, {"$set": changes})
+        if result.modified_count:
+            job.update(changes)
+            return True
+        return False
+
+    def advance(self, job, stage, context):
+        """Checkpoint a finished stage and keep the lease to run ``stage`` next."""
+        return self._update(job, {
+            "stage": stage,
+            "context": context,
+            "attempts": 1,
+            "error": None,
+            "leased_until": self._clock() + timedelta(seconds=self.lease_seconds),
+        })
+
+    def succeed(self, job, context):
+        return self._finish(job, SUCCEEDED, context, None)
+
+    def fail(self, job, context, error):
+        return self._finish(job, FAILED, context, error)
+
+    def _finish(self, job, state, context, error):
+        return self._update(job, {
+            "state": state,
+            "context": context,
+            "error": error,
+            "lease": None,
+            "expires_at": self._clock() + timedelta(seconds=self.retention_seconds),
+        })
+
+    def retry(self, job, context, error):
+        """Schedule another attempt at the current stage, or dead-letter the job; returns the new state."""
+        if job["attempts"] >= self.max_attempts:
+            self._update(job, {"state": DEAD, "context": context, "error": error, "lease": None})
+            return DEAD
+        delay = min(self.base_backoff * 2 ** (job["attempts"] - 1), self.max_backoff)
+        self._update(job, {
+            "state": QUEUED,
+            "context": context,
+            "error": error,
+            "lease": None,
+            "available_at": self._clock() + timedelta(seconds=delay),
+        })
+        return QUEUED
+
+    def get(self, job_id):
+        return self.collection().find_one({"job_id": job_id}, {"_id": 0, "lease": 0})
+
+    def dead_letters(self, limit=100):
+        return list(self.collection().find({"state": DEAD}, {"_id": 0, "lease": 0})
+                    .sort("updated", ASCENDING).limit(limit))
+
+    def requeue(self, job_id, stage):
+        """Give a dead-lettered job a fresh set of attempts, starting at ``stage``."""
+        result = self.collection().update_one(
+            {"job_id": job_id, "state": DEAD},
+            {"$set": {"state": QUEUED, "stage": stage, "attempts": 0, "available_at": self._clock(),
+                      "updated": self._clock()}},
+        )
+        return bool(result.modified_count)
+
+    def counts(self):
+        return {state: self.collection().count_documents({"state": state})
+                for state in (QUEUED, RUNNING, SUCCEEDED, FAILED, DEAD)}
+
+
+def _error_message(exc):
+    # flask-restx aborts carry the message in ``data``; other HTTP errors in ``description``.
+    data = getattr(exc, "data", None)
+    if isinstance(data, dict) and data.get("message"):
+        return data["message"]
+    return getattr(exc, "description", None) or str(exc)
+
+
+class PipelineWorkers:
+    """Threads that run queued jobs through an ordered list of stages.
+
+    ``stages`` is a list of ``(name, fn)``; ``fn(context)`` returns a dict of
+    updates merged into the job context, or raises. ``is_retryable(exc)``
+    decides between retrying and failing the job, and ``compensate(context)``
+    undoes partial work once a job fails or is dead-lettered.
+    """
+
+    def __init__(self, queue, stages, is_retryable, compensate=None, workers=4, poll_interval=0.5):
+        self.queue = queue
+        self.stages = stages
+        self._next_stage = {name: next_name for (name, _), (next_name, _) in zip(stages, stages[1:])}
+        self._stage_fns = dict(stages)
+        self.is_retryable = is_retryable
+        self.compensate = compensate
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._threads = []
+        self._lock = threading.Lock()
+        self._counts = {"succeeded": 0, "failed": 0, "retried": 0, "dead_lettered": 0, "lost_leases": 0}
+
+    @property
+    def first_stage(self):
+        return self.stages[0][0]
+
+    def notify(self):
+        """Wake an idle worker in this process, e.g. right after enqueueing."""
+        self._wake.set()
+
+    def _count(self, name):
+        with self._lock:
+            self._counts[name] += 1
+
+    def run_job(self, job):
+        context = dict(job["context"])
+        stage = job["stage"]
+        while stage is not None:
+            try:
+                context.update(self._stage_fns[stage](context) or {})
+            except Exception as exc:
+                self._handle_failure(job, context, stage, exc)
+                return
+            stage = self._next_stage.get(stage)
+            if stage is None:
+                done = self.queue.succeed(job, context)
+            else:
+                done = self.queue.advance(job, stage, context)
+            if not done:
+                # Another worker took the job over after our lease ran out.
+                self._count("lost_leases")
+                return
+        self._count("succeeded")
+
+    def _handle_failure(self, job, context, stage, exc):
+        error = {"stage": stage, "message": _error_message(exc)}
+        if self.is_retryable(exc):
+            state = self.queue.retry(job, context, error)
+            if state != DEAD:
+                self._count("retried")
+                return
+            self._count("dead_lettered")
+            logger.error("Order job %s dead-lettered at %s: %s", job["job_id"], stage, error["message"])
+        else:
+            self.queue.fail(job, context, error)
+            self._count("failed")
+        if self.compensate:
+            self.compensate(context)
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                job = self.queue.claim()
+            except Exception as exc:
+                logger.warning("Could not claim an order job: %s", exc)
+                job = None
+            if job is None:
+                self._wake.wait(self.poll_interval)
+                self._wake.clear()
+                continue
+            try:
+                self.run_job(job)
+            except Exception:
+                # The lease runs out and another worker picks the job up again.
+                logger.exception("Order job %s interrupted", job["job_id"])
+
+    def start(self):
+        self._threads = [thread for thread in self._threads if thread.is_alive()]
+        self._stop.clear()
+        while len(self._threads) < self.workers:
+            thread = threading.Thread(target=self._run, name=f"order-pipeline-{len(self._threads)}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+
+    def stats(self):
+        with self._lock:
+            return dict(self._counts, workers=len(self._threads))
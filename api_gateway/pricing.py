@@ -0,0 +1,208 @@
+"""In-memory product price snapshot for pricing orders without network hops.
+
+PriceSnapshot keeps every product's price in a flat ``array('d')`` indexed
+through a product_id -> slot dict, which costs a few dozen bytes per product.
+SnapshotRefresher keeps it current from the product service's change feed
+(GET /products/changes): a full load at startup and every
+``full_sync_interval`` seconds, and incremental polls in between.
+"""
+import logging
+import threading
+import time
+from array import array
+from datetime import datetime, timedelta
+
+logger = logging.getLogger(__name__)
+
+
+class PriceSnapshot:
+    def __init__(self, max_staleness=60.0, clock=time.monotonic):
+        self.max_staleness = max_staleness
+        self._clock = clock
+        self._slots = {}
+        self._prices = array("d")
+        self._free = []
+        self._lock = threading.Lock()
+        self.version = 0
+        self.loaded = False
+        self.refreshed_at = None
+        self._refreshed_clock = None
+
+    def __len__(self):
+        return len(self._slots)
+
+    def age(self):
+        """Seconds since the last successful refresh, or None before the first load."""
+        if self._refreshed_clock is None:
+            return None
+        return self._clock() - self._refreshed_clock
+
+    def is_fresh(self):
+        age = self.age()
+        return self.loaded and age is not None and age <= self.max_staleness
+
+    def lookup(self, product_ids):
+        """Return (prices, version) for the known IDs; empty when the snapshot is stale."""
+        if not self.is_fresh():
+            return {}, self.version
+        with self._lock:
+            prices = {}
+            for product_id in product_ids:
+                slot = self._slots.get(product_id)
+                if slot is not None:
+                    prices[product_id] = self._prices[slot]
+            return prices, self.version
+
+    def replace(self, prices):
+        """Swap in a complete product_id -> price mapping."""
+        slots = {}
+        values = array("d")
+        for product_id, price in prices.items():
+            slots[product_id] = len(values)
+            values.append(price)
+        with self._lock:
+            self._slots, self._prices, self._free = slots, values, []
+            self.version += 1
+            self.loaded = True
+        self.mark_refreshed()
+
+    def apply(self, changed, deleted):
+        """Apply incremental updates: ``changed`` maps product_id -> price, ``deleted`` lists IDs."""
+        modified = False
+        with self._lock:
+            for product_id in deleted:
+                slot = self._slots.pop(product_id, None)
+                if slot is not None:
+                    self._prices[slot] = float("nan")
+                    self._free.append(slot)
+                    modified = True
+            for product_id, price in changed.items():
+                slot = self._slots.get(product_id)
+                if slot is None:
+                    if self._free:
+                        slot = self._free.pop()
+                    else:
+                        slot = len(self._prices)
+                        self._prices.append(0.0)
+                    self._slots[product_id] = slot
+                elif self._prices[slot] == price:
+                    # Feed polls overlap, so most changes have been applied already.
+                    continue
+                self._prices[slot] = price
+                modified = True
+            if modified:
+                self.version += 1
+        self.mark_refreshed()
+
+    def mark_refreshed(self):
+        self.refreshed_at = datetime.utcnow()
+        self._refreshed_clock = self._clock()
+
+    def stats(self):
+        age = self.age()
+        return {
+            "loaded": self.loaded,
+            "fresh": self.is_fresh(),
+            "version": self.version,
+            "products": len(self._slots),
+            "slots": len(self._prices),
+            "refreshed_at": self.refreshed_at.isoformat() if self.refreshed_at else None,
+            "age_seconds": age,
+            "max_staleness_seconds": self.max_staleness,
+        }
+
+
+class SnapshotRefresher:
+    """Polls the product change feed into a PriceSnapshot on a background thread.
+
+    Each incremental poll asks for changes since the server time at which the
+    previous poll started, minus ``overlap`` seconds, so writes committed late
+    or stamped by a product process with a slightly different clock are still
+    picked up. Re-applying a change is harmless.
+    """
+
+    def __init__(self, snapshot, client, interval=5.0, full_sync_interval=3600.0, overlap=5.0, page_size=1000):
+        self.snapshot = snapshot
+        self.client = client
+        self.interval = interval
+        self.full_sync_interval = full_sync_interval
+        self.overlap = timedelta(seconds=overlap)
+        self.page_size = page_size
+        self._since = None
+        self._last_full_sync = None
+        self._thread = None
+        self._stop = threading.Event()
+        self.polls = 0
+        self.full_syncs = 0
+        self.failures = 0
+        self.last_error = None
+
+    def _pages(self, since):
+        """Yield feed pages, following the cursor until the feed is drained."""
+        params = {"limit": self.page_size}
+        if since is not None:
+            params["since"] = since.isoformat()
+        while True:
+            response = self.client.get("/products/changes", params=params)
+            response.raise_for_status()
+            page = response.json()
+            yield page
+            if not page.get("cursor"):
+                return
+            params = dict(params, **page["cursor"])
+
+    def refresh(self):
+        """Run one full or incremental sync, depending on how long since the last full one."""
+        full = (self._since is None or self._last_full_sync is None
+                or time.monotonic() - self._last_full_sync >= self.full_sync_interval)
+        started_at = None
+        if full:
+            prices = {}
+            for page in self._pages(None):
+                started_at = started_at or page["server_time"]
+                prices.update((change["product_id"], change["price"]) for change in page["changes"])
+            self.snapshot.replace(prices)
+            self._last_full_sync = time.monotonic()
+            self.full_syncs += 1
+        else:
+            for page in self._pages(self._since):
+                started_at = started_at or page["server_time"]
+                changed = {change["product_id"]: change["price"] for change in page["changes"]}
+                self.snapshot.apply(changed, page.get("deleted", []))
+            self.polls += 1
+        self._since = datetime.fromisoformat(started_at) - self.overlap
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.refresh()
+                self.last_error = None
+            except Exception as exc:
+                self.failures += 1
+                self.last_error = str(exc)
+                logger.warning("Price snapshot refresh failed: %s", exc)
+            self._stop.wait(self.interval)
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="price-snapshot", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def stats(self):
+        return {
+            "since": self._since.isoformat() if self._since else None,
+            "polls": self.polls,
+            "full_syncs": self.full_syncs,
+            "failures": self.failures,
+            "last_error": self.last_error,
+            "interval_seconds": self.interval,
+        }
+
+
+def order_total(products, prices):
+    """Sum unit price times quantity over the cart, rounded to cents."""
+    return round(sum(prices[product["product_id"]] * product.get("quantity", 1) for product in products), 2)
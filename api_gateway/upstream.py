@@ -0,0 +1,385 @@
+"""Pooled keep-alive HTTP clients for the gateway's upstream services.
+
+One ServiceClient is shared per upstream so connections are reused across
+requests instead of opening a new TCP connection for every call. Each client
+has a circuit breaker, so calls to an upstream that keeps failing or timing
+out fail fast instead of tying up gateway threads. ``mount_app`` swaps a
+client's network transport for a WSGIAdapter that calls an app in the same
+process, which local_stack.py uses to run the whole stack without sockets.
+"""
+import os
+import threading
+import time
+from collections import deque
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import BaseAdapter, HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+from werkzeug.test import EnvironBuilder, run_wsgi_app
+
+from common.tracing import outbound_headers, record_hop
+
+IDEMPOTENT_METHODS = frozenset(["GET", "HEAD", "OPTIONS"])
+RETRYABLE_STATUSES = frozenset([502, 503, 504])
+
+
+class RetryBudget:
+    """Token bucket that limits retries to a fraction of recent requests.
+
+    Every request deposits ``ratio`` tokens and every retry spends one, so
+    during an outage retries add at most ``ratio`` extra load.
+    """
+
+    def __init__(self, ratio=0.1, min_retries=10):
+        self.ratio = ratio
+        self.capacity = float(min_retries)
+        self.tokens = float(min_retries)
+        self._lock = threading.Lock()
+
+    def deposit(self):
+        with self._lock:
+            self.tokens = min(self.capacity, self.tokens + self.ratio)
+
+    def withdraw(self):
+        with self._lock:
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return True
+            return False
+
+
+class CircuitOpenError(requests.RequestException):
+    """Raised instead of calling an upstream whose circuit is open."""
+
+
+class BulkheadFullError(requests.RequestException):
+    """Raised instead of calling an upstream that already has ``max_concurrent`` calls in flight."""
+
+
+class CircuitBreaker:
+    """Closed/open/half-open breaker over a sliding window of recent calls.
+
+    The circuit opens when at least ``min_calls`` of the last ``window`` calls
+    were recorded and either the failure rate or the rate of calls slower than
+    ``slow_call_seconds`` reaches its threshold. After ``open_seconds`` up to
+    ``half_open_calls`` probe calls are let through; the circuit closes if all
+    of them succeed and opens again on the first failure.
+    """
+
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, window=20, min_calls=10, failure_threshold=0.5, slow_call_seconds=2.0,
+                 slow_call_threshold=0.5, open_seconds=10.0, half_open_calls=3, clock=time.monotonic):
+        self.window = window
+        self.min_calls = min_calls
+        self.failure_threshold = failure_threshold
+        self.slow_call_seconds = slow_call_seconds
+        self.slow_call_threshold = slow_call_threshold
+        self.open_seconds = open_seconds
+        self.half_open_calls = half_open_calls
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._outcomes = deque(maxlen=window)
+        self._state = self.CLOSED
+        self._opened_at = 0.0
+        self._probes_started = 0
+        self._probes_succeeded = 0
+        self._times_opened = 0
+        self._rejected = 0
+
+    @property
+    def state(self):
+        with self._lock:
+            self._maybe_half_open()
+            return self._state
+
+    def _maybe_half_open(self):
+        if self._state == self.OPEN and self._clock() - self._opened_at >= self.open_seconds:
+            self._state = self.HALF_OPEN
+            self._probes_started = 0
+            self._probes_succeeded = 0
+
+    def allow(self):
+        """Return whether a call may go ahead; every allowed call must be followed by ``record``."""
+        with self._lock:
+            self._maybe_half_open()
+            if self._state == self.CLOSED:
+                return True
+            if self._state == self.HALF_OPEN and self._probes_started < self.half_open_calls:
+                self._probes_started += 1
+                return True
+            self._rejected += 1
+            return False
+
+    def record(self, success, seconds):
+        with self._lock:
+            slow = seconds >= self.slow_call_seconds
+            if self._state == self.HALF_OPEN:
+                if not success or slow:
+                    self._open()
+                else:
+                    self._probes_succeeded += 1
+                    if self._probes_succeeded >= self.half_open_calls:
+                        self._state = self.CLOSED
+                        self._outcomes.clear()
+                return
+            if self._state == self.OPEN:
+                return
+            self._outcomes.append((success, slow))
+            calls = len(self._outcomes)
+            if calls < self.min_calls:
+                return
+            failures = sum(1 for ok, _ in self._outcomes if not ok)
+            slow_calls = sum(1 for _, was_slow in self._outcomes if was_slow)
+            if failures / calls >= self.failure_threshold or slow_calls / calls >= self.slow_call_threshold:
+                self._open()
+
+    def _open(self):
+        self._state = self.OPEN
+        self._opened_at = self._clock()
+        self._outcomes.clear()
+        self._times_opened += 1
+
+    def stats(self):
+        with self._lock:
+            self._maybe_half_open()
+            return {
+                "state": self._state,
+                "recent_calls": len(self._outcomes),
+                "recent_failures": sum(1 for ok, _ in self._outcomes if not ok),
+                "recent_slow_calls": sum(1 for _, slow in self._outcomes if slow),
+                "times_opened": self._times_opened,
+                "rejected": self._rejected,
+            }
+
+
+class WSGIAdapter(BaseAdapter):
+    """requests transport that calls a WSGI app in this process instead of opening a connection.
+
+    The request is run to completion on the calling thread, so timeouts do
+    not apply.
+    """
+
+    def __init__(self, app):
+        super().__init__()
+        self.app = app
+
+    def send(self, request, stream=False, timeout=None, verify=True, cert=None, proxies=None):
+        url = urlsplit(request.url)
+        body = request.body or b""
+        headers = {key: value for key, value in request.headers.items() if key.lower() != "content-length"}
+        environ = EnvironBuilder(
+            method=request.method,
+            base_url=f"{url.scheme}://{url.netloc}",
+            path=url.path,
+            query_string=url.query,
+            headers=headers,
+            data=body.encode() if isinstance(body, str) else body,
+        ).get_environ()
+        app_iter, status, response_headers = run_wsgi_app(self.app, environ, buffered=True)
+        try:
+            content = b"".join(app_iter)
+        finally:
+            if hasattr(app_iter, "close"):
+                app_iter.close()
+
+        response = requests.Response()
+        code, _, reason = status.partition(" ")
+        response.status_code = int(code)
+        response.reason = reason
+        response.headers = CaseInsensitiveDict(response_headers.items())
+        response.encoding = get_encoding_from_headers(response.headers)
+        response._content = content
+        response.url = request.url
+        response.request = request
+        response.connection = self
+        return response
+
+    def close(self):
+        pass
+
+
+class ServiceClient:
+    def __init__(self, name, base_url, pool_size=None, connect_timeout=1.0, read_timeout=5.0,
+                 max_retries=2, retry_budget=None, breaker=None, max_concurrent=None):
+        self.name = name
+        self.base_url = (base_url or "").rstrip("/")
+        # Caps the gateway threads one slow upstream can hold before its breaker trips.
+        self.max_concurrent = max_concurrent or pool_size or 10
+        # Enough connections for every call the bulkhead lets through; a
+        # smaller pool makes calls wait for a connection rather than open
+        # one that is thrown away afterwards.
+        self.pool_size = pool_size or self.max_concurrent
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.retry_budget = retry_budget or RetryBudget()
+        self.breaker = breaker or CircuitBreaker()
+
+        self.session = requests.Session()
+        self.adapter = HTTPAdapter(pool_connections=4, pool_maxsize=self.pool_size, pool_block=True, max_retries=0)
+        self.session.mount("http://", self.adapter)
+        self.session.mount("https://", self.adapter)
+
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._peak_in_flight = 0
+        self._requests = 0
+        self._retries = 0
+        self._budget_exhausted = 0
+        self._errors = 0
+        self._bulkhead_rejected = 0
+
+    def mount_app(self, app):
+        """Send this client's calls to the WSGI ``app`` in this process instead of over the network."""
+        self.adapter = WSGIAdapter(app)
+        self.session.mount(self.base_url or "http://", self.adapter)
+
+    def get(self, path, **kwargs):
+        return self.request("GET", path, **kwargs)
+
+    def post(self, path, **kwargs):
+        return self.request("POST", path, **kwargs)
+
+    def request(self, method, path, timeout=None, **kwargs):
+        """Send a request to the upstream, retrying idempotent calls within the retry budget.
+
+        ``timeout`` may be a (connect, read) tuple or a single number of seconds
+        that caps both; it defaults to the client's configured timeouts. Raises
+        CircuitOpenError, a RequestException, without calling the upstream while
+        its circuit is open, and BulkheadFullError while ``max_concurrent`` calls
+        to it are already in flight.
+        """
+        if timeout is None:
+            timeout = self.timeout
+        elif not isinstance(timeout, tuple):
+            timeout = (min(self.timeout[0], timeout), min(self.timeout[1], timeout))
+        retryable = method.upper() in IDEMPOTENT_METHODS
+        kwargs["headers"] = outbound_headers(kwargs.get("headers"))
+        self.retry_budget.deposit()
+
+        attempt = 0
+        while True:
+            if not self._enter():
+                record_hop(self.name, method, "bulkhead_full", 0.0)
+                raise BulkheadFullError(f"Too many concurrent calls to the {self.name} service")
+            if not self.breaker.allow():
+                self._exit()
+                record_hop(self.name, method, "circuit_open", 0.0)
+                raise CircuitOpenError(f"Circuit to the {self.name} service is open")
+            started = time.perf_counter()
+            try:
+                response = self.session.request(method, f"{self.base_url}{path}", timeout=timeout, **kwargs)
+                elapsed = time.perf_counter() - started
+                record_hop(self.name, method, response.status_code, elapsed)
+                self.breaker.record(response.status_code < 500, elapsed)
+            except (requests.ConnectionError, requests.Timeout):
+                elapsed = time.perf_counter() - started
+                record_hop(self.name, method, "error", elapsed)
+                self.breaker.record(False, elapsed)
+                if not (retryable and self._may_retry(attempt)):
+                    self._count_error()
+                    raise
+            except Exception:
+                # Anything else still has to be recorded, or a half-open probe never completes.
+                self.breaker.record(False, time.perf_counter() - started)
+                self._count_error()
+                raise
+            else:
+                if response.status_code not in RETRYABLE_STATUSES or not (retryable and self._may_retry(attempt)):
+                    return response
+                response.close()
+            finally:
+                self._exit()
+            attempt += 1
+
+    def _may_retry(self, attempt):
+        if attempt >= self.max_retries:
+            return False
+        if not self.retry_budget.withdraw():
+            with self._lock:
+                self._budget_exhausted += 1
+            return False
+        with self._lock:
+            self._retries += 1
+        return True
+
+    def _enter(self):
+        with self._lock:
+            if self._in_flight >= self.max_concurrent:
+                self._bulkhead_rejected += 1
+                return False
+            self._requests += 1
+            self._in_flight += 1
+            self._peak_in_flight = max(self._peak_in_flight, self._in_flight)
+            return True
+
+    def _exit(self):
+        with self._lock:
+            self._in_flight -= 1
+
+    def _count_error(self):
+        with self._lock:
+            self._errors += 1
+
+    def stats(self):
+        """Pool saturation and connection reuse counters for this upstream."""
+        connections_opened = 0
+        pool_requests = 0
+        # An in-process adapter has no connection pool.
+        pools = self.adapter.poolmanager.pools if isinstance(self.adapter, HTTPAdapter) else {}
+        for key in pools.keys():
+            pool = pools.get(key)
+            if pool is not None:
+                connections_opened += pool.num_connections
+                pool_requests += pool.num_requests
+        with self._lock:
+            return {
+                "pool_size": self.pool_size,
+                "max_concurrent": self.max_concurrent,
+                "bulkhead_rejected": self._bulkhead_rejected,
+                "in_flight": self._in_flight,
+                "peak_in_flight": self._peak_in_flight,
+                "saturation": self._in_flight / self.max_concurrent,
+                "requests": self._requests,
+                "retries": self._retries,
+                "retry_budget_exhausted": self._budget_exhausted,
+                "errors": self._errors,
+                "connections_opened": connections_opened,
+                "connection_reuse_rate": 1 - connections_opened / pool_requests if pool_requests else 0.0,
+                "circuit": self.breaker.stats(),
+            }
+
+
+def client_from_env(name, base_url, max_concurrent=None):
+    """Build a ServiceClient configured from UPSTREAM_* variables, overridable per upstream.
+
+    For example ``INVENTORY_POOL_SIZE`` takes precedence over ``UPSTREAM_POOL_SIZE``
+    for the inventory client; the breaker settings are read the same way.
+    ``max_concurrent`` is the cap used when ``MAX_CONCURRENT`` is not set, and
+    the pool holds that many connections unless ``POOL_SIZE`` is set.
+    """
+    def setting(key, default, cast):
+        value = os.getenv(f"{name.upper()}_{key}", os.getenv(f"UPSTREAM_{key}"))
+        return cast(value) if value is not None else default
+
+    return ServiceClient(
+        name,
+        base_url,
+        pool_size=setting("POOL_SIZE", None, int),
+        connect_timeout=setting("CONNECT_TIMEOUT", 1.0, float),
+        read_timeout=setting("READ_TIMEOUT", 5.0, float),
+        max_retries=setting("MAX_RETRIES", 2, int),
+        max_concurrent=setting("MAX_CONCURRENT", max_concurrent, int),
+        retry_budget=RetryBudget(ratio=setting("RETRY_BUDGET_RATIO", 0.1, float)),
+        breaker=CircuitBreaker(
+            window=setting("BREAKER_WINDOW", 20, int),
+            min_calls=setting("BREAKER_MIN_CALLS", 10, int),
+            failure_threshold=setting("BREAKER_FAILURE_RATE", 0.5, float),
+            slow_call_seconds=setting("BREAKER_SLOW_CALL_SECONDS", 2.0, float),
+            slow_call_threshold=setting("BREAKER_SLOW_CALL_RATE", 0.5, float),
+            open_seconds=setting("BREAKER_OPEN_SECONDS", 10.0, float),
+            half_open_calls=setting("BREAKER_HALF_OPEN_CALLS", 3, int),
+        ),
+    )
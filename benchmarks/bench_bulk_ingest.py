@@ -0,0 +1,67 @@
+"""Bulk ingest throughput of the product service, in documents per second.
+
+Compares one POST per product with /products/bulk at several chunk sizes,
+for both JSON array and NDJSON bodies. Writes go to the database named in
+MONGO_URI, which is dropped first:
+
+    MONGO_URI=mongodb://localhost:27017/bench python benchmarks/bench_bulk_ingest.py --count 50000
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+from services import load_service
+
+
+def make_products(count):
+    return [{
+        "name": f"Product {i}",
+        "description": "Benchmark product",
+        "price": 9.99,
+        "updated": "2024-01-01T00:00:00",
+        "expired": False,
+        "categories": ["bench"],
+    } for i in range(count)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--count", type=int, default=20000)
+    parser.add_argument("--single-count", type=int, default=2000, help="products posted one at a time")
+    parser.add_argument("--chunk-sizes", default="100,1000,5000")
+    options = parser.parse_args()
+    if not os.getenv("MONGO_URI"):
+        sys.exit("Set MONGO_URI to a scratch database on a running mongod")
+
+    service = load_service("product")
+    client = service.app.test_client()
+    products = make_products(options.count)
+    ndjson = "\n".join(json.dumps(product) for product in products)
+
+    def reset():
+        service.mongo.db.products.drop()
+        service.ensure_indexes(service.mongo.db, service.INDEXES)
+
+    reset()
+    started = time.perf_counter()
+    for product in products[:options.single_count]:
+        client.post("/products/", json=product)
+    elapsed = time.perf_counter() - started
+    print(f"{'single POST':<24} {options.single_count / elapsed:>12.0f} docs/s")
+
+    for chunk_size in (int(size) for size in options.chunk_sizes.split(",")):
+        for label, kwargs in (("json", {"json": products}),
+                              ("ndjson", {"data": ndjson, "content_type": "application/x-ndjson"})):
+            reset()
+            started = time.perf_counter()
+            response = client.post(f"/products/bulk?chunk_size={chunk_size}", **kwargs)
+            elapsed = time.perf_counter() - started
+            if response.json["created"] != options.count:
+                sys.exit(f"bulk {label} chunk {chunk_size}: {response.json['failed']} items failed")
+            print(f"{f'bulk {label} chunk={chunk_size}':<24} {options.count / elapsed:>12.0f} docs/s")
+
+
+if __name__ == "__main__":
+    main()
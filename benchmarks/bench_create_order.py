@@ -0,0 +1,68 @@
+"""Latency of the gateway's /create-order path versus cart size.
+
+All upstreams are served by a local stub with a fixed per-call delay, so the
+numbers reflect how the gateway schedules its downstream calls.
+
+    python benchmarks/bench_create_order.py --latency 0.005 --iterations 50
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+from services import load_service
+from stubs import StubState, start_stub_server
+
+
+def load_gateway(base_url):
+    for name in ("CUSTOMER", "PRODUCT", "INVENTORY", "ORDER", "PAYMENT"):
+        os.environ[f"{name}_SERVICE_URL"] = base_url
+    return load_service("gateway")
+
+
+def order_payload(cart_size):
+    return {
+        "customer_id": "bench-customer",
+        "products": [{"product_id": f"sku-{i}", "quantity": 1} for i in range(cart_size)],
+        "total_amount": 0,
+        "status": "pending",
+        "timestamp": "2024-01-01T00:00:00",
+        "updated": "2024-01-01T00:00:00",
+        "confirmed": False,
+        "tracking_numbers": [],
+    }
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--latency", type=float, default=0.005, help="stub delay per upstream call, in seconds")
+    parser.add_argument("--iterations", type=int, default=50)
+    parser.add_argument("--cart-sizes", default="1,5,10,30")
+    options = parser.parse_args()
+
+    _, base_url = start_stub_server(StubState(latency=options.latency))
+    gateway = load_gateway(base_url)
+    client = gateway.app.test_client()
+
+    print(f"{'cart':>6} {'p50 ms':>10} {'p99 ms':>10} {'mean ms':>10}")
+    for cart_size in (int(size) for size in options.cart_sizes.split(",")):
+        payload = order_payload(cart_size)
+        samples = []
+        for _ in range(options.iterations):
+            started = time.perf_counter()
+            response = client.post("/create-order", json=payload)
+            samples.append((time.perf_counter() - started) * 1000)
+            if response.status_code != 201:
+                sys.exit(f"cart of {cart_size}: unexpected {response.status_code} {response.get_data(as_text=True)}")
+        print(f"{cart_size:>6} {percentile(samples, 50):>10.2f} {percentile(samples, 99):>10.2f} {statistics.mean(samples):>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""JSON encode throughput for lists of Mongo documents, in documents per second.
+
+Encodes lists of order documents as read from Mongo (ObjectId ``_id``,
+datetime fields, nested products) three ways: the old per-document
+conversion loop followed by the standard library encoder, the shared
+encoder's standard library fallback, and the shared encoder with orjson
+when it is installed. No database is needed:
+
+    python benchmarks/bench_json_encode.py --count 10000 --repeat 20
+"""
+import argparse
+import copy
+import json
+import sys
+import time
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+
+from services import ROOT
+
+sys.path.insert(0, ROOT)
+
+from common import encoding  # noqa: E402
+
+
+def make_orders(count):
+    start = datetime(2024, 1, 1)
+    return [{
+        "_id": ObjectId(),
+        "order_id": f"order-{i}",
+        "customer_id": f"customer-{i % 500}",
+        "products": [{"product_id": f"product-{(i + j) % 1000}", "quantity": j + 1} for j in range(3)],
+        "total_amount": round(19.99 * (i % 7 + 1), 2),
+        "status": "pending",
+        "timestamp": start + timedelta(seconds=i),
+        "updated": start + timedelta(seconds=i, microseconds=123000),
+        "confirmed": False,
+        "tracking_numbers": [],
+    } for i in range(count)]
+
+
+def convert_and_dump(documents):
+    """What the services did before: stringify fields in place, then encode."""
+    for item in documents:
+        item["_id"] = str(item["_id"])
+        if "timestamp" in item and isinstance(item["timestamp"], datetime):
+            item["timestamp"] = item["timestamp"].isoformat()
+        if "updated" in item and isinstance(item["updated"], datetime):
+            item["updated"] = item["updated"].isoformat()
+    return json.dumps(documents).encode()
+
+
+def stdlib_dump(documents):
+    return json.JSONEncoder(default=encoding.default, separators=(",", ":"), ensure_ascii=False) \
+        .encode(documents).encode()
+
+
+def measure(encode, documents, repeat, copy_input):
+    timings = []
+    for _ in range(repeat):
+        batch = copy.deepcopy(documents) if copy_input else documents
+        started = time.perf_counter()
+        body = encode(batch)
+        timings.append(time.perf_counter() - started)
+    return min(timings), len(body)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--count", type=int, default=10000, help="documents per list")
+    parser.add_argument("--repeat", type=int, default=10)
+    options = parser.parse_args()
+
+    documents = make_orders(options.count)
+    variants = [
+        # The conversion loop mutates its input, so each run gets a fresh copy (not timed).
+        ("convert loop + json", convert_and_dump, True),
+        ("shared encoder (json)", stdlib_dump, False),
+    ]
+    if encoding.orjson is not None:
+        variants.append(("shared encoder (orjson)", encoding.dumps, False))
+    else:
+        print("orjson is not installed; the shared encoder falls back to json")
+
+    assert json.loads(convert_and_dump(copy.deepcopy(documents))) == json.loads(encoding.dumps(documents))
+
+    print(f"{options.count} documents per list, best of {options.repeat}")
+    print(f"{'encoder':<26} {'ms':>8} {'docs/s':>12} {'MB/s':>8}")
+    for name, encode, copy_input in variants:
+        seconds, size = measure(encode, documents, options.repeat, copy_input)
+        print(f"{name:<26} {seconds * 1000:>8.1f} {options.count / seconds:>12,.0f} {size / seconds / 1e6:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
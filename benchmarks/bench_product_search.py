@@ -0,0 +1,113 @@
+"""Latency of GET /products/search as the catalog grows, in milliseconds.
+
+Grows the catalog to each size in ``--sizes`` and times a set of typical
+storefront searches through the product service at every step: category
+pages in price order, filtered price ranges, keyset pages deep into a
+listing and text searches. Writes go to the database named in MONGO_URI,
+which is dropped first; text search needs a real mongod:
+
+    MONGO_URI=mongodb://localhost:27017/bench python benchmarks/bench_product_search.py --sizes 10000,100000,1000000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import datetime
+
+from services import load_service
+
+WORDS = ("red blue green black white cotton wool leather steel wooden classic modern compact "
+         "portable wireless organic premium basic deluxe mini large travel outdoor kitchen garden").split()
+CATEGORIES = [f"category-{i}" for i in range(50)]
+
+QUERIES = {
+    "category, price order": "/products/search?category=category-7&limit=50",
+    "category + unexpired + price range": "/products/search?category=category-7&expired=false"
+                                          "&min_price=20&max_price=40&limit=50",
+    "unexpired, price descending": "/products/search?expired=false&sort=-price&limit=50",
+    "text, relevance": "/products/search?q=wireless+leather&limit=50",
+    "text + category, price order": "/products/search?q=wireless&category=category-7&limit=50",
+}
+
+
+def make_products(rng, start, count):
+    now = datetime.utcnow()
+    for i in range(start, start + count):
+        yield {
+            "product_id": f"product-{i}",
+            "name": " ".join(rng.sample(WORDS, 3)),
+            "description": " ".join(rng.sample(WORDS, 8)),
+            "price": round(rng.uniform(1, 500), 2),
+            "updated": now,
+            "expired": rng.random() < 0.1,
+            "categories": rng.sample(CATEGORIES, 2),
+            "modified": now,
+        }
+
+
+def grow(collection, rng, current, target, batch=10000):
+    while current < target:
+        count = min(batch, target - current)
+        collection.insert_many(list(make_products(rng, current, count)), ordered=False)
+        current += count
+    return current
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def time_get(client, url):
+    started = time.perf_counter()
+    response = client.get(url)
+    elapsed = (time.perf_counter() - started) * 1000
+    assert response.status_code == 200, response.get_json()
+    return elapsed, response
+
+
+def deep_page_timings(client, url, pages):
+    """Follow the next-page cursor ``pages`` times and time each page."""
+    timings = []
+    for _ in range(pages):
+        elapsed, response = time_get(client, url)
+        timings.append(elapsed)
+        cursor = response.headers.get("X-Next-Cursor")
+        if not cursor:
+            break
+        url = f"{url.split('&after=')[0]}&after={cursor}"
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default="10000,100000,1000000")
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--pages", type=int, default=40, help="pages walked for the keyset benchmark")
+    options = parser.parse_args()
+    if not os.getenv("MONGO_URI"):
+        sys.exit("Set MONGO_URI to a scratch database on a running mongod")
+
+    service = load_service("product")
+    client = service.app.test_client()
+    db = service.mongo.db
+    db.products.drop()
+    service.ensure_indexes(db, service.INDEXES)
+    rng = random.Random(42)
+
+    size = 0
+    print(f"{'products':>9} {'query':<36} {'p50 ms':>8} {'p99 ms':>8}")
+    for target in (int(value) for value in options.sizes.split(",")):
+        size = grow(db.products, rng, size, target)
+        for name, url in QUERIES.items():
+            client.get(url)
+            samples = [time_get(client, url)[0] for _ in range(options.repeat)]
+            print(f"{size:>9} {name:<36} {percentile(samples, 50):>8.2f} {percentile(samples, 99):>8.2f}")
+        samples = deep_page_timings(client, "/products/search?category=category-7&limit=50", options.pages)
+        print(f"{size:>9} {f'keyset pages 1-{len(samples)}':<36} "
+              f"{percentile(samples, 50):>8.2f} {percentile(samples, 99):>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""Cold-start time of each service, in milliseconds.
+
+Every run starts a fresh interpreter that imports a service module (the app,
+Mongo client and API are built at import time) and serves its first request,
+a create with an incomplete payload that is rejected before touching the
+database. Reports the median over ``--runs`` runs of the time until the
+module is loaded and until the first response:
+
+    python benchmarks/bench_startup.py --runs 10
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+from services import SERVICES
+
+CREATE_PATHS = {
+    "customer": "/customers/",
+    "product": "/products/",
+    "inventory": "/inventory/",
+    "order": "/orders/",
+    "payment": "/payments/",
+    "gateway": "/create-order",
+}
+
+CHILD = """
+import json, sys, time
+started = time.perf_counter()
+sys.path.insert(0, {benchmarks!r})
+from services import load_service
+service = load_service({name!r})
+loaded = time.perf_counter()
+response = service.app.test_client().post({path!r}, json={{}})
+served = time.perf_counter()
+print(json.dumps({{"status": response.status_code, "load": loaded - started, "first_request": served - started}}))
+"""
+
+
+def run_once(name):
+    code = CHILD.format(benchmarks=os.path.dirname(os.path.abspath(__file__)), name=name, path=CREATE_PATHS[name])
+    env = dict(os.environ, MONGO_URI=os.getenv("MONGO_URI", "mongodb://localhost:27017/benchmark"))
+    output = subprocess.run([sys.executable, "-c", code], env=env, check=True, capture_output=True, text=True)
+    return json.loads(output.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--services", default=",".join(SERVICES))
+    options = parser.parse_args()
+
+    print(f"{'service':<10} {'load ms':>9} {'first response ms':>18} {'status':>7}")
+    for name in options.services.split(","):
+        runs = [run_once(name) for _ in range(options.runs)]
+        load = statistics.median(run["load"] for run in runs) * 1000
+        first = statistics.median(run["first_request"] for run in runs) * 1000
+        print(f"{name:<10} {load:>9.1f} {first:>18.1f} {runs[-1]['status']:>7}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""Order payload validation throughput, in payloads per second.
+
+Validates the same order payload three ways: the per-request loop the
+services used before (required-field scan plus ``fromisoformat``), the shared
+validator compiled from the model, and flask-restx's jsonschema validation of
+the same model (``@api.expect(model, validate=True)``). No database is needed:
+
+    python benchmarks/bench_validation.py --count 100000
+"""
+import argparse
+import sys
+import time
+from datetime import datetime
+
+from flask_restx import Model, fields
+
+from services import ROOT
+
+sys.path.insert(0, ROOT)
+
+from common.validation import compile_validator  # noqa: E402
+
+order_model = Model('Order', {
+    'customer_id': fields.String(required=True),
+    'products': fields.List(fields.Raw, required=True),
+    'total_amount': fields.Float(required=True),
+    'status': fields.String(required=True),
+    'timestamp': fields.DateTime(required=True),
+    'updated': fields.DateTime(required=True),
+    'confirmed': fields.Boolean(required=True),
+    'tracking_numbers': fields.List(fields.String, required=True),
+})
+
+PAYLOAD = {
+    "customer_id": "customer-1",
+    "products": [{"product_id": "product-1", "quantity": 2}, {"product_id": "product-2", "quantity": 1}],
+    "total_amount": 59.97,
+    "status": "pending",
+    "timestamp": "2024-01-01T12:00:00",
+    "updated": "2024-01-01T12:00:00.123000",
+    "confirmed": False,
+    "tracking_numbers": [],
+}
+
+
+def manual(args):
+    """What the services did before."""
+    required_fields = ['customer_id', 'products', 'total_amount', 'status', 'timestamp', 'updated', 'confirmed', 'tracking_numbers']
+    for field in required_fields:
+        if field not in args:
+            raise ValueError(f"Missing required field: {field}")
+    try:
+        timestamp = datetime.fromisoformat(args['timestamp'])
+        updated = datetime.fromisoformat(args['updated'])
+    except (ValueError, TypeError):
+        raise ValueError("Invalid timestamp or updated format. Use ISO 8601.") from None
+    return dict(args, total_amount=float(args["total_amount"]), timestamp=timestamp, updated=updated)
+
+
+def jsonschema(args):
+    """Schema validation only; the timestamps would still need parsing."""
+    order_model.validate(args)
+    return args
+
+
+def measure(validate, count):
+    started = time.perf_counter()
+    for _ in range(count):
+        validate(PAYLOAD)
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--count", type=int, default=100000)
+    options = parser.parse_args()
+
+    compiled = compile_validator(order_model)
+    assert compiled(PAYLOAD) == manual(PAYLOAD)
+
+    print(f"{options.count} payloads")
+    print(f"{'validator':<22} {'us/payload':>11} {'payloads/s':>12}")
+    for name, validate in [("manual loop", manual), ("compiled", compiled), ("restx jsonschema", jsonschema)]:
+        seconds = measure(validate, options.count)
+        print(f"{name:<22} {seconds / options.count * 1e6:>11.2f} {options.count / seconds:>12,.0f}")
+
+
+if __name__ == "__main__":
+    main()
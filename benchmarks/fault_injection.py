@@ -0,0 +1,104 @@
+"""Gateway behaviour while one upstream is slow or failing.
+
+Runs the gateway against the fault-injecting stub and drives concurrent
+customer and inventory lookups through three phases: healthy, inventory
+faulty, and recovered. With the circuit breakers, per-upstream concurrency
+caps and load shedding in place, customer lookups keep their latency while
+inventory is faulty, and inventory lookups fail fast with 503 once its
+circuit opens.
+
+    python benchmarks/fault_injection.py --latency 3 --phase-seconds 10
+    python benchmarks/fault_injection.py --error-rate 1.0
+"""
+import argparse
+import os
+import threading
+import time
+from collections import defaultdict
+
+import requests
+
+from services import load_service, serve_in_thread
+from stubs import StubState, start_stub_server
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def drive(gateway_url, clients, seconds):
+    """Alternate customer and inventory lookups from ``clients`` threads; returns per-route samples."""
+    results = defaultdict(list)
+    lock = threading.Lock()
+    stop_at = time.monotonic() + seconds
+
+    def client(index):
+        session = requests.Session()
+        routes = [("customer", f"{gateway_url}/customers/c{index}"), ("inventory", f"{gateway_url}/inventory/p{index}")]
+        turn = index
+        while time.monotonic() < stop_at:
+            route, url = routes[turn % 2]
+            turn += 1
+            started = time.perf_counter()
+            try:
+                status = session.get(url, timeout=30).status_code
+            except requests.RequestException:
+                status = "error"
+            with lock:
+                results[route].append((status, (time.perf_counter() - started) * 1000))
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def report(phase, results, gateway):
+    stats = gateway.upstreams["inventory"].stats()["circuit"]
+    print(f"\n{phase}: inventory circuit {stats['state']}, opened {stats['times_opened']}x, "
+          f"rejected {stats['rejected']}, shed {gateway.concurrency_limiter.stats()['shed']}")
+    print(f"{'route':<10} {'reqs':>6} {'ok':>6} {'503':>6} {'p50 ms':>8} {'p99 ms':>8}")
+    for route, samples in sorted(results.items()):
+        latencies = [latency for _, latency in samples]
+        ok = sum(1 for status, _ in samples if status == 200)
+        unavailable = sum(1 for status, _ in samples if status == 503)
+        print(f"{route:<10} {len(samples):>6} {ok:>6} {unavailable:>6} "
+              f"{percentile(latencies, 50):>8.1f} {percentile(latencies, 99):>8.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--clients", type=int, default=16)
+    parser.add_argument("--phase-seconds", type=float, default=5)
+    parser.add_argument("--latency", type=float, default=3.0, help="injected inventory latency, seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of inventory calls that fail")
+    parser.add_argument("--max-inflight", type=int, default=32, help="gateway concurrency limit")
+    options = parser.parse_args()
+
+    state = StubState()
+    _, stub_url = start_stub_server(state)
+    for name in ("CUSTOMER", "PRODUCT", "INVENTORY", "ORDER", "PAYMENT"):
+        os.environ[f"{name}_SERVICE_URL"] = stub_url
+    os.environ.setdefault("UPSTREAM_BREAKER_OPEN_SECONDS", "2")
+    os.environ.setdefault("UPSTREAM_BREAKER_SLOW_CALL_SECONDS", "1")
+    os.environ["GATEWAY_MAX_INFLIGHT"] = str(options.max_inflight)
+    gateway = load_service("gateway")
+    # Every 503 is logged with a traceback otherwise.
+    gateway.app.logger.disabled = True
+    gateway_url = serve_in_thread(gateway.app)
+
+    report("healthy", drive(gateway_url, options.clients, options.phase_seconds), gateway)
+
+    state.set_fault("inventory", latency=options.latency, error_rate=options.error_rate)
+    report("inventory faulty", drive(gateway_url, options.clients, options.phase_seconds), gateway)
+
+    state.clear_faults()
+    time.sleep(gateway.upstreams["inventory"].breaker.open_seconds)
+    report("recovered", drive(gateway_url, options.clients, options.phase_seconds), gateway)
+
+
+if __name__ == "__main__":
+    main()
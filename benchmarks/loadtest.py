@@ -0,0 +1,211 @@
+"""End-to-end load test of the gateway and services.
+
+Boots all six services in this process (see services.py), seeds customers,
+products and inventory, then drives a weighted mix of requests at a fixed
+arrival rate. Latency is measured from each request's scheduled start, so a
+slow server is not hidden by the load generator backing off. A response
+other than the scenario's expected status, 4xx included, counts as an error.
+
+    python benchmarks/loadtest.py --rps 200 --duration 30 --output run.json
+    python benchmarks/loadtest.py --rps 200 --duration 30 --baseline run.json
+
+With --stubs the gateway talks to canned stub upstreams instead of the real
+services, which isolates gateway overhead. With --in-process the gateway
+calls the services in this process without sockets (see local_stack.py), a
+zero-network baseline for the same paths. Without MONGO_URI the services
+share an in-memory mongomock database.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from services import Stack
+from stubs import StubState, start_stub_server
+
+DEFAULT_MIX = "create_order=2,get_customer=3,get_product=5,get_inventory=2,get_orders=1,list_products=1,list_orders=1"
+STUB_SCENARIOS = {"create_order", "get_customer", "get_product", "get_inventory"}
+# Any other status, a 4xx included, counts as an error. create_order answers
+# 202 when the gateway runs the order pipeline asynchronously.
+EXPECTED_STATUSES = {"create_order": {201, 202}}
+DEFAULT_EXPECTED_STATUSES = {200}
+
+
+def seed(stack, customers, products):
+    """Create customers, products and well-stocked inventory; returns their IDs."""
+    if not stack.modules.get("customer"):
+        return [f"customer-{i}" for i in range(customers)], [f"product-{i}" for i in range(products)]
+    now = "2024-01-01T00:00:00"
+    response = requests.post(f"{stack.urls['customer']}/customers/bulk", json=[
+        {"name": f"Customer {i}", "email": f"c{i}@example.com", "address": "1 Main St",
+         "updated": now, "confirmed": True, "orders_history": []} for i in range(customers)])
+    customer_ids = [result["customer_id"] for result in response.json()["results"]]
+    response = requests.post(f"{stack.urls['product']}/products/bulk", json=[
+        {"name": f"Product {i}", "description": "Load test product", "price": 10.0 + i % 50,
+         "updated": now, "expired": False, "categories": ["load"]} for i in range(products)])
+    product_ids = [result["product_id"] for result in response.json()["results"]]
+    requests.post(f"{stack.urls['inventory']}/inventory/bulk", json=[
+        {"product_id": product_id, "stock": 10 ** 9, "updated": now,
+         "low_stock_alert": False, "warehouse_locations": ["A"]} for product_id in product_ids])
+    return customer_ids, product_ids
+
+
+def make_scenarios(urls, customer_ids, product_ids):
+    gateway = urls["gateway"]
+
+    def create_order(session):
+        cart = random.sample(product_ids, random.randint(1, min(5, len(product_ids))))
+        return session.post(f"{gateway}/create-order", json={
+            "customer_id": random.choice(customer_ids),
+            "products": [{"product_id": product_id, "quantity": 1} for product_id in cart],
+            "total_amount": 0, "status": "pending", "timestamp": "2024-01-01T00:00:00",
+            "updated": "2024-01-01T00:00:00", "confirmed": False, "tracking_numbers": [],
+        })
+
+    return {
+        "create_order": create_order,
+        "get_customer": lambda session: session.get(f"{gateway}/customers/{random.choice(customer_ids)}"),
+        "get_product": lambda session: session.get(f"{gateway}/products/{random.choice(product_ids)}"),
+        "get_inventory": lambda session: session.get(f"{gateway}/inventory/{random.choice(product_ids)}"),
+        "get_orders": lambda session: session.get(f"{gateway}/orders/{random.choice(customer_ids)}"),
+        "list_products": lambda session: session.get(f"{urls['product']}/products/?limit=50"),
+        "list_orders": lambda session: session.get(f"{urls['order']}/orders/?limit=50"),
+    }
+
+
+def parse_mix(mix, allowed):
+    weights = {}
+    for entry in mix.split(","):
+        name, _, weight = entry.partition("=")
+        if name in allowed:
+            weights[name] = float(weight or 1)
+    return weights
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def run_load(scenarios, weights, rps, duration, concurrency):
+    names = list(weights)
+    cumulative = [sum(list(weights.values())[:i + 1]) for i in range(len(names))]
+    samples = {name: [] for name in names}
+    errors = {name: 0 for name in names}
+    unexpected = {name: {} for name in names}
+    lock = threading.Lock()
+    local = threading.local()
+
+    def execute(name, scheduled):
+        if not hasattr(local, "session"):
+            local.session = requests.Session()
+        try:
+            status = scenarios[name](local.session).status_code
+        except requests.RequestException:
+            status = "error"
+        latency = (time.perf_counter() - scheduled) * 1000
+        with lock:
+            samples[name].append(latency)
+            if status not in EXPECTED_STATUSES.get(name, DEFAULT_EXPECTED_STATUSES):
+                errors[name] += 1
+                unexpected[name][str(status)] = unexpected[name].get(str(status), 0) + 1
+
+    total = int(rps * duration)
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for i in range(total):
+            scheduled = started + i / rps
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            pick = random.uniform(0, cumulative[-1])
+            name = next(name for name, bound in zip(names, cumulative) if pick <= bound)
+            executor.submit(execute, name, scheduled)
+    elapsed = time.perf_counter() - started
+
+    report = {}
+    for name in names:
+        if not samples[name]:
+            continue
+        report[name] = {
+            "requests": len(samples[name]),
+            "throughput": len(samples[name]) / elapsed,
+            "error_rate": errors[name] / len(samples[name]),
+            "unexpected_statuses": unexpected[name],
+            "p50_ms": percentile(samples[name], 50),
+            "p95_ms": percentile(samples[name], 95),
+            "p99_ms": percentile(samples[name], 99),
+        }
+    return report
+
+
+def compare(report, baseline, tolerance):
+    """Return a description of every endpoint that regressed against ``baseline``."""
+    regressions = []
+    for name, current in report.items():
+        previous = baseline.get(name)
+        if not previous:
+            continue
+        for metric in ("p50_ms", "p99_ms"):
+            if current[metric] > previous[metric] * (1 + tolerance):
+                regressions.append(f"{name}: {metric} {previous[metric]:.1f} -> {current[metric]:.1f}")
+        if current["error_rate"] > previous["error_rate"] + 0.01:
+            regressions.append(f"{name}: error rate {previous['error_rate']:.2%} -> {current['error_rate']:.2%}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rps", type=float, default=50)
+    parser.add_argument("--duration", type=float, default=10, help="seconds")
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="comma-separated scenario=weight pairs")
+    parser.add_argument("--customers", type=int, default=100)
+    parser.add_argument("--products", type=int, default=500)
+    parser.add_argument("--stubs", action="store_true", help="use stub upstreams behind the gateway")
+    parser.add_argument("--stub-latency", type=float, default=0.0)
+    parser.add_argument("--in-process", action="store_true", help="route gateway calls to the services without sockets")
+    parser.add_argument("--output", help="write the report as JSON")
+    parser.add_argument("--baseline", help="JSON report to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed latency growth over baseline")
+    options = parser.parse_args()
+    if options.stubs and options.in_process:
+        parser.error("--stubs and --in-process are mutually exclusive")
+
+    stub_url = None
+    if options.stubs:
+        _, stub_url = start_stub_server(StubState(latency=options.stub_latency))
+    stack = Stack(mongo_uri=os.getenv("MONGO_URI"), stub_base_url=stub_url, in_process=options.in_process)
+    customer_ids, product_ids = seed(stack, options.customers, options.products)
+    scenarios = make_scenarios(stack.urls, customer_ids, product_ids)
+    weights = parse_mix(options.mix, STUB_SCENARIOS if options.stubs else scenarios)
+
+    report = run_load(scenarios, weights, options.rps, options.duration, options.concurrency)
+    print(f"{'endpoint':<15} {'reqs':>7} {'rps':>8} {'err%':>6} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for name, stats in report.items():
+        print(f"{name:<15} {stats['requests']:>7} {stats['throughput']:>8.1f} {stats['error_rate']:>6.1%} "
+              f"{stats['p50_ms']:>8.1f} {stats['p95_ms']:>8.1f} {stats['p99_ms']:>8.1f}")
+    for name, stats in report.items():
+        if stats["unexpected_statuses"]:
+            counts = ", ".join(f"{status} x{count}" for status, count in sorted(stats["unexpected_statuses"].items()))
+            print(f"{name}: unexpected responses {counts}")
+
+    if options.output:
+        with open(options.output, "w") as output:
+            json.dump(report, output, indent=2)
+    if options.baseline:
+        with open(options.baseline) as baseline:
+            regressions = compare(report, json.load(baseline), options.tolerance)
+        if regressions:
+            sys.exit("Regressions against baseline:\n" + "\n".join(regressions))
+        print("No regressions against baseline")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""Boot the real services in-process for benchmarks.
+
+Each service module is loaded from its script path and served on an
+ephemeral port by a threaded Werkzeug server. Storage is the database in
+MONGO_URI, or the shared in-memory stand-in when no URI is given. With
+``in_process=True`` the stack is local_stack.LocalStack served on a single
+port, so only the client's hop to the gateway uses a socket.
+"""
+import os
+import sys
+import threading
+
+from werkzeug.serving import WSGIRequestHandler, make_server
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import local_stack  # noqa: E402
+
+SERVICES = local_stack.SCRIPTS
+
+
+def load_service(name):
+    """Import a service script as a module named ``<name>_service``."""
+    os.environ.setdefault("MONGO_URI", "mongodb://localhost:27017/benchmark")
+    return local_stack.load_service(name)
+
+
+class QuietRequestHandler(WSGIRequestHandler):
+    def log_request(self, *args, **kwargs):
+        pass
+
+
+def serve_in_thread(app, host="127.0.0.1"):
+    """Serve ``app`` on a background thread and return its base URL."""
+    server = make_server(host, 0, app, threaded=True, request_handler=QuietRequestHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://{host}:{server.server_port}"
+
+
+class Stack:
+    """All six services running in this process, wired to each other over HTTP."""
+
+    def __init__(self, mongo_uri=None, stub_base_url=None, in_process=False):
+        self.modules = {}
+        self.urls = {}
+        if mongo_uri:
+            os.environ["MONGO_URI"] = mongo_uri
+            os.environ["MONGO_BACKEND"] = "pymongo"
+        else:
+            os.environ["MONGO_BACKEND"] = "memory"
+
+        if in_process:
+            stack = local_stack.LocalStack()
+            self.modules = stack.modules
+            base_url = serve_in_thread(stack.app)
+            self.urls = {name: f"{base_url}{local_stack.mount_path(name)}" for name in SERVICES}
+            self.urls["gateway"] = base_url
+            stack.start_background_tasks()
+            return
+
+        if stub_base_url:
+            self.urls = {name: stub_base_url for name in SERVICES if name != "gateway"}
+        else:
+            for name in SERVICES:
+                if name == "gateway":
+                    continue
+                module = load_service(name)
+                module.ensure_indexes(module.mongo.db, module.INDEXES)
+                self.modules[name] = module
+                self.urls[name] = serve_in_thread(module.app)
+
+        for name, url in self.urls.items():
+            os.environ[f"{name.upper()}_SERVICE_URL"] = url
+        gateway = load_service("gateway")
+        gateway.ensure_indexes(gateway.mongo.db, gateway.INDEXES)
+        self.modules["gateway"] = gateway
+        self.urls["gateway"] = serve_in_thread(gateway.app)
+        if "product" in self.modules:
+            os.environ["GATEWAY_URL"] = self.urls["gateway"]
+        gateway.start_background_tasks()
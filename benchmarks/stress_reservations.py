@@ -0,0 +1,70 @@
+"""Concurrency stress check for inventory reservations.
+
+Many threads reserve and release random multi-item carts against a small
+stock pool, then the script verifies that stock never went negative and that
+everything still held plus what is on the shelf equals the initial stock.
+Needs a real mongod, since the guarantee comes from its atomic updates:
+
+    MONGO_URI=mongodb://localhost:27017/stress python benchmarks/stress_reservations.py
+"""
+import argparse
+import os
+import random
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+from services import load_service
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--products", type=int, default=5)
+    parser.add_argument("--stock", type=int, default=20)
+    parser.add_argument("--threads", type=int, default=32)
+    parser.add_argument("--attempts", type=int, default=2000)
+    options = parser.parse_args()
+    if not os.getenv("MONGO_URI"):
+        sys.exit("Set MONGO_URI to a scratch database on a running mongod")
+
+    service = load_service("inventory")
+    db = service.mongo.db
+    db.inventory.drop()
+    db.reservations.drop()
+    service.ensure_indexes(db, service.INDEXES)
+    product_ids = [f"stress-{i}" for i in range(options.products)]
+    db.inventory.insert_many([{"product_id": product_id, "stock": options.stock} for product_id in product_ids])
+
+    def attempt(_):
+        client = service.app.test_client()
+        items = [{"product_id": product_id, "quantity": random.randint(1, 3)}
+                 for product_id in random.sample(product_ids, random.randint(1, len(product_ids)))]
+        response = client.post("/inventory/reservations", json={"items": items})
+        if response.status_code == 201 and random.random() < 0.5:
+            client.post(f"/inventory/reservations/{response.json['reservation_id']}/release")
+        return response.status_code
+
+    with ThreadPoolExecutor(max_workers=options.threads) as executor:
+        statuses = list(executor.map(attempt, range(options.attempts)))
+
+    held = {product_id: 0 for product_id in product_ids}
+    for reservation in db.reservations.find({"status": "held"}):
+        for item in reservation["items"]:
+            held[item["product_id"]] += item["quantity"]
+
+    failures = []
+    for inventory in db.inventory.find({"product_id": {"$in": product_ids}}):
+        product_id = inventory["product_id"]
+        if inventory["stock"] < 0:
+            failures.append(f"{product_id}: stock went negative ({inventory['stock']})")
+        if inventory["stock"] + held[product_id] != options.stock:
+            failures.append(f"{product_id}: stock {inventory['stock']} + held {held[product_id]} != {options.stock}")
+
+    print(f"reserved: {statuses.count(201)}  rejected: {statuses.count(409)}  other: "
+          f"{len(statuses) - statuses.count(201) - statuses.count(409)}")
+    if failures:
+        sys.exit("\n".join(failures))
+    print("stock never went negative and is fully accounted for")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""Local stand-ins for the downstream services used by the benchmarks.
+
+Each stub answers the routes the gateway calls with canned documents after an
+optional artificial delay, so gateway overhead can be measured without MongoDB
+or the real services running. Faults (extra latency, error responses) can be
+injected per service, keyed by the first path segment, either through
+``StubState.set_fault`` or with ``POST /_faults {"inventory": {...}}``.
+"""
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class StubState:
+    def __init__(self, latency=0.0, stock=100, price=10.0):
+        self.latency = latency
+        self.stock = stock
+        self.price = price
+        self.faults = {}
+
+    def set_fault(self, service, latency=0.0, error_rate=0.0, status=503):
+        """Delay calls to ``service`` (e.g. "inventory") and fail a fraction of them."""
+        self.faults[service] = {"latency": latency, "error_rate": error_rate, "status": status}
+
+    def clear_faults(self):
+        self.faults = {}
+
+    def apply_fault(self, path):
+        """Sleep for the injected latency; returns an error status to send, or None."""
+        fault = self.faults.get(path.strip("/").split("/", 1)[0])
+        if not fault:
+            return None
+        if fault.get("latency"):
+            time.sleep(fault["latency"])
+        if random.random() < fault.get("error_rate", 0.0):
+            return fault.get("status", 503)
+        return None
+
+    def configure_faults(self, body):
+        self.clear_faults()
+        for service, fault in (body or {}).items():
+            self.set_fault(service, **fault)
+        return self.faults
+
+    def customer(self, customer_id):
+        return {"customer_id": customer_id, "name": "Stub Customer", "orders_history": []}
+
+    def product(self, product_id):
+        return {"product_id": product_id, "name": f"Product {product_id}", "price": self.price}
+
+    def inventory(self, product_id):
+        return {"product_id": product_id, "stock": self.stock}
+
+    def reserve(self, items):
+        return {"reservation_id": str(uuid.uuid4()), "items": items, "status": "held"}
+
+
+def _make_handler(state):
+    routes = [
+        ("POST", re.compile(r"^/_faults$"), lambda m, body: (200, state.configure_faults(body))),
+        ("POST", re.compile(r"^/products/batch$"), lambda m, body: (200, {i: state.product(i) for i in body["product_ids"]})),
+        ("POST", re.compile(r"^/inventory/batch$"), lambda m, body: (200, {i: state.inventory(i) for i in body["product_ids"]})),
+        ("POST", re.compile(r"^/inventory/reservations$"), lambda m, body: (201, state.reserve(body["items"]))),
+        ("POST", re.compile(r"^/inventory/reservations/[^/]+/(commit|release)$"), lambda m, body: (200, {})),
+        ("GET", re.compile(r"^/products/changes$"), lambda m, body: (200, {
+            "changes": [], "deleted": [], "cursor": None, "server_time": datetime.utcnow().isoformat()})),
+        ("GET", re.compile(r"^/customers/(?P<id>[^/]+)$"), lambda m, body: (200, state.customer(m["id"]))),
+        ("GET", re.compile(r"^/products/(?P<id>[^/]+)$"), lambda m, body: (200, state.product(m["id"]))),
+        ("GET", re.compile(r"^/inventory/(?P<id>[^/]+)$"), lambda m, body: (200, state.inventory(m["id"]))),
+        ("POST", re.compile(r"^/orders/?$"), lambda m, body: (201, dict(body, order_id=str(uuid.uuid4())))),
+        ("POST", re.compile(r"^/payments/?$"), lambda m, body: (201, dict(body, payment_id=str(uuid.uuid4())))),
+    ]
+
+    class StubHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        disable_nagle_algorithm = True
+
+        def log_message(self, format, *args):
+            pass
+
+        def _dispatch(self, method):
+            length = int(self.headers.get("Content-Length") or 0)
+            body = json.loads(self.rfile.read(length)) if length else None
+            path = self.path.split("?", 1)[0]
+            for route_method, pattern, handler in routes:
+                match = pattern.match(path)
+                if route_method == method and match:
+                    if state.latency:
+                        time.sleep(state.latency)
+                    fault_status = state.apply_fault(path)
+                    if fault_status:
+                        status, payload = fault_status, {"message": "Injected fault"}
+                    else:
+                        status, payload = handler(match, body)
+                    break
+            else:
+                status, payload = 404, {"message": "Not found"}
+            data = json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            self._dispatch("GET")
+
+        def do_POST(self):
+            self._dispatch("POST")
+
+    return StubHandler
+
+
+def start_stub_server(state, host="127.0.0.1", port=0):
+    """Start a stub server on a background thread and return (server, base_url)."""
+    server_class = type("StubServer", (ThreadingHTTPServer,), {"request_queue_size": 128})
+    server = server_class((host, port), _make_handler(state))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}"
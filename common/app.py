@@ -0,0 +1,82 @@
+"""App factory shared by the services.
+
+``create_service(import_name, service, title)`` returns the Flask app, the
+PyMongo client and the flask-restx Api, set up the same way everywhere:
+request tracing, the shared JSON encoder and a Mongo client configured from
+these variables:
+
+- ``MONGO_MAX_POOL_SIZE`` / ``MONGO_MIN_POOL_SIZE``: connections per process (default 50 / 0)
+- ``MONGO_CONNECT_TIMEOUT_MS``: TCP connect timeout (default 2000)
+- ``MONGO_SERVER_SELECTION_TIMEOUT_MS``: how long an operation waits for a usable server (default 5000)
+- ``MONGO_SOCKET_TIMEOUT_MS``: per-operation network timeout (default none)
+- ``MONGO_READ_PREFERENCE``: such as ``secondaryPreferred`` (default primary)
+
+These take precedence over the same options in ``MONGO_URI``. With
+``MONGO_BACKEND=memory`` the services use an in-memory mongomock database
+instead, shared by every service in the process and named after the
+database in ``MONGO_URI`` (default ``ecommerce``); see local_stack.py. The
+Swagger UI is served at ``/`` unless ``SWAGGER_UI=0``. Like
+``/swagger.json`` it is only rendered when first requested.
+"""
+import os
+import threading
+from urllib.parse import urlsplit
+
+from flask import Flask
+from flask_pymongo import PyMongo
+from flask_restx import Api
+
+from common.encoding import init_json
+from common.tracing import init_tracing
+
+
+def mongo_client_options():
+    options = {
+        "maxPoolSize": int(os.getenv("MONGO_MAX_POOL_SIZE", "50")),
+        "minPoolSize": int(os.getenv("MONGO_MIN_POOL_SIZE", "0")),
+        "connectTimeoutMS": int(os.getenv("MONGO_CONNECT_TIMEOUT_MS", "2000")),
+        "serverSelectionTimeoutMS": int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", "5000")),
+    }
+    if os.getenv("MONGO_SOCKET_TIMEOUT_MS"):
+        options["socketTimeoutMS"] = int(os.getenv("MONGO_SOCKET_TIMEOUT_MS"))
+    if os.getenv("MONGO_READ_PREFERENCE"):
+        options["readPreference"] = os.getenv("MONGO_READ_PREFERENCE")
+    return options
+
+
+class InMemoryMongo:
+    """Stands in for PyMongo with a mongomock client shared across the process."""
+
+    _client = None
+    _lock = threading.Lock()
+
+    def __init__(self, db_name):
+        with InMemoryMongo._lock:
+            if InMemoryMongo._client is None:
+                import mongomock
+                InMemoryMongo._client = mongomock.MongoClient()
+        self.cx = InMemoryMongo._client
+        self.db = self.cx[db_name]
+
+    def init_app(self, app, **kwargs):
+        """Nothing to reconnect after a fork; kept so serving code can treat both backends alike."""
+
+
+def create_mongo(app):
+    backend = os.getenv("MONGO_BACKEND", "pymongo")
+    if backend == "memory":
+        return InMemoryMongo(urlsplit(app.config["MONGO_URI"] or "").path.lstrip("/") or "ecommerce")
+    if backend != "pymongo":
+        raise ValueError(f"Unknown MONGO_BACKEND {backend!r}; use pymongo or memory")
+    return PyMongo(app, **mongo_client_options())
+
+
+def create_service(import_name, service, title):
+    """Build ``(app, mongo, api)`` for a service."""
+    app = Flask(import_name)
+    app.config["MONGO_URI"] = os.getenv("MONGO_URI")
+    init_tracing(app, service)
+    mongo = create_mongo(app)
+    api = Api(app, title=title, version="1.0", doc="/" if os.getenv("SWAGGER_UI", "1") != "0" else False)
+    init_json(app, api)
+    return app, mongo, api
@@ -0,0 +1,144 @@
+"""Bulk create and upsert endpoints.
+
+Items arrive as a JSON array or as an NDJSON stream (``application/x-ndjson``),
+are validated one by one with the service's document builder and are written
+in unordered chunks, so one bad item does not stop the rest of its chunk.
+"""
+import json
+import os
+
+from flask import request
+from flask_restx import abort
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+DEFAULT_CHUNK_SIZE = int(os.getenv("BULK_CHUNK_SIZE", "1000"))
+MAX_CHUNK_SIZE = 10000
+NDJSON_MIMETYPES = ("application/x-ndjson", "application/jsonl")
+
+BULK_PARAMS = {
+    'mode': 'insert (default) or upsert, keyed on the resource ID',
+    'chunk_size': f'Documents per write (default {DEFAULT_CHUNK_SIZE}, max {MAX_CHUNK_SIZE})',
+}
+
+
+def _read_items():
+    """Yield the request items, parsing NDJSON line by line as it streams in."""
+    if request.mimetype in NDJSON_MIMETYPES:
+        for line in request.stream:
+            if not line.strip():
+                continue
+            try:
+                yield json.loads(line)
+            except ValueError:
+                yield ValueError("Invalid JSON line")
+        return
+    items = request.get_json(silent=True)
+    if not isinstance(items, list):
+        abort(400, "Expected a JSON array or an application/x-ndjson body")
+    yield from items
+
+
+def _chunks(items, size):
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _write_errors(exc):
+    return {error["index"]: error.get("errmsg", "Write failed") for error in exc.details.get("writeErrors", [])}
+
+
+def _insert_chunk(collection, documents):
+    try:
+        collection.insert_many([document for _, document in documents], ordered=False)
+        return {}, set()
+    except BulkWriteError as exc:
+        return _write_errors(exc), set()
+
+
+def _upsert_chunk(collection, documents, key_field, upsert_update):
+    operations = [UpdateOne({key_field: document[key_field]}, upsert_update(document), upsert=True)
+                  for _, document in documents]
+    try:
+        result = collection.bulk_write(operations, ordered=False)
+        return {}, set(result.upserted_ids)
+    except BulkWriteError as exc:
+        upserted = {upsert["index"] for upsert in exc.details.get("upserted", [])}
+        return _write_errors(exc), upserted
+
+
+def _set_document(document):
+    return {"$set": document}
+
+
+def bulk_ingest(collection, build_document, key_field, after_chunk=None, upsert_update=_set_document):
+    """Validate and write the request's items, returning a per-item result summary.
+
+    ``build_document(item)`` returns the document to store or raises ValueError.
+    In upsert mode each item must carry ``key_field`` and is written with the
+    update returned by ``upsert_update(document)``, by default a plain ``$set``.
+    ``after_chunk`` is called with the key of every document updated in place
+    by an upsert.
+    """
+    mode = request.args.get("mode", "insert")
+    if mode not in ("insert", "upsert"):
+        abort(400, "mode must be insert or upsert")
+    try:
+        chunk_size = int(request.args.get("chunk_size", DEFAULT_CHUNK_SIZE))
+    except ValueError:
+        abort(400, "chunk_size must be an integer")
+    if not 1 <= chunk_size <= MAX_CHUNK_SIZE:
+        abort(400, f"chunk_size must be between 1 and {MAX_CHUNK_SIZE}")
+
+    results = []
+    counts = {"created": 0, "updated": 0, "failed": 0}
+    index = 0
+    for chunk in _chunks(_read_items(), chunk_size):
+        documents = []
+        for item in chunk:
+            try:
+                if isinstance(item, Exception):
+                    raise item
+                document = build_document(item)
+                if mode == "upsert":
+                    if not isinstance(item.get(key_field), str):
+                        raise ValueError(f"Missing required field: {key_field}")
+                    document[key_field] = item[key_field]
+                documents.append((index, document))
+            except ValueError as exc:
+                results.append({"index": index, "status": "error", "error": str(exc)})
+                counts["failed"] += 1
+            index += 1
+
+        if not documents:
+            continue
+        if mode == "insert":
+            errors, upserted = _insert_chunk(collection, documents)
+        else:
+            errors, upserted = _upsert_chunk(collection, documents, key_field, upsert_update)
+
+        updated_keys = []
+        for position, (item_index, document) in enumerate(documents):
+            result = {"index": item_index, key_field: document[key_field]}
+            if position in errors:
+                result.update(status="error", error=errors[position])
+                counts["failed"] += 1
+            elif mode == "insert" or position in upserted:
+                result["status"] = "created"
+                counts["created"] += 1
+            else:
+                result["status"] = "updated"
+                counts["updated"] += 1
+                updated_keys.append(document[key_field])
+            results.append(result)
+        if after_chunk and updated_keys:
+            after_chunk(updated_keys)
+
+    results.sort(key=lambda result: result["index"])
+    return dict(counts, results=results), 200
@@ -0,0 +1,83 @@
+"""Streaming NDJSON export of a Mongo collection.
+
+Documents are encoded one at a time as the cursor yields them, so peak memory
+depends on the cursor batch size rather than the number of documents exported.
+"""
+import os
+import zlib
+from datetime import datetime
+
+from flask import Response, request, stream_with_context
+from flask_restx import abort
+
+from common.encoding import dumps
+
+DEFAULT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "1000"))
+MAX_BATCH_SIZE = 10000
+
+EXPORT_PARAMS = {
+    'date_field': 'Date field to filter on (timestamp or updated, default timestamp)',
+    'from': 'Only documents at or after this ISO 8601 date',
+    'to': 'Only documents before this ISO 8601 date',
+    'batch_size': f'Documents fetched per cursor batch (default {DEFAULT_BATCH_SIZE})',
+    'gzip': 'Set to 1 to gzip the stream',
+}
+
+
+def _parse_date(name):
+    value = request.args.get(name)
+    if value is None:
+        return None
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        abort(400, f"Invalid {name} date. Use ISO 8601.")
+
+
+def _ndjson_lines(cursor):
+    for document in cursor:
+        yield dumps(document) + b"\n"
+
+
+def _gzipped(chunks, flush_bytes=64 * 1024):
+    compressor = zlib.compressobj(wbits=16 + zlib.MAX_WBITS)
+    pending = 0
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        pending += len(chunk)
+        if pending >= flush_bytes:
+            data += compressor.flush(zlib.Z_SYNC_FLUSH)
+            pending = 0
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def export_response(collection, date_fields, filename):
+    """Stream ``collection`` as NDJSON, filtered by the request's date range arguments."""
+    date_field = request.args.get("date_field", date_fields[0])
+    if date_field not in date_fields:
+        abort(400, f"date_field must be one of: {', '.join(date_fields)}")
+    try:
+        batch_size = int(request.args.get("batch_size", DEFAULT_BATCH_SIZE))
+    except ValueError:
+        abort(400, "batch_size must be an integer")
+    if not 1 <= batch_size <= MAX_BATCH_SIZE:
+        abort(400, f"batch_size must be between 1 and {MAX_BATCH_SIZE}")
+
+    query = {}
+    start, end = _parse_date("from"), _parse_date("to")
+    if start or end:
+        query[date_field] = {}
+        if start:
+            query[date_field]["$gte"] = start
+        if end:
+            query[date_field]["$lt"] = end
+
+    cursor = collection.find(query, {"_id": 0}).sort(date_field, 1).batch_size(batch_size)
+    body = _ndjson_lines(cursor)
+    headers = {"Content-Disposition": f'attachment; filename="{filename}.ndjson"'}
+    if request.args.get("gzip") in ("1", "true"):
+        body = _gzipped(body)
+        headers["Content-Encoding"] = "gzip"
+    return Response(stream_with_context(body), mimetype="application/x-ndjson", headers=headers)
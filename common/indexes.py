@@ -0,0 +1,85 @@
+"""Index bootstrap and query-plan diagnostics.
+
+Each service declares the indexes its queries rely on as
+``{collection: [IndexModel, ...]}`` and its hot queries as
+``{name: (collection, filter, sort)}``. ``ensure_indexes`` runs at startup and
+``/diagnostics/query-plans`` explains every hot query and flags collection scans.
+Backends that cannot explain queries, such as the in-memory stand-in, get a
+report that lists every query as unexplained.
+"""
+import logging
+
+from flask_restx import Resource
+from pymongo.errors import OperationFailure
+
+logger = logging.getLogger(__name__)
+
+
+def ensure_indexes(db, indexes):
+    """Create any declared index that does not exist yet.
+
+    A collection whose indexes cannot be built (for example a unique index over
+    existing duplicates) is logged and skipped so the service still starts;
+    the query-plan diagnostics will show the missing index.
+    """
+    for collection, models in indexes.items():
+        try:
+            db[collection].create_indexes(models)
+        except OperationFailure as exc:
+            logger.error("Could not create indexes on %s: %s", collection, exc)
+
+
+def _plan_stages(plan):
+    stages = []
+    if isinstance(plan, dict):
+        if "stage" in plan:
+            stages.append(plan["stage"])
+        for value in plan.values():
+            stages.extend(_plan_stages(value))
+    elif isinstance(plan, list):
+        for value in plan:
+            stages.extend(_plan_stages(value))
+    return stages
+
+
+def explain_queries(db, hot_queries):
+    """Return the winning plan stages of each hot query and whether it scans the collection.
+
+    ``stages`` and ``collscan`` are None for a query the backend could not explain.
+    """
+    report = {}
+    for name, (collection, query, sort) in hot_queries.items():
+        cursor = db[collection].find(query).limit(1)
+        if sort:
+            cursor = cursor.sort(sort)
+        if not hasattr(cursor, "explain"):
+            report[name] = {"collection": collection, "stages": None, "collscan": None,
+                            "error": "The database backend cannot explain queries"}
+            continue
+        winning_plan = cursor.explain().get("queryPlanner", {}).get("winningPlan", {})
+        stages = _plan_stages(winning_plan)
+        report[name] = {
+            "collection": collection,
+            "stages": stages,
+            "collscan": "COLLSCAN" in stages,
+        }
+    return report
+
+
+def register_diagnostics(api, mongo, hot_queries):
+    """Add GET /diagnostics/query-plans to ``api``."""
+    diagnostics_ns = api.namespace('diagnostics', description='Service diagnostics')
+
+    @diagnostics_ns.route('/query-plans')
+    class QueryPlans(Resource):
+        @diagnostics_ns.doc('explain_hot_queries')
+        def get(self):
+            """Explain each hot query and flag any that fall back to COLLSCAN"""
+            report = explain_queries(mongo.db, hot_queries)
+            return {
+                "queries": report,
+                "collscans": sorted(name for name, plan in report.items() if plan["collscan"]),
+                "unexplained": sorted(name for name, plan in report.items() if plan["collscan"] is None),
+            }, 200
+
+    return diagnostics_ns
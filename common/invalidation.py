@@ -0,0 +1,48 @@
+"""Telling the gateway to drop cached copies of records that changed.
+
+The call is best effort with a short timeout; the gateway cache's TTL covers
+a notification that is lost. It uses urllib, so services that only make this
+one call do not need an HTTP client library. When the gateway runs in the
+same process (see local_stack.py), ``route_in_process(app)`` sends the
+notifications straight to its WSGI app instead.
+"""
+import json
+import logging
+import os
+import urllib.request
+
+from werkzeug.test import Client
+
+from common.tracing import outbound_headers
+
+logger = logging.getLogger(__name__)
+
+_gateway_client = None
+
+
+def route_in_process(app):
+    global _gateway_client
+    _gateway_client = Client(app) if app is not None else None
+
+
+def invalidate_gateway_cache(cache, keys, timeout=0.5):
+    if _gateway_client is not None:
+        response = _gateway_client.post("/cache/invalidate", json={"cache": cache, "keys": list(keys)},
+                                        headers=outbound_headers())
+        if response.status_code >= 400:
+            logger.warning("Could not invalidate the gateway's %s cache for %s", cache, list(keys))
+        return
+    gateway_url = os.getenv("GATEWAY_URL")
+    if not gateway_url:
+        return
+    request = urllib.request.Request(
+        f"{gateway_url}/cache/invalidate",
+        data=json.dumps({"cache": cache, "keys": list(keys)}).encode(),
+        headers=outbound_headers({"Content-Type": "application/json"}),
+        method="POST",
+    )
+    try:
+        with urllib.request.urlopen(request, timeout=timeout):
+            pass
+    except OSError:
+        logger.warning("Could not invalidate the gateway's %s cache for %s", cache, list(keys))
@@ -0,0 +1,88 @@
+"""Keyset pagination and field projection for list endpoints.
+
+Pages are ordered by ``_id``, which is unique and always indexed, so each page
+is a bounded index range scan and the ``after`` cursor is the last ``_id`` seen.
+The next cursor is returned in the ``X-Next-Cursor`` header and a ``Link``
+header, so the response body remains a plain JSON array.
+"""
+import os
+from urllib.parse import urlencode
+
+from bson import ObjectId
+from bson.errors import InvalidId
+from flask import request
+from flask_restx import abort
+
+from common.encoding import json_response
+
+DEFAULT_LIMIT = int(os.getenv("LIST_DEFAULT_LIMIT", "100"))
+MAX_LIMIT = int(os.getenv("LIST_MAX_LIMIT", "1000"))
+
+LIST_PARAMS = {
+    'limit': f'Page size (default {DEFAULT_LIMIT}, max {MAX_LIMIT})',
+    'after': 'Cursor from the X-Next-Cursor header of the previous page',
+    'fields': 'Comma-separated list of fields to return',
+}
+
+
+def parse_projection(fields, allowed_fields):
+    """Turn a ``fields=a,b`` argument into a Mongo projection, or None for all fields."""
+    if not fields:
+        return None
+    names = [name.strip() for name in fields.split(",") if name.strip()]
+    unknown = [name for name in names if name not in allowed_fields]
+    if unknown:
+        abort(400, f"Unknown fields: {', '.join(unknown)}")
+    return {name: 1 for name in names}
+
+
+def parse_limit():
+    """The request's ``limit`` argument, checked against MAX_LIMIT."""
+    try:
+        limit = int(request.args.get("limit", DEFAULT_LIMIT))
+    except ValueError:
+        abort(400, "limit must be an integer")
+    if not 1 <= limit <= MAX_LIMIT:
+        abort(400, f"limit must be between 1 and {MAX_LIMIT}")
+    return limit
+
+
+def fetch_page(collection, query, allowed_fields, hidden=None):
+    """Return one page of ``collection`` matching ``query`` and the cursor for the next one.
+
+    ``limit``, ``after`` and ``fields`` are read from the request arguments.
+    ``hidden`` is an exclusion projection applied when no ``fields`` are asked for.
+    """
+    limit = parse_limit()
+
+    after = request.args.get("after")
+    if after:
+        try:
+            query = {"$and": [query, {"_id": {"$gt": ObjectId(after)}}]}
+        except (InvalidId, TypeError):
+            abort(400, "Invalid after cursor")
+
+    projection = parse_projection(request.args.get("fields"), allowed_fields) or hidden
+    documents = list(collection.find(query, projection).sort("_id", 1).limit(limit + 1))
+    next_cursor = None
+    if len(documents) > limit:
+        documents = documents[:limit]
+        next_cursor = str(documents[-1]["_id"])
+    return documents, next_cursor
+
+
+def next_page_headers(next_cursor):
+    """``X-Next-Cursor`` and ``Link`` headers pointing at the next page of this request."""
+    if not next_cursor:
+        return {}
+    args = request.args.to_dict(flat=False)
+    args["after"] = [next_cursor]
+    return {
+        "X-Next-Cursor": next_cursor,
+        "Link": f'<{request.base_url}?{urlencode(args, doseq=True)}>; rel="next"',
+    }
+
+
+def page_response(documents, next_cursor):
+    """JSON array response carrying the next-page cursor in its headers."""
+    return json_response(documents, headers=next_page_headers(next_cursor))
@@ -0,0 +1,93 @@
+"""Process entry point shared by the services.
+
+By default a service runs under gunicorn as one worker process with many
+threads; the services mostly wait on Mongo and each other, which releases
+the GIL. The settings come from the environment:
+
+- ``PORT`` / ``HOST``: listen address (the port defaults per service)
+- ``WEB_CONCURRENCY``: worker processes (default 1, see below)
+- ``GUNICORN_THREADS``: threads per worker (default 16 unless the service sets its own)
+- ``GRACEFUL_TIMEOUT``: seconds workers get to finish requests on SIGTERM
+- ``WORKER_TIMEOUT``: seconds before a silent worker is restarted
+- ``MAX_REQUESTS``: recycle a worker after this many requests (0 disables)
+
+``SERVER_MODE=dev`` runs the single-process Werkzeug server instead, with the
+debugger and reloader only when ``FLASK_DEBUG=1``.
+
+Run one worker per service: several kinds of state live in the process and
+are not shared between workers. A ``/cache/invalidate`` call reaches a
+single gateway worker, so the others keep serving stale customers and
+products until their TTL. ``/metrics``, ``/stats`` and sweeper statistics
+describe whichever worker answered, so scraped counters jump between workers.
+Raise ``GUNICORN_THREADS`` for more capacity. Several gateway replicas
+would miss invalidations the same way, so if one is not enough, shorten
+``CUSTOMER_CACHE_TTL`` and ``PRODUCT_CACHE_TTL`` to bound the staleness. A
+warning is logged when ``WEB_CONCURRENCY`` asks for more workers.
+"""
+import logging
+import os
+
+from common.app import mongo_client_options
+
+logger = logging.getLogger(__name__)
+
+
+def _gunicorn_options(host, port, threads):
+    return {
+        "bind": f"{host}:{port}",
+        "workers": int(os.getenv("WEB_CONCURRENCY", "1")),
+        "threads": int(os.getenv("GUNICORN_THREADS", threads)),
+        "worker_class": "gthread",
+        "graceful_timeout": int(os.getenv("GRACEFUL_TIMEOUT", "30")),
+        "timeout": int(os.getenv("WORKER_TIMEOUT", "60")),
+        "keepalive": int(os.getenv("KEEPALIVE", "5")),
+        "max_requests": int(os.getenv("MAX_REQUESTS", "0")),
+        "max_requests_jitter": int(os.getenv("MAX_REQUESTS_JITTER", "0")),
+        "accesslog": os.getenv("ACCESS_LOG") or None,
+        "preload_app": True,
+    }
+
+
+def serve(app, default_port, mongo=None, on_startup=None, on_worker_start=None, threads=16):
+    """Run ``app`` until the process is told to stop.
+
+    ``on_startup`` runs once before any worker starts, such as index creation.
+    ``on_worker_start`` runs in every worker and is where background threads
+    belong, since threads do not survive a fork. The Mongo client is recreated
+    in each worker because PyMongo clients are not fork-safe.
+    """
+    host = os.getenv("HOST", "0.0.0.0")
+    port = int(os.getenv("PORT", default_port))
+    if on_startup:
+        on_startup()
+
+    if os.getenv("SERVER_MODE", "production") == "dev":
+        if on_worker_start:
+            on_worker_start()
+        debug = os.getenv("FLASK_DEBUG") == "1"
+        app.run(host=host, port=port, debug=debug, use_reloader=debug)
+        return
+
+    from gunicorn.app.base import BaseApplication
+
+    def post_fork(server, worker):
+        if mongo is not None:
+            mongo.init_app(app, **mongo_client_options())
+        if on_worker_start:
+            on_worker_start()
+
+    options = _gunicorn_options(host, port, threads)
+    if options["workers"] > 1:
+        logger.warning("Running %d workers: caches, cache invalidation, metrics and stats are per worker "
+                       "and will disagree; see common/serving.py", options["workers"])
+
+    class ServiceApplication(BaseApplication):
+        def load_config(self):
+            for key, value in options.items():
+                self.cfg.set(key, value)
+            self.cfg.set("post_fork", post_fork)
+
+        def load(self):
+            return app
+
+    ServiceApplication().run()
@@ -0,0 +1,115 @@
+"""Background batch updates, such as expiring stale records.
+
+A Sweeper runs a pass every ``interval`` seconds on a daemon thread and keeps
+statistics about it. A BatchSweeper's pass applies one update to every
+document matching a query, ``batch_size`` documents per ``update_many`` call.
+The batch is selected by ``_id`` and the query is repeated in the update
+filter, so a document that stops matching between the two (for example a
+payment that was authorized meanwhile) is left alone. Running a sweeper in
+every worker process is harmless; they only split the work.
+"""
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class Sweeper:
+    """Calls ``run_pass()``, which returns how many documents it handled and in how many batches."""
+
+    def __init__(self, name, run_pass, interval=30.0):
+        self.name = name
+        self.run_pass = run_pass
+        self.interval = interval
+        self._thread = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._passes = 0
+        self._batches = 0
+        self._swept = 0
+        self._seconds = 0.0
+        self._last_pass = None
+        self._failures = 0
+        self._last_error = None
+
+    def sweep(self):
+        """Run one pass now; returns how many documents were handled."""
+        started = time.perf_counter()
+        swept, batches = self.run_pass()
+        seconds = time.perf_counter() - started
+        with self._lock:
+            self._passes += 1
+            self._batches += batches
+            self._swept += swept
+            self._seconds += seconds
+            self._last_pass = {"swept": swept, "batches": batches, "seconds": seconds,
+                               "per_second": swept / seconds if seconds else 0.0}
+        return swept
+
+    def stopping(self):
+        return self._stop.is_set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.sweep()
+            except Exception as exc:
+                with self._lock:
+                    self._failures += 1
+                    self._last_error = str(exc)
+                logger.warning("%s sweep failed: %s", self.name, exc)
+            self._stop.wait(self.interval)
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name=f"{self.name}-sweeper", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "running": self._thread is not None and self._thread.is_alive(),
+                "interval_seconds": self.interval,
+                "passes": self._passes,
+                "batches": self._batches,
+                "swept": self._swept,
+                "per_second": self._swept / self._seconds if self._seconds else 0.0,
+                "last_pass": self._last_pass,
+                "failures": self._failures,
+                "last_error": self._last_error,
+            }
+
+
+class BatchSweeper(Sweeper):
+    """``query()`` and ``update()`` are called on every batch, so they can depend on the current time."""
+
+    def __init__(self, name, collection, query, update, batch_size=500, interval=30.0):
+        super().__init__(name, self._update_batches, interval)
+        self.collection = collection
+        self.query = query
+        self.update = update
+        self.batch_size = batch_size
+
+    def _update_batches(self):
+        """Update until no matching documents are left."""
+        swept = batches = 0
+        while True:
+            query = self.query()
+            ids = [document["_id"] for document in
+                   self.collection().find(query, {"_id": 1}).limit(self.batch_size)]
+            if not ids:
+                break
+            result = self.collection().update_many({"$and": [query, {"_id": {"$in": ids}}]}, self.update())
+            swept += result.modified_count
+            batches += 1
+            if len(ids) < self.batch_size or self.stopping():
+                break
+        return swept, batches
+
+    def stats(self):
+        return dict(super().stats(), batch_size=self.batch_size)
@@ -0,0 +1,170 @@
+"""Request IDs, per-hop timing and Prometheus metrics for the services.
+
+``init_tracing(app, service)`` does the following:
+- reuses the caller's ``X-Request-ID`` or assigns a new one
+- echoes the ID on the response
+- records request latency per endpoint
+- times every MongoDB command through a PyMongo command listener
+- serves all histograms at ``/metrics`` in Prometheus text format
+
+Outbound calls use ``outbound_headers()`` and ``record_hop()`` so the gateway's
+upstream spans share the request ID. With ``TRACE_LOG=1`` each request logs its
+spans under its request ID. Set ``TRACING_ENABLED=0`` to turn all of this off.
+"""
+import bisect
+import logging
+import os
+import threading
+import time
+import uuid
+
+from flask import Response, current_app, g, has_app_context, has_request_context, request
+from pymongo import monitoring
+
+REQUEST_ID_HEADER = "X-Request-ID"
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def tracing_enabled():
+    return os.getenv("TRACING_ENABLED", "1") != "0"
+
+
+class Histogram:
+    """Cumulative latency histogram keyed by a tuple of label values."""
+
+    def __init__(self, name, help_text, label_names):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, labels, seconds):
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * len(BUCKETS), 0.0, 0]
+            index = bisect.bisect_left(BUCKETS, seconds)
+            if index < len(BUCKETS):
+                series[0][index] += 1
+            series[1] += seconds
+            series[2] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            snapshot = [(labels, list(counts), total, count) for labels, (counts, total, count) in self._series.items()]
+        for labels, counts, total, count in sorted(snapshot):
+            label_text = ",".join(f'{name}="{value}"' for name, value in zip(self.label_names, labels))
+            cumulative = 0
+            for bound, bucket_count in zip(BUCKETS, counts):
+                cumulative += bucket_count
+                lines.append(f'{self.name}_bucket{{{label_text},le="{bound}"}} {cumulative}')
+            lines.append(f'{self.name}_bucket{{{label_text},le="+Inf"}} {count}')
+            lines.append(f"{self.name}_sum{{{label_text}}} {total}")
+            lines.append(f"{self.name}_count{{{label_text}}} {count}")
+        return lines
+
+
+REQUEST_SECONDS = Histogram("http_request_duration_seconds", "Time spent handling requests.",
+                            ("service", "endpoint", "method", "status"))
+UPSTREAM_SECONDS = Histogram("upstream_request_duration_seconds", "Time spent in calls to upstream services.",
+                             ("service", "upstream", "method", "status"))
+MONGO_SECONDS = Histogram("mongo_command_duration_seconds", "Time spent in MongoDB commands.",
+                          ("service", "command", "outcome"))
+
+logger = logging.getLogger(__name__)
+_listener_registered = False
+
+
+def _service_name():
+    if has_app_context():
+        return current_app.config.get("SERVICE_NAME", current_app.name)
+    return "unknown"
+
+
+def _add_span(kind, name, seconds):
+    if has_request_context() and hasattr(g, "spans"):
+        g.spans.append((kind, name, seconds))
+
+
+class _MongoTimer(monitoring.CommandListener):
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        self._record(event, "ok")
+
+    def failed(self, event):
+        self._record(event, "error")
+
+    def _record(self, event, outcome):
+        seconds = event.duration_micros / 1e6
+        MONGO_SECONDS.observe((_service_name(), event.command_name, outcome), seconds)
+        _add_span("mongo", event.command_name, seconds)
+
+
+def current_request_id():
+    if has_request_context():
+        return getattr(g, "request_id", None)
+    return None
+
+
+def outbound_headers(headers=None):
+    """Return ``headers`` plus the current request ID, for calls to other services."""
+    headers = dict(headers or {})
+    request_id = current_request_id()
+    if request_id:
+        headers[REQUEST_ID_HEADER] = request_id
+    return headers
+
+
+def record_hop(upstream, method, status, seconds):
+    """Record the duration of one call to an upstream service."""
+    if tracing_enabled():
+        UPSTREAM_SECONDS.observe((_service_name(), upstream, method, str(status)), seconds)
+        _add_span("upstream", f"{upstream} {method}", seconds)
+
+
+def render_metrics():
+    lines = []
+    for histogram in (REQUEST_SECONDS, UPSTREAM_SECONDS, MONGO_SECONDS):
+        lines.extend(histogram.render())
+    return "\n".join(lines) + "\n"
+
+
+def init_tracing(app, service):
+    """Instrument ``app``; call before the PyMongo client is created so its commands are timed."""
+    global _listener_registered
+    app.config["SERVICE_NAME"] = service
+
+    @app.route("/metrics")
+    def metrics():
+        return Response(render_metrics(), mimetype="text/plain; version=0.0.4")
+
+    if not tracing_enabled():
+        return
+    if not _listener_registered:
+        monitoring.register(_MongoTimer())
+        _listener_registered = True
+    trace_log = os.getenv("TRACE_LOG") == "1"
+
+    @app.before_request
+    def start_request():
+        g.request_id = request.headers.get(REQUEST_ID_HEADER) or uuid.uuid4().hex
+        g.request_started = time.perf_counter()
+        g.spans = []
+
+    @app.after_request
+    def finish_request(response):
+        started = getattr(g, "request_started", None)
+        if started is not None:
+            elapsed = time.perf_counter() - started
+            endpoint = request.url_rule.rule if request.url_rule else "unmatched"
+            REQUEST_SECONDS.observe((service, endpoint, request.method, str(response.status_code)), elapsed)
+            response.headers[REQUEST_ID_HEADER] = g.request_id
+            if trace_log:
+                spans = ", ".join(f"{kind}:{name}={seconds * 1000:.1f}ms" for kind, name, seconds in g.spans)
+                logger.info("%s %s %s %s %.1fms [%s]", g.request_id, request.method, endpoint,
+                            response.status_code, elapsed * 1000, spans)
+        return response
@@ -0,0 +1,105 @@
+"""Request payload validation against flask-restx models.
+
+``compile_validator(model)`` turns a model into a function that checks a
+payload in one pass over a precomputed field list: required fields are
+present, values have the field's JSON type or one of its ``enum`` values,
+and ``DateTime`` fields are parsed from ISO 8601. It returns the model's
+fields from the payload, with datetimes parsed, and raises ValueError with a
+client-facing message otherwise. Read-only fields are ignored.
+"""
+from datetime import datetime
+
+from flask_restx import fields
+
+_MISSING = object()
+
+
+def _invalid(name):
+    return ValueError(f"Invalid {name}")
+
+
+def _check_boolean(name, value):
+    if not isinstance(value, bool):
+        raise _invalid(name)
+    return value
+
+
+def _check_integer(name, value):
+    if not isinstance(value, int) or isinstance(value, bool):
+        raise _invalid(name)
+    return value
+
+
+def _check_number(name, value):
+    if not isinstance(value, (int, float)) or isinstance(value, bool):
+        raise _invalid(name)
+    return float(value)
+
+
+def _check_string(name, value):
+    if not isinstance(value, str):
+        raise _invalid(name)
+    return value
+
+
+def _check_enum(choices):
+    def check(name, value):
+        if value not in choices:
+            raise ValueError(f"{name} must be one of: {', '.join(choices)}")
+        return value
+    return check
+
+
+def _parse_datetime(name, value):
+    try:
+        return datetime.fromisoformat(value)
+    except (ValueError, TypeError):
+        raise ValueError(f"Invalid {name} format. Use ISO 8601.") from None
+
+
+def _check_list(item_check):
+    def check(name, value):
+        if not isinstance(value, list):
+            raise _invalid(name)
+        if item_check:
+            for item in value:
+                item_check(name, item)
+        return value
+    return check
+
+
+def _check_for(field):
+    if isinstance(field, fields.Boolean):
+        return _check_boolean
+    if isinstance(field, fields.Integer):
+        return _check_integer
+    if isinstance(field, (fields.Float, fields.Arbitrary, fields.Fixed)):
+        return _check_number
+    if isinstance(field, fields.DateTime):
+        return _parse_datetime
+    if isinstance(field, fields.String):
+        return _check_enum(tuple(field.enum)) if field.enum else _check_string
+    if isinstance(field, fields.List):
+        return _check_list(_check_for(field.container))
+    return None
+
+
+def compile_validator(model):
+    """Return ``validate(payload) -> dict`` for ``model``."""
+    checks = tuple((name, field.required, _check_for(field))
+                   for name, field in model.items() if not field.readonly)
+
+    def validate(payload):
+        if not isinstance(payload, dict):
+            raise ValueError("Expected a JSON object")
+        values = {}
+        for name, required, check in checks:
+            value = payload.get(name, _MISSING)
+            if value is _MISSING or (value is None and not required):
+                if required:
+                    raise ValueError(f"Missing required field: {name}")
+                continue
+            values[name] = check(name, value) if check else value
+        return values
+
+    return validate
@@ -1,15 +1,16 @@
-from flask import Flask, jsonify
-from flask_pymongo import PyMongo
-from flask_restx import Api, Resource, fields
-import os
+from flask_restx import Resource, fields
+from pymongo import ASCENDING, IndexModel
 import uuid
-from datetime import datetime
 
-app = Flask(__name__)
-app.config['MONGO_URI'] = os.getenv("MONGO_URI")
-mongo = PyMongo(app)
+from common.app import create_service
+from common.bulk import BULK_PARAMS, bulk_ingest
+from common.indexes import ensure_indexes, register_diagnostics
+from common.invalidation import invalidate_gateway_cache
+from common.pagination import LIST_PARAMS, fetch_page, page_response
+from common.serving import serve
+from common.validation import compile_validator
 
-api = Api(app, title="Customer Service API", version="1.0", doc="/")
+app, mongo, api = create_service(__name__, "customer", "Customer Service API")
 
 customer_ns = api.namespace('customers', description='Customer operations')
 
@@ -17,49 +18,55 @@ customer_model = api.model('Customer', {
     'name': fields.String(required=True, description='Customer name'),
     'email': fields.String(required=True, description='Customer email'),
     'address': fields.String(required=True, description='Customer address'),
-    'updated': fields.String(required=True, description='Last updated timestamp (ISO 8601)'),
+    'updated': fields.DateTime(required=True, description='Last updated timestamp (ISO 8601)'),
     'confirmed': fields.Boolean(required=True, description='Confirmation status'),
     'orders_history': fields.List(fields.String, required=True, description='List of order IDs')
 })
 
+CUSTOMER_FIELDS = ['_id', 'customer_id', *customer_model]
+validate_customer = compile_validator(customer_model)
+
+INDEXES = {
+    "customers": [IndexModel([("customer_id", ASCENDING)], unique=True)],
+}
+
+HOT_QUERIES = {
+    "get_customer": ("customers", {"customer_id": ""}, None),
+}
+
+register_diagnostics(api, mongo, HOT_QUERIES)
+
+def build_customer_document(args):
+    """Validate a customer payload and return the document to store; raises ValueError."""
+    return {"customer_id": str(uuid.uuid4()), **validate_customer(args)}
+
 @customer_ns.route('/')
 class CustomerList(Resource):
-    @customer_ns.doc('list_customers')
+    @customer_ns.doc('list_customers', params=LIST_PARAMS)
     def get(self):
-        data = list(mongo.db.customers.find())
-        for item in data:
-            item["_id"] = str(item["_id"])
-            if "updated" in item and isinstance(item["updated"], datetime):
-                item["updated"] = item["updated"].isoformat()
-        return jsonify(data)
+        data, next_cursor = fetch_page(mongo.db.customers, {}, CUSTOMER_FIELDS)
+        return page_response(data, next_cursor)
 
     @customer_ns.doc('create_customer')
     @customer_ns.expect(customer_model)
     def post(self):
-        args = api.payload
-        required_fields = ['name', 'email', 'address', 'updated', 'confirmed', 'orders_history']
-        for field in required_fields:
-            if field not in args:
-                api.abort(400, f"Missing required field: {field}")
-        args['customer_id'] = str(uuid.uuid4())
         try:
-            updated = datetime.fromisoformat(args['updated'])
-        except (ValueError, TypeError):
-            api.abort(400, "Invalid updated format. Use ISO 8601.")
-
-        document = {
-            "customer_id": args["customer_id"],
-            "name": args["name"],
-            "email": args["email"],
-            "address": args["address"],
-            "updated": updated,
-            "confirmed": args["confirmed"],
-            "orders_history": args["orders_history"]
-        }
-        result = mongo.db.customers.insert_one(document)
-        document["_id"] = str(result.inserted_id)
-        document["updated"] = updated.isoformat()
+            document = build_customer_document(api.payload)
+        except ValueError as exc:
+            api.abort(400, str(exc))
+
+        mongo.db.customers.insert_one(document)
+        invalidate_gateway_cache("customer", [document["customer_id"]])
         return document, 201
+
+@customer_ns.route('/bulk')
+class CustomerBulk(Resource):
+    @customer_ns.doc('bulk_create_customers', params=BULK_PARAMS)
+    @customer_ns.expect([customer_model])
+    def post(self):
+        """Create or upsert customers from a JSON array or NDJSON stream"""
+        return bulk_ingest(mongo.db.customers, build_customer_document, "customer_id",
+                           after_chunk=lambda customer_ids: invalidate_gateway_cache("customer", customer_ids))
     
 @customer_ns.route('/<customer_id>')
 @customer_ns.doc(params={'customer_id': 'The customer ID'})
@@ -70,11 +77,7 @@ class Customer(Resource):
         customer = mongo.db.customers.find_one({"customer_id": customer_id})
         if not customer:
             api.abort(404, "Customer not found")
-        
-        customer["_id"] = str(customer["_id"])
-        if "updated" in customer and isinstance(customer["updated"], datetime):
-            customer["updated"] = customer["updated"].isoformat()
-        
+
         return customer, 200
 
     @customer_ns.doc('delete_customer')
@@ -82,9 +85,10 @@ class Customer(Resource):
         """Delete a customer by ID"""
         result = mongo.db.customers.delete_one({"customer_id": customer_id})
         if result.deleted_count:
+            invalidate_gateway_cache("customer", [customer_id])
             return {"message": "Customer deleted"}, 200
         api.abort(404, "Customer not found")
 
 
 if __name__ == "__main__":
-    app.run(host="0.0.0.0", port=5000, debug=True)
\ No newline at end of file
+    serve(app, 5000, mongo=mongo, on_startup=lambda: ensure_indexes(mongo.db, INDEXES))
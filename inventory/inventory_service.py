@@ -1,61 +1,496 @@
-from flask import Flask, jsonify
-from flask_pymongo import PyMongo
-from flask_restx import Api, Resource, fields
+from flask import request
+from flask_restx import Resource, fields
+from pymongo import ASCENDING, IndexModel, ReturnDocument
+from pymongo.errors import DuplicateKeyError
 import os
-from datetime import datetime
+import uuid
+from datetime import datetime, timedelta
 
-app = Flask(__name__)
-app.config['MONGO_URI'] = os.getenv("MONGO_URI")
-mongo = PyMongo(app)
+from common.app import create_service
+from common.bulk import BULK_PARAMS, bulk_ingest
+from common.indexes import ensure_indexes, register_diagnostics
+from common.pagination import LIST_PARAMS, fetch_page, page_response
+from common.serving import serve
+from common.sweeper import Sweeper
+from common.validation import compile_validator
 
-api = Api(app, title="Inventory Service API", version="1.0", doc="/")
+app, mongo, api = create_service(__name__, "inventory", "Inventory Service API")
 
 inventory_ns = api.namespace('inventory', description='Inventory operations')
 
+MAX_BATCH_SIZE = int(os.getenv("MAX_BATCH_SIZE", "1000"))
+RESERVATION_TTL_SECONDS = int(os.getenv("RESERVATION_TTL_SECONDS", "900"))
+# Expired reservations are released in the background every
+# RESERVATION_EXPIRY_INTERVAL seconds, RESERVATION_EXPIRY_SWEEP_LIMIT per batch.
+# A release that has not finished after RESERVATION_RELEASE_GRACE seconds is
+# assumed to have been interrupted and is finished by the sweeper.
+EXPIRY_SWEEP_LIMIT = int(os.getenv("RESERVATION_EXPIRY_SWEEP_LIMIT", "100"))
+EXPIRY_INTERVAL_SECONDS = float(os.getenv("RESERVATION_EXPIRY_INTERVAL", "15"))
+RELEASE_GRACE_SECONDS = int(os.getenv("RESERVATION_RELEASE_GRACE", "60"))
+LOW_STOCK_DEFAULT_THRESHOLD = int(os.getenv("LOW_STOCK_DEFAULT_THRESHOLD", "10"))
+CHANGES_DEFAULT_LIMIT = 1000
+CHANGES_MAX_LIMIT = 10000
+# alert_changed_at is taken from the clock of the process making the change,
+# so a change can be stored with a time slightly before the last one a reader
+# already saw. The change feed's final cursor steps this far back from the
+# server time to pick such changes up.
+CHANGES_SKEW_SECONDS = float(os.getenv("LOW_STOCK_CHANGES_SKEW", "5"))
+
 # Inventory model
 inventory_model = api.model('Inventory', {
     'product_id': fields.String(required=True, description='Product ID'),
     'stock': fields.Integer(required=True, description='Stock quantity'),
-    'updated': fields.String(required=True, description='Last updated timestamp (ISO 8601)'),
-    'low_stock_alert': fields.Boolean(required=True, description='Low stock alert status'),
+    'updated': fields.DateTime(required=True, description='Last updated timestamp (ISO 8601)'),
+    'low_stock_threshold': fields.Integer(
+        description=f'Stock at or below which the product is low (default {LOW_STOCK_DEFAULT_THRESHOLD})'),
+    'low_stock_alert': fields.Boolean(readonly=True, description='Whether stock is at or below low_stock_threshold'),
     'warehouse_locations': fields.List(fields.String, required=True, description='Warehouse locations')
 })
 
+INVENTORY_FIELDS = ['_id', *inventory_model, 'alert_changed_at']
+# Internal bookkeeping left out of responses.
+HIDDEN_FIELDS = {"pending_reservations": 0}
+validate_inventory = compile_validator(inventory_model)
+
+INDEXES = {
+    "inventory": [
+        IndexModel([("product_id", ASCENDING)], unique=True),
+        IndexModel([("low_stock_alert", ASCENDING), ("_id", ASCENDING)]),
+        IndexModel([("alert_changed_at", ASCENDING), ("product_id", ASCENDING)]),
+    ],
+    "reservations": [
+        IndexModel([("reservation_id", ASCENDING)], unique=True),
+        IndexModel([("status", ASCENDING), ("expires_at", ASCENDING)]),
+        IndexModel([("status", ASCENDING), ("updated", ASCENDING)]),
+    ],
+}
+
+HOT_QUERIES = {
+    "get_inventory": ("inventory", {"product_id": ""}, None),
+    "batch_get_inventory": ("inventory", {"product_id": {"$in": ["", ""]}}, None),
+    "reserve_stock": ("inventory", {"product_id": "", "stock": {"$gte": 1}, "pending_reservations": {"$ne": ""}}, None),
+    "expired_reservations": ("reservations", {"status": {"$in": ["pending", "held"]},
+                                              "expires_at": {"$lte": datetime(1970, 1, 1)}}, None),
+    "interrupted_releases": ("reservations", {"status": "releasing", "updated": {"$lte": datetime(1970, 1, 1)}}, None),
+    "low_stock": ("inventory", {"low_stock_alert": True}, [("_id", ASCENDING)]),
+    "low_stock_changes": ("inventory", {"alert_changed_at": {"$gte": datetime(1970, 1, 1)}},
+                          [("alert_changed_at", ASCENDING), ("product_id", ASCENDING)]),
+}
+
+register_diagnostics(api, mongo, HOT_QUERIES)
+
+inventory_batch_model = api.model('InventoryBatch', {
+    'product_ids': fields.List(fields.String, required=True, description='Product IDs to look up')
+})
+
+reservation_model = api.model('Reservation', {
+    'items': fields.List(fields.Raw, required=True, description='List of items with product_id and quantity'),
+    'ttl_seconds': fields.Integer(description='Seconds before an unconfirmed reservation is released'),
+    'reference': fields.String(description='Caller reference, such as an order ID')
+})
+
+threshold_model = api.model('LowStockThreshold', {
+    'low_stock_threshold': fields.Integer(required=True, description='Stock at or below which the product is low')
+})
+validate_threshold = compile_validator(threshold_model)
+
+# Evaluated inside update pipelines, so the alert always reflects the stock
+# written by the same update. Entries created before thresholds existed use
+# the default until they are backfilled.
+IS_LOW_STOCK = {"$lte": ["$stock", {"$ifNull": ["$low_stock_threshold", LOW_STOCK_DEFAULT_THRESHOLD]}]}
+
+def low_stock_update(changes, now):
+    """Update pipeline that applies ``changes`` and then recomputes ``low_stock_alert``.
+
+    ``changes`` maps fields to aggregation expressions. ``alert_changed_at`` is
+    set to ``now`` only when the alert flips, which is what the low-stock
+    change feed pages on. An entry without an alert yet counts as not low, so
+    one created with plenty of stock has no change to report.
+    """
+    return [
+        {"$set": changes},
+        {"$set": {"alert_changed_at": {"$cond": [{"$eq": [IS_LOW_STOCK, {"$ifNull": ["$low_stock_alert", False]}]},
+                                                 "$alert_changed_at", now]}}},
+        {"$set": {"low_stock_alert": IS_LOW_STOCK}},
+    ]
+
+def upsert_inventory(document):
+    """Bulk upsert update: write the payload's fields, then recompute the alert against the stored one.
+
+    An item without a threshold keeps the stored one; new entries get the default.
+    """
+    changes = {key: {"$literal": value} for key, value in document.items()
+               if key not in ("low_stock_alert", "alert_changed_at")}
+    changes.setdefault("low_stock_threshold", {"$ifNull": ["$low_stock_threshold", LOW_STOCK_DEFAULT_THRESHOLD]})
+    return low_stock_update(changes, datetime.utcnow())
+
+def backfill_low_stock_thresholds():
+    """Give entries created before per-product thresholds the default one and a computed alert."""
+    result = mongo.db.inventory.update_many(
+        {"low_stock_threshold": {"$exists": False}},
+        low_stock_update({"low_stock_threshold": LOW_STOCK_DEFAULT_THRESHOLD}, datetime.utcnow())
+    )
+    if result.modified_count:
+        app.logger.info("Backfilled low-stock thresholds on %d inventory entries", result.modified_count)
+
+# Every inventory entry lists the reservations currently holding some of its
+# stock in pending_reservations. Stock is only taken from an entry that does
+# not list the reservation yet and only given back by one that does, each in a
+# single-document update. Both are therefore safe to repeat, and a
+# reservation interrupted part way can be undone exactly.
+
+def hold_stock(reservation_id, product_id, quantity, now):
+    """Take ``quantity`` for the reservation if that much is in stock; returns None if it is not."""
+    return mongo.db.inventory.find_one_and_update(
+        {"product_id": product_id, "stock": {"$gte": quantity}, "pending_reservations": {"$ne": reservation_id}},
+        low_stock_update({
+            "stock": {"$add": ["$stock", -quantity]},
+            "updated": now,
+            "pending_reservations": {"$concatArrays": [{"$ifNull": ["$pending_reservations", []]}, [reservation_id]]},
+        }, now),
+        projection={"_id": 1}
+    )
+
+def return_stock(reservation):
+    """Give back the stock ``reservation`` still holds."""
+    reservation_id = reservation["reservation_id"]
+    now = datetime.utcnow()
+    for item in reservation["items"]:
+        mongo.db.inventory.update_one(
+            {"product_id": item["product_id"], "pending_reservations": reservation_id},
+            low_stock_update({
+                "stock": {"$add": ["$stock", item["quantity"]]},
+                "updated": now,
+                "pending_reservations": {"$filter": {"input": "$pending_reservations",
+                                                     "cond": {"$ne": ["$$this", reservation_id]}}},
+            }, now)
+        )
+
+def keep_stock(reservation):
+    """Let a committed reservation's stock go for good."""
+    mongo.db.inventory.update_many(
+        {"product_id": {"$in": [item["product_id"] for item in reservation["items"]]},
+         "pending_reservations": reservation["reservation_id"]},
+        {"$pull": {"pending_reservations": reservation["reservation_id"]}}
+    )
+
+def reserve_stock(reservation):
+    """Take stock for every item of a pending reservation or for none of them.
+
+    Each decrement is guarded by ``stock >= quantity``, so concurrent
+    reservations can never take stock below zero. If any item is short, the
+    stock already taken is given back and its product_id is returned.
+    """
+    now = datetime.utcnow()
+    for item in reservation["items"]:
+        if hold_stock(reservation["reservation_id"], item["product_id"], item["quantity"], now) is None:
+            return_stock(reservation)
+            return item["product_id"]
+    return None
+
+def commit_reservation(reservation_id):
+    """Move a held, unexpired reservation to committed; returns it or None if it was not held."""
+    now = datetime.utcnow()
+    reservation = mongo.db.reservations.find_one_and_update(
+        {"reservation_id": reservation_id, "status": "held", "expires_at": {"$gt": now}},
+        {"$set": {"status": "committed", "updated": now}},
+        projection={"_id": 0}
+    )
+    if reservation is None:
+        return None
+    keep_stock(reservation)
+    reservation.update(status="committed", updated=now)
+    return reservation
+
+def release_reservation(query, final_status):
+    """Release the reservation matching ``query`` and give back its stock.
+
+    The reservation is marked ``releasing`` before any stock moves, so commits
+    can no longer take it and a release interrupted part way is finished by
+    the sweeper. Returns the released reservation, or None if none matched.
+    """
+    now = datetime.utcnow()
+    reservation = mongo.db.reservations.find_one_and_update(
+        query,
+        [{"$set": {"status": "releasing", "updated": now,
+                   "final_status": {"$ifNull": ["$final_status", final_status]}}}],
+        projection={"_id": 0}
+    )
+    if reservation is None:
+        return None
+    return_stock(reservation)
+    final_status = reservation.pop("final_status", None) or final_status
+    now = datetime.utcnow()
+    mongo.db.reservations.update_one(
+        {"reservation_id": reservation["reservation_id"], "status": "releasing"},
+        {"$set": {"status": final_status, "updated": now}, "$unset": {"final_status": ""}}
+    )
+    reservation.update(status=final_status, updated=now)
+    return reservation
+
+def release_expired_reservations(limit=EXPIRY_SWEEP_LIMIT):
+    """Release up to ``limit`` reservations that expired or whose release was interrupted."""
+    released = 0
+    while released < limit:
+        now = datetime.utcnow()
+        reservation = release_reservation({"$or": [
+            {"status": {"$in": ["pending", "held"]}, "expires_at": {"$lte": now}},
+            {"status": "releasing", "updated": {"$lte": now - timedelta(seconds=RELEASE_GRACE_SECONDS)}},
+        ]}, "expired")
+        if reservation is None:
+            break
+        released += 1
+    return released
+
+def sweep_reservations():
+    released = batches = 0
+    while not expiry_sweeper.stopping():
+        count = release_expired_reservations()
+        released += count
+        if count:
+            batches += 1
+        if count < EXPIRY_SWEEP_LIMIT:
+            break
+    return released, batches
+
+expiry_sweeper = Sweeper("reservation-expiry", sweep_reservations, interval=EXPIRY_INTERVAL_SECONDS)
+
+def abort_not_held(reservation_id):
+    reservation = mongo.db.reservations.find_one({"reservation_id": reservation_id},
+                                                 {"_id": 0, "status": 1, "expires_at": 1})
+    if not reservation:
+        api.abort(404, "Reservation not found")
+    if reservation["status"] == "held" and reservation["expires_at"] <= datetime.utcnow():
+        api.abort(409, "Reservation has expired")
+    api.abort(409, f"Reservation is {reservation['status']}")
+
+def build_inventory_document(args, default_threshold=True):
+    """Validate an inventory payload and return the document to store; raises ValueError.
+
+    With ``default_threshold=False`` a missing threshold is left out, so an
+    upsert does not overwrite the stored one.
+    """
+    document = validate_inventory(args)
+    if default_threshold:
+        document.setdefault("low_stock_threshold", LOW_STOCK_DEFAULT_THRESHOLD)
+    threshold = document.get("low_stock_threshold", LOW_STOCK_DEFAULT_THRESHOLD)
+    if threshold < 0:
+        raise ValueError("low_stock_threshold must not be negative")
+    document["low_stock_alert"] = document["stock"] <= threshold
+    if document["low_stock_alert"]:
+        document["alert_changed_at"] = datetime.utcnow()
+    return document
+
 @inventory_ns.route('/')
 class InventoryList(Resource):
-    @inventory_ns.doc('list_inventory')
+    @inventory_ns.doc('list_inventory', params=LIST_PARAMS)
     def get(self):
-        data = list(mongo.db.inventory.find())
-        for item in data:
-            item["_id"] = str(item["_id"])
-            if "updated" in item and isinstance(item["updated"], datetime):
-                item["updated"] = item["updated"].isoformat()
-        return jsonify(data)
+        data, next_cursor = fetch_page(mongo.db.inventory, {}, INVENTORY_FIELDS, HIDDEN_FIELDS)
+        return page_response(data, next_cursor)
 
     @inventory_ns.doc('create_inventory')
     @inventory_ns.expect(inventory_model)
     def post(self):
+        try:
+            document = build_inventory_document(api.payload)
+        except ValueError as exc:
+            api.abort(400, str(exc))
+
+        try:
+            mongo.db.inventory.insert_one(document)
+        except DuplicateKeyError:
+            api.abort(409, f"Inventory already exists for product: {document['product_id']}")
+        return document, 201
+
+@inventory_ns.route('/bulk')
+class InventoryBulk(Resource):
+    @inventory_ns.doc('bulk_create_inventory', params=BULK_PARAMS)
+    @inventory_ns.expect([inventory_model])
+    def post(self):
+        """Create or upsert inventory entries from a JSON array or NDJSON stream"""
+        upsert = request.args.get("mode") == "upsert"
+        return bulk_ingest(mongo.db.inventory, lambda item: build_inventory_document(item, not upsert),
+                           "product_id", upsert_update=upsert_inventory)
+
+@inventory_ns.route('/batch')
+class InventoryBatch(Resource):
+    @inventory_ns.doc('batch_get_inventory')
+    @inventory_ns.expect(inventory_batch_model)
+    def post(self):
+        """Get inventory entries for several product IDs in one query; unknown IDs map to null"""
         args = api.payload
-        required_fields = ['product_id', 'stock', 'updated', 'low_stock_alert', 'warehouse_locations']
-        for field in required_fields:
-            if field not in args:
-                api.abort(400, f"Missing required field: {field}")
+        product_ids = args.get('product_ids') if isinstance(args, dict) else None
+        if not isinstance(product_ids, list) or not all(isinstance(product_id, str) for product_id in product_ids):
+            api.abort(400, "product_ids must be a list of product IDs")
+        if len(product_ids) > MAX_BATCH_SIZE:
+            api.abort(400, f"At most {MAX_BATCH_SIZE} product_ids per request")
+
+        found = {item["product_id"]: item
+                 for item in mongo.db.inventory.find({"product_id": {"$in": list(set(product_ids))}}, HIDDEN_FIELDS)}
+        return {product_id: found.get(product_id) for product_id in product_ids}, 200
+
+@inventory_ns.route('/low-stock')
+class LowStockList(Resource):
+    @inventory_ns.doc('list_low_stock', params=LIST_PARAMS)
+    def get(self):
+        """Inventory entries whose stock is at or below their threshold"""
+        data, next_cursor = fetch_page(mongo.db.inventory, {"low_stock_alert": True}, INVENTORY_FIELDS, HIDDEN_FIELDS)
+        return page_response(data, next_cursor)
+
+@inventory_ns.route('/low-stock/changes')
+class LowStockChanges(Resource):
+    @inventory_ns.doc('low_stock_changes', params={
+        'since': 'ISO 8601 time; omit to start from the oldest change',
+        'after_id': 'Cursor: product_id of the last change already read',
+        'limit': f'Changes per page (default {CHANGES_DEFAULT_LIMIT}, max {CHANGES_MAX_LIMIT})',
+    })
+    def get(self):
+        """Products whose low-stock alert was raised or cleared since a point in time
+
+        Pass the returned cursor as ``since`` and ``after_id`` to read on. A
+        full page's cursor follows its last change. Once the feed is caught up,
+        the cursor is the server time minus LOW_STOCK_CHANGES_SKEW seconds
+        without an ``after_id``, so changes stamped late by a slower clock are
+        still read, and the ones from that window are read again.
+        """
         try:
-            updated = datetime.fromisoformat(args['updated'])
-        except (ValueError, TypeError):
-            api.abort(400, "Invalid updated format. Use ISO 8601.")
-
-        document = {
-            "product_id": args["product_id"],
-            "stock": int(args["stock"]),
-            "updated": updated,
-            "low_stock_alert": args["low_stock_alert"],
-            "warehouse_locations": args["warehouse_locations"]
+            limit = int(request.args.get('limit', CHANGES_DEFAULT_LIMIT))
+            since = request.args.get('since')
+            since = datetime.fromisoformat(since) if since else datetime.min
+        except ValueError:
+            api.abort(400, "limit must be an integer and since an ISO 8601 time")
+        if not 1 <= limit <= CHANGES_MAX_LIMIT:
+            api.abort(400, f"limit must be between 1 and {CHANGES_MAX_LIMIT}")
+        after_id = request.args.get('after_id')
+        server_time = datetime.utcnow()
+
+        if after_id:
+            query = {"$or": [{"alert_changed_at": {"$gt": since}},
+                             {"alert_changed_at": since, "product_id": {"$gt": after_id}}]}
+        else:
+            query = {"alert_changed_at": {"$gte": since}}
+        documents = list(mongo.db.inventory.find(query, {
+            "_id": 0, "product_id": 1, "stock": 1, "low_stock_threshold": 1, "low_stock_alert": 1,
+            "alert_changed_at": 1,
+        }).sort([("alert_changed_at", ASCENDING), ("product_id", ASCENDING)]).limit(limit))
+
+        if len(documents) == limit:
+            last = documents[-1]
+            cursor = {"since": last["alert_changed_at"], "after_id": last["product_id"]}
+        else:
+            cursor = {"since": server_time - timedelta(seconds=CHANGES_SKEW_SECONDS), "after_id": None}
+        return {"changes": documents, "cursor": cursor, "server_time": server_time}, 200
+
+@inventory_ns.route('/reservations')
+class ReservationList(Resource):
+    @inventory_ns.doc('reserve_stock')
+    @inventory_ns.expect(reservation_model)
+    def post(self):
+        """Atomically reserve stock for every item, or for none of them"""
+        args = api.payload
+        if not isinstance(args, dict) or not isinstance(args.get('items'), list) or not args['items']:
+            api.abort(400, "Missing required field: items")
+        quantities = {}
+        for item in args['items']:
+            if not isinstance(item, dict) or not isinstance(item.get('product_id'), str):
+                api.abort(400, "Each item requires a product_id")
+            quantity = item.get('quantity', 1)
+            if not isinstance(quantity, int) or isinstance(quantity, bool) or quantity <= 0:
+                api.abort(400, f"Invalid quantity for product: {item['product_id']}")
+            quantities[item['product_id']] = quantities.get(item['product_id'], 0) + quantity
+        ttl_seconds = args.get('ttl_seconds', RESERVATION_TTL_SECONDS)
+        if not isinstance(ttl_seconds, int) or ttl_seconds <= 0:
+            api.abort(400, "ttl_seconds must be a positive integer")
+
+        # The reservation is recorded before any stock moves, so stock taken by
+        # a request that dies part way is given back once it expires. A fixed
+        # product order keeps concurrent multi-item reservations from
+        # repeatedly undoing each other.
+        now = datetime.utcnow()
+        reservation = {
+            "reservation_id": str(uuid.uuid4()),
+            "reference": args.get('reference'),
+            "items": [{"product_id": product_id, "quantity": quantity}
+                      for product_id, quantity in sorted(quantities.items())],
+            "status": "pending",
+            "created": now,
+            "expires_at": now + timedelta(seconds=ttl_seconds),
+            "updated": now
         }
-        result = mongo.db.inventory.insert_one(document)
-        document["_id"] = str(result.inserted_id)
-        document["updated"] = updated.isoformat()
-        return document, 201
+        mongo.db.reservations.insert_one(reservation)
+        reservation.pop("_id")
+
+        short_product_id = reserve_stock(reservation)
+        if short_product_id is not None:
+            mongo.db.reservations.update_one({"reservation_id": reservation["reservation_id"], "status": "pending"},
+                                             {"$set": {"status": "rejected", "updated": datetime.utcnow()}})
+            api.abort(409, f"Insufficient stock for product: {short_product_id}", product_id=short_product_id)
+        held = mongo.db.reservations.update_one({"reservation_id": reservation["reservation_id"], "status": "pending"},
+                                                {"$set": {"status": "held"}})
+        if not held.modified_count:
+            # Expired while its stock was being taken; the sweeper may have missed late holds.
+            return_stock(reservation)
+            api.abort(409, "Reservation expired before its stock was held")
+        reservation["status"] = "held"
+        return reservation, 201
+
+@inventory_ns.route('/reservations/expire')
+class ReservationExpiry(Resource):
+    @inventory_ns.doc('reservation_expiry_stats')
+    def get(self):
+        """Throughput and last run of this process's reservation expiry sweeper"""
+        return expiry_sweeper.stats(), 200
+
+    @inventory_ns.doc('expire_reservations')
+    def post(self):
+        """Return stock held by expired reservations now"""
+        return {"released": expiry_sweeper.sweep()}, 200
+
+@inventory_ns.route('/reservations/<reservation_id>/commit')
+@inventory_ns.doc(params={'reservation_id': 'The reservation ID'})
+class ReservationCommit(Resource):
+    @inventory_ns.doc('commit_reservation')
+    def post(self, reservation_id):
+        """Keep the reserved stock; the reservation will no longer expire"""
+        reservation = commit_reservation(reservation_id)
+        if reservation is None:
+            abort_not_held(reservation_id)
+        return reservation, 200
+
+@inventory_ns.route('/reservations/<reservation_id>/release')
+@inventory_ns.doc(params={'reservation_id': 'The reservation ID'})
+class ReservationRelease(Resource):
+    @inventory_ns.doc('release_reservation')
+    def post(self, reservation_id):
+        """Return the reserved stock"""
+        reservation = release_reservation({"reservation_id": reservation_id, "status": "held"}, "released")
+        if reservation is None:
+            abort_not_held(reservation_id)
+        return reservation, 200
+
+@inventory_ns.route('/<product_id>/threshold')
+@inventory_ns.doc(params={'product_id': 'The product ID'})
+class LowStockThreshold(Resource):
+    @inventory_ns.doc('set_low_stock_threshold')
+    @inventory_ns.expect(threshold_model)
+    def put(self, product_id):
+        """Set a product's low-stock threshold; the alert is recomputed in the same update"""
+        try:
+            threshold = validate_threshold(api.payload)['low_stock_threshold']
+        except ValueError as exc:
+            api.abort(400, str(exc))
+        if threshold < 0:
+            api.abort(400, "low_stock_threshold must not be negative")
+        now = datetime.utcnow()
+        inventory = mongo.db.inventory.find_one_and_update(
+            {"product_id": product_id},
+            low_stock_update({"low_stock_threshold": threshold, "updated": now}, now),
+            projection=HIDDEN_FIELDS,
+            return_document=ReturnDocument.AFTER
+        )
+        if inventory is None:
+            api.abort(404, "Inventory not found")
+        return inventory, 200
 
 @inventory_ns.route('/<product_id>')
 @inventory_ns.doc(params={'product_id': 'The product ID'})
@@ -63,14 +498,10 @@ class InventoryResource(Resource):
     @inventory_ns.doc('get_inventory')
     def get(self, product_id):
         """Get inventory entry by product_id"""
-        inventory = mongo.db.inventory.find_one({"product_id": product_id})
+        inventory = mongo.db.inventory.find_one({"product_id": product_id}, HIDDEN_FIELDS)
         if not inventory:
             api.abort(404, "Inventory not found")
 
-        inventory["_id"] = str(inventory["_id"])
-        if "updated" in inventory and isinstance(inventory["updated"], datetime):
-            inventory["updated"] = inventory["updated"].isoformat()
-
         return inventory, 200
 
     @inventory_ns.doc('delete_inventory')
@@ -83,4 +514,8 @@ class InventoryResource(Resource):
 
 
 if __name__ == "__main__":
-    app.run(host="0.0.0.0", port=5002, debug=True)
\ No newline at end of file
+    def on_startup():
+        ensure_indexes(mongo.db, INDEXES)
+        backfill_low_stock_thresholds()
+
+    serve(app, 5002, mongo=mongo, on_startup=on_startup, on_worker_start=expiry_sweeper.start)
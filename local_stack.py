@@ -0,0 +1,94 @@
+"""Run the whole stack in one process, without MongoDB or sockets between services.
+
+All six Flask apps are mounted on one WSGI app with Werkzeug's
+DispatcherMiddleware: the gateway at ``/`` and every other service under
+``/_svc/<name>``, e.g. ``/_svc/customer/customers/<id>``, a prefix no
+gateway route starts with. The gateway's upstream clients and the services'
+cache invalidations call the mounted apps directly instead of going over
+HTTP, and storage is the in-memory Mongo stand-in (``MONGO_BACKEND=memory``,
+see common/app.py) unless ``MONGO_BACKEND=pymongo`` is exported along with a
+``MONGO_URI``. This is meant for end-to-end tests
+and for profiling the gateway without network noise:
+
+    stack = LocalStack()
+    response = stack.test_client().post("/create-order", json=order)
+
+or, to try the API by hand on a single port:
+
+    python local_stack.py
+
+Only indexes are created at startup; the backfills the services run against
+existing data are skipped.
+"""
+import importlib.util
+import os
+import sys
+
+from werkzeug.middleware.dispatcher import DispatcherMiddleware
+from werkzeug.serving import run_simple
+from werkzeug.test import Client
+
+from run_services import ROOT, SERVICES
+
+SCRIPTS = {name: script for name, script, _ in SERVICES}
+
+# Upstream URLs only need to be well formed; requests to them never leave the process.
+BASE_URL = "http://local-stack"
+SERVICE_PREFIX = "/_svc"
+
+
+def mount_path(name):
+    """Where the service ``name`` is mounted on the stack's WSGI app."""
+    return f"{SERVICE_PREFIX}/{name}"
+
+
+def load_service(name):
+    """Import a service script as a module named ``<name>_service``."""
+    for path in (ROOT, os.path.join(ROOT, "api_gateway")):
+        if path not in sys.path:
+            sys.path.insert(0, path)
+    spec = importlib.util.spec_from_file_location(f"{name}_service", os.path.join(ROOT, SCRIPTS[name]))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+class LocalStack:
+    """All six services in this process behind one WSGI app."""
+
+    def __init__(self):
+        os.environ.setdefault("MONGO_BACKEND", "memory")
+        from common.invalidation import route_in_process
+
+        self.modules = {}
+        for name in SCRIPTS:
+            if name != "gateway":
+                self.modules[name] = load_service(name)
+                os.environ[f"{name.upper()}_SERVICE_URL"] = f"{BASE_URL}{mount_path(name)}"
+        gateway = self.modules["gateway"] = load_service("gateway")
+
+        self.app = DispatcherMiddleware(gateway.app, {
+            mount_path(name): module.app for name, module in self.modules.items() if name != "gateway"
+        })
+        for client in gateway.upstreams.values():
+            client.mount_app(self.app)
+        route_in_process(gateway.app)
+        for module in self.modules.values():
+            module.ensure_indexes(module.mongo.db, module.INDEXES)
+
+    def start_background_tasks(self):
+        """Start the gateway's price refresher and order pipeline and the reservation and payment expiry sweepers."""
+        self.modules["gateway"].start_background_tasks()
+        self.modules["inventory"].expiry_sweeper.start()
+        self.modules["payment"].expiry_sweeper.start()
+
+    def test_client(self):
+        return Client(self.app)
+
+
+if __name__ == "__main__":
+    stack = LocalStack()
+    stack.start_background_tasks()
+    port = int(os.getenv("PORT", "8000"))
+    print(f"Gateway on http://127.0.0.1:{port}/, services under {mount_path('<name>')}/")
+    run_simple(os.getenv("HOST", "127.0.0.1"), port, stack.app, threaded=True)
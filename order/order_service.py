@@ -1,15 +1,31 @@
-from flask import Flask, jsonify
-from flask_pymongo import PyMongo
-from flask_restx import Api, Resource, fields
+from flask import request
+from flask_restx import Resource, fields
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from pymongo.errors import DuplicateKeyError
+import hashlib
+import json
 import os
 import uuid
-from datetime import datetime
+from datetime import datetime, timedelta
 
-app = Flask(__name__)
-app.config['MONGO_URI'] = os.getenv("MONGO_URI")
-mongo = PyMongo(app)
+from common.app import create_service
+from common.export import EXPORT_PARAMS, export_response
+from common.indexes import ensure_indexes, register_diagnostics
+from common.pagination import LIST_PARAMS, fetch_page, page_response
+from common.serving import serve
+from common.validation import compile_validator
 
-api = Api(app, title="Order Service API", version="1.0", doc="/")
+app, mongo, api = create_service(__name__, "order", "Order Service API")
+
+IDEMPOTENCY_HEADER = "Idempotency-Key"
+# How long a key replays its order; the same variable sets the gateway's
+# record lifetime, so a key frees up here when it frees up there.
+IDEMPOTENCY_TTL = float(os.getenv("IDEMPOTENCY_TTL", "86400"))
+# Orders kept in each customer's summary, newest first.
+SUMMARY_RECENT_ORDERS = int(os.getenv("SUMMARY_RECENT_ORDERS", "20"))
+BY_CUSTOMER_DEFAULT_LIMIT = 100
+BY_CUSTOMER_MAX_LIMIT = 1000
+RECENT_ORDER_FIELDS = {"_id": 0, "order_id": 1, "total_amount": 1, "status": 1, "timestamp": 1}
 
 order_ns = api.namespace('orders', description='Order operations')
 
@@ -19,70 +35,220 @@ order_model = api.model('Order', {
     'products': fields.List(fields.Raw, required=True, description='List of products with product_id and quantity'),
     'total_amount': fields.Float(required=True, description='Total order amount'),
     'status': fields.String(required=True, description='Order status'),
-    'timestamp': fields.String(required=True, description='Order creation timestamp (ISO 8601)'),
-    'updated': fields.String(required=True, description='Last updated timestamp (ISO 8601)'),
+    'timestamp': fields.DateTime(required=True, description='Order creation timestamp (ISO 8601)'),
+    'updated': fields.DateTime(required=True, description='Last updated timestamp (ISO 8601)'),
     'confirmed': fields.Boolean(required=True, description='Order confirmation status'),
     'tracking_numbers': fields.List(fields.String, required=True, description='Tracking numbers')
 })
 
+ORDER_FIELDS = ['_id', 'order_id', *order_model]
+validate_order = compile_validator(order_model)
+
+INDEXES = {
+    "orders": [
+        IndexModel([("order_id", ASCENDING)], unique=True),
+        IndexModel([("customer_id", ASCENDING), ("timestamp", DESCENDING)]),
+        IndexModel([("timestamp", ASCENDING)]),
+        IndexModel([("updated", ASCENDING)]),
+        # Only orders created with an Idempotency-Key carry the field.
+        IndexModel([("idempotency_key", ASCENDING)], unique=True, sparse=True),
+    ],
+    "customer_order_summaries": [IndexModel([("customer_id", ASCENDING)], unique=True)],
+}
+
+HOT_QUERIES = {
+    "orders_by_customer": ("orders", {"customer_id": ""}, [("timestamp", DESCENDING)]),
+    "export_by_timestamp": ("orders", {"timestamp": {"$gte": datetime(1970, 1, 1)}}, [("timestamp", ASCENDING)]),
+    "export_by_updated": ("orders", {"updated": {"$gte": datetime(1970, 1, 1)}}, [("updated", ASCENDING)]),
+}
+
+register_diagnostics(api, mongo, HOT_QUERIES)
+
+def order_fingerprint(document):
+    """Hash of the order as the client sent it, used to spot a key reused for a different order.
+
+    The order ID and total are left out: the gateway picks a new ID and reprices on every attempt.
+    """
+    fields = {key: value for key, value in document.items() if key not in ("order_id", "total_amount")}
+    return hashlib.sha256(json.dumps(fields, sort_keys=True, default=str).encode()).hexdigest()
+
+def insert_order(document, idempotency_key):
+    """Store a new order; returns the live order already stored under the key instead, if any.
+
+    A key whose lifetime has passed is taken off its old order and reused.
+    Orders stored before keys expired carry no expiry and count as expired.
+    """
+    for _ in range(2):
+        try:
+            mongo.db.orders.insert_one(document)
+            return None
+        except DuplicateKeyError:
+            if not idempotency_key:
+                raise
+        existing = mongo.db.orders.find_one({"idempotency_key": idempotency_key})
+        if existing is not None:
+            if existing.get("idempotency_expires_at", datetime.min) > datetime.utcnow():
+                return existing
+            mongo.db.orders.update_one({"_id": existing["_id"], "idempotency_key": idempotency_key}, {"$unset": {
+                "idempotency_key": "", "idempotency_fingerprint": "", "idempotency_expires_at": ""}})
+    mongo.db.orders.insert_one(document)
+    return None
+
+def record_order_in_summary(document):
+    """Fold a newly stored order into its customer's summary document."""
+    mongo.db.customer_order_summaries.update_one({"customer_id": document["customer_id"]}, {
+        "$inc": {"order_count": 1, "total_amount": document["total_amount"]},
+        "$min": {"first_order_at": document["timestamp"]},
+        "$max": {"last_order_at": document["timestamp"]},
+        "$push": {"recent_orders": {
+            "$each": [{field: document[field] for field in RECENT_ORDER_FIELDS if field != "_id"}],
+            "$sort": {"timestamp": -1},
+            "$slice": SUMMARY_RECENT_ORDERS,
+        }},
+    }, upsert=True)
+
+def rebuild_summary(customer_id):
+    """Recompute a customer's summary from their orders and store it; returns it, or None without orders."""
+    totals = list(mongo.db.orders.aggregate([
+        {"$match": {"customer_id": customer_id}},
+        {"$group": {
+            "_id": "$customer_id",
+            "order_count": {"$sum": 1},
+            "total_amount": {"$sum": "$total_amount"},
+            "first_order_at": {"$min": "$timestamp"},
+            "last_order_at": {"$max": "$timestamp"},
+        }},
+    ]))
+    if not totals:
+        mongo.db.customer_order_summaries.delete_one({"customer_id": customer_id})
+        return None
+    summary = totals[0]
+    del summary["_id"]
+    summary["customer_id"] = customer_id
+    summary["recent_orders"] = list(mongo.db.orders.find({"customer_id": customer_id}, RECENT_ORDER_FIELDS)
+                                    .sort("timestamp", DESCENDING).limit(SUMMARY_RECENT_ORDERS))
+    mongo.db.customer_order_summaries.replace_one({"customer_id": customer_id}, summary, upsert=True)
+    return summary
+
+def customers_with_orders():
+    return (group["_id"] for group in mongo.db.orders.aggregate([{"$group": {"_id": "$customer_id"}}],
+                                                                allowDiskUse=True))
+
+def backfill_order_summaries():
+    """Build summaries for customers whose orders predate them; later orders keep them current."""
+    summarized = set(mongo.db.customer_order_summaries.distinct("customer_id"))
+    backfilled = 0
+    for customer_id in customers_with_orders():
+        if customer_id not in summarized:
+            rebuild_summary(customer_id)
+            backfilled += 1
+    if backfilled:
+        app.logger.info("Built order summaries for %d customers", backfilled)
+
+def summary_response(summary, customer_id, recent):
+    summary = summary or {"order_count": 0, "total_amount": 0.0, "first_order_at": None,
+                          "last_order_at": None, "recent_orders": []}
+    return {
+        "customer_id": customer_id,
+        "order_count": summary["order_count"],
+        "total_amount": round(summary["total_amount"], 2),
+        "first_order_at": summary["first_order_at"],
+        "last_order_at": summary["last_order_at"],
+        "recent_orders": summary["recent_orders"][:recent],
+    }
+
 @order_ns.route('/')
 class OrderList(Resource):
-    @order_ns.doc('list_orders')
+    @order_ns.doc('list_orders', params=LIST_PARAMS)
     def get(self):
-        data = list(mongo.db.orders.find())
-        for item in data:
-            item["_id"] = str(item["_id"])
-            if "timestamp" in item and isinstance(item["timestamp"], datetime):
-                item["timestamp"] = item["timestamp"].isoformat()
-            if "updated" in item and isinstance(item["updated"], datetime):
-                item["updated"] = item["updated"].isoformat()
-        return jsonify(data)
-
-    @order_ns.doc('create_order')
+        data, next_cursor = fetch_page(mongo.db.orders, {}, ORDER_FIELDS)
+        return page_response(data, next_cursor)
+
+    @order_ns.doc('create_order', params={IDEMPOTENCY_HEADER: {
+        'in': 'header', 'description': 'Repeating a key returns the order first created with it'}})
     @order_ns.expect(order_model)
     def post(self):
-        args = api.payload
-        required_fields = ['customer_id', 'products', 'total_amount', 'status', 'timestamp', 'updated', 'confirmed', 'tracking_numbers']
-        for field in required_fields:
-            if field not in args:
-                api.abort(400, f"Missing required field: {field}")
-        args['order_id'] = str(uuid.uuid4())
         try:
-            timestamp = datetime.fromisoformat(args['timestamp'])
-            updated = datetime.fromisoformat(args['updated'])
-        except (ValueError, TypeError):
-            api.abort(400, "Invalid timestamp or updated format. Use ISO 8601.")
-
-        document = {
-            "order_id": args["order_id"],
-            "customer_id": args["customer_id"],
-            "products": args["products"],
-            "total_amount": float(args["total_amount"]),
-            "status": args["status"],
-            "timestamp": timestamp,
-            "updated": updated,
-            "confirmed": args["confirmed"],
-            "tracking_numbers": args["tracking_numbers"]
-        }
-        result = mongo.db.orders.insert_one(document)
-        document["_id"] = str(result.inserted_id)
-        document["timestamp"] = timestamp.isoformat()
-        document["updated"] = updated.isoformat()
+            document = {"order_id": str(uuid.uuid4()), **validate_order(api.payload)}
+        except ValueError as exc:
+            api.abort(400, str(exc))
+        idempotency_key = request.headers.get(IDEMPOTENCY_HEADER)
+        if idempotency_key:
+            document.update(
+                idempotency_key=idempotency_key,
+                idempotency_fingerprint=order_fingerprint(document),
+                idempotency_expires_at=datetime.utcnow() + timedelta(seconds=IDEMPOTENCY_TTL),
+            )
+        existing = insert_order(document, idempotency_key)
+        if existing is not None:
+            if existing["idempotency_fingerprint"] != document["idempotency_fingerprint"]:
+                api.abort(422, f"{IDEMPOTENCY_HEADER} was already used for a different order")
+            return existing, 200, {"Idempotent-Replayed": "true"}
+        record_order_in_summary(document)
         return document, 201
 
+@order_ns.route('/export')
+class OrderExport(Resource):
+    @order_ns.doc('export_orders', params=EXPORT_PARAMS)
+    def get(self):
+        """Stream orders as NDJSON, optionally filtered by date range"""
+        return export_response(mongo.db.orders, ["timestamp", "updated"], "orders")
+
 @order_ns.route('/by_customer/<customer_id>')
 @order_ns.doc(params={'customer_id': 'The customer ID'})
 class OrderByCustomer(Resource):
-    @order_ns.doc('lookup_orders_by_customer')
+    @order_ns.doc('lookup_orders_by_customer', params={
+        'limit': f'Most recent orders to return (default {BY_CUSTOMER_DEFAULT_LIMIT}, max {BY_CUSTOMER_MAX_LIMIT})'})
+    def get(self, customer_id):
+        """A customer's orders, newest first"""
+        try:
+            limit = int(request.args.get('limit', BY_CUSTOMER_DEFAULT_LIMIT))
+        except ValueError:
+            api.abort(400, "limit must be an integer")
+        if not 1 <= limit <= BY_CUSTOMER_MAX_LIMIT:
+            api.abort(400, f"limit must be between 1 and {BY_CUSTOMER_MAX_LIMIT}")
+        data = list(mongo.db.orders.find({"customer_id": customer_id}, {field: 1 for field in ORDER_FIELDS})
+                    .sort("timestamp", DESCENDING).limit(limit))
+        return data, 200
+
+@order_ns.route('/summary/<customer_id>')
+@order_ns.doc(params={'customer_id': 'The customer ID'})
+class CustomerOrderSummary(Resource):
+    @order_ns.doc('customer_order_summary', params={
+        'recent': f'Recent orders to include (default and max {SUMMARY_RECENT_ORDERS})'})
     def get(self, customer_id):
-        data = list(mongo.db.orders.find({"customer_id": customer_id}))
-        for item in data:
-            item["_id"] = str(item["_id"])
-            if "timestamp" in item and isinstance(item["timestamp"], datetime):
-                item["timestamp"] = item["timestamp"].isoformat()
-            if "updated" in item and isinstance(item["updated"], datetime):
-                item["updated"] = item["updated"].isoformat()
-        return jsonify(data)
+        """Order count, total spend and most recent orders of a customer"""
+        try:
+            recent = int(request.args.get('recent', SUMMARY_RECENT_ORDERS))
+        except ValueError:
+            api.abort(400, "recent must be an integer")
+        if not 0 <= recent <= SUMMARY_RECENT_ORDERS:
+            api.abort(400, f"recent must be between 0 and {SUMMARY_RECENT_ORDERS}")
+        summary = mongo.db.customer_order_summaries.find_one({"customer_id": customer_id}, {"_id": 0})
+        return summary_response(summary, customer_id, recent), 200
+
+@order_ns.route('/summary/<customer_id>/rebuild')
+@order_ns.doc(params={'customer_id': 'The customer ID'})
+class CustomerOrderSummaryRebuild(Resource):
+    @order_ns.doc('rebuild_customer_order_summary')
+    def post(self, customer_id):
+        """Recompute a customer's summary from their orders"""
+        return summary_response(rebuild_summary(customer_id), customer_id, SUMMARY_RECENT_ORDERS), 200
+
+@order_ns.route('/summaries/rebuild')
+class OrderSummariesRebuild(Resource):
+    @order_ns.doc('rebuild_all_order_summaries')
+    def post(self):
+        """Recompute every customer's summary, e.g. after orders were written outside this service"""
+        rebuilt = 0
+        for customer_id in customers_with_orders():
+            rebuild_summary(customer_id)
+            rebuilt += 1
+        return {"rebuilt": rebuilt}, 200
 
 if __name__ == "__main__":
-    app.run(host="0.0.0.0", port=5003, debug=True)
\ No newline at end of file
+    def on_startup():
+        ensure_indexes(mongo.db, INDEXES)
+        backfill_order_summaries()
+
+    serve(app, 5003, mongo=mongo, on_startup=on_startup)
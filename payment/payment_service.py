@@ -1,15 +1,37 @@
-from flask import Flask, jsonify
-from flask_pymongo import PyMongo
-from flask_restx import Api, Resource, fields
+from flask import request
+from flask_restx import Resource, fields
+from pymongo import ASCENDING, DESCENDING, IndexModel, ReturnDocument
+from pymongo.errors import DuplicateKeyError
 import os
 import uuid
-from datetime import datetime
+from datetime import datetime, timedelta
 
-app = Flask(__name__)
-app.config['MONGO_URI'] = os.getenv("MONGO_URI")
-mongo = PyMongo(app)
+from common.app import create_service
+from common.export import EXPORT_PARAMS, export_response
+from common.indexes import ensure_indexes, register_diagnostics
+from common.pagination import LIST_PARAMS, fetch_page, page_response
+from common.serving import serve
+from common.sweeper import BatchSweeper
+from common.validation import compile_validator
 
-api = Api(app, title="Payment Service API", version="1.0", doc="/")
+app, mongo, api = create_service(__name__, "payment", "Payment Service API")
+
+IDEMPOTENCY_HEADER = "Idempotency-Key"
+BY_ORDER_LIMIT = 100
+# Pending payments recorded longer ago than this are expired by the sweeper, which runs
+# every PAYMENT_EXPIRY_INTERVAL seconds in PAYMENT_EXPIRY_BATCH_SIZE batches.
+PENDING_TTL_SECONDS = int(os.getenv("PAYMENT_PENDING_TTL", "900"))
+EXPIRY_INTERVAL_SECONDS = float(os.getenv("PAYMENT_EXPIRY_INTERVAL", "30"))
+EXPIRY_BATCH_SIZE = int(os.getenv("PAYMENT_EXPIRY_BATCH_SIZE", "500"))
+
+PENDING, AUTHORIZED, CAPTURED, FAILED, EXPIRED = "pending", "authorized", "captured", "failed", "expired"
+PAYMENT_STATUSES = (PENDING, AUTHORIZED, CAPTURED, FAILED, EXPIRED)
+# Target status -> statuses it may be reached from. Only the sweeper expires payments.
+TRANSITIONS = {
+    AUTHORIZED: (PENDING,),
+    CAPTURED: (AUTHORIZED,),
+    FAILED: (PENDING, AUTHORIZED),
+}
 
 payment_ns = api.namespace('payments', description='Payment operations')
 
@@ -17,56 +39,179 @@ payment_ns = api.namespace('payments', description='Payment operations')
 payment_model = api.model('Payment', {
     'order_id': fields.String(required=True, description='Order ID'),
     'amount': fields.Float(required=True, description='Payment amount'),
-    'status': fields.String(required=True, description='Payment status'),
-    'timestamp': fields.String(required=True, description='Payment creation timestamp (ISO 8601)'),
-    'updated': fields.String(required=True, description='Last updated timestamp (ISO 8601)'),
-    'expired': fields.Boolean(required=True, description='Payment expiration status'),
+    'status': fields.String(required=True, description='Payment status', enum=list(PAYMENT_STATUSES)),
+    'timestamp': fields.DateTime(required=True, description='Payment creation timestamp (ISO 8601)'),
+    'updated': fields.DateTime(required=True, description='Last updated timestamp (ISO 8601)'),
+    'created': fields.DateTime(readonly=True, description='When the payment service recorded the payment'),
+    'expired': fields.Boolean(readonly=True, description='Whether the payment expired while pending'),
+    'version': fields.Integer(readonly=True, description='Incremented by every status change'),
     'payment_methods': fields.List(fields.String, required=True, description='Payment methods')
 })
 
+PAYMENT_FIELDS = ['_id', 'payment_id', *payment_model]
+validate_payment = compile_validator(payment_model)
+
+INDEXES = {
+    "payments": [
+        IndexModel([("payment_id", ASCENDING)], unique=True),
+        IndexModel([("order_id", ASCENDING)]),
+        IndexModel([("status", ASCENDING), ("created", ASCENDING)]),
+        IndexModel([("timestamp", ASCENDING)]),
+        IndexModel([("updated", ASCENDING)]),
+        # Only payments created with an Idempotency-Key carry the field.
+        IndexModel([("idempotency_key", ASCENDING)], unique=True, sparse=True),
+    ],
+}
+
+HOT_QUERIES = {
+    "export_by_timestamp": ("payments", {"timestamp": {"$gte": datetime(1970, 1, 1)}}, [("timestamp", ASCENDING)]),
+    "export_by_updated": ("payments", {"updated": {"$gte": datetime(1970, 1, 1)}}, [("updated", ASCENDING)]),
+    "get_payment": ("payments", {"payment_id": ""}, None),
+    "payments_by_order": ("payments", {"order_id": ""}, None),
+    "stale_pending": ("payments", {"status": PENDING, "created": {"$lt": datetime(1970, 1, 1)}}, None),
+}
+
+register_diagnostics(api, mongo, HOT_QUERIES)
+
+status_change_model = api.model('PaymentStatusChange', {
+    'status': fields.String(required=True, description='New status', enum=list(TRANSITIONS)),
+    'version': fields.Integer(description='Only apply the change if the payment is still at this version'),
+})
+validate_status_change = compile_validator(status_change_model)
+
+expiry_sweeper = BatchSweeper(
+    "payment-expiry",
+    lambda: mongo.db.payments,
+    # Age is measured from the server's clock: the client's timestamp may be
+    # much older, e.g. the order's timestamp on payments the gateway creates.
+    query=lambda: {"status": PENDING,
+                   "created": {"$lt": datetime.utcnow() - timedelta(seconds=PENDING_TTL_SECONDS)}},
+    update=lambda: {"$set": {"status": EXPIRED, "expired": True, "updated": datetime.utcnow()},
+                    "$inc": {"version": 1}},
+    batch_size=EXPIRY_BATCH_SIZE,
+    interval=EXPIRY_INTERVAL_SECONDS,
+)
+
+def backfill_versions():
+    """Start payments created before status versioning at version 1."""
+    mongo.db.payments.update_many({"version": {"$exists": False}}, {"$set": {"version": 1}})
+
+def backfill_creation_times():
+    """Stamp payments recorded before ``created`` existed, giving pending ones a full TTL from now."""
+    mongo.db.payments.update_many({"created": {"$exists": False}}, {"$set": {"created": datetime.utcnow()}})
+
+def change_status(payment_id, status, version=None):
+    """Move a payment to ``status`` if its current status allows it and, when given, its version matches.
+
+    Returns the updated payment, or aborts with 404 or 409.
+    """
+    query = {"payment_id": payment_id, "status": {"$in": list(TRANSITIONS[status])}}
+    if version is not None:
+        query["version"] = version
+    now = datetime.utcnow()
+    payment = mongo.db.payments.find_one_and_update(
+        query,
+        {"$set": {"status": status, "updated": now}, "$inc": {"version": 1}},
+        return_document=ReturnDocument.BEFORE
+    )
+    if payment is not None:
+        payment.update(status=status, updated=now, version=payment["version"] + 1)
+        return payment
+    current = mongo.db.payments.find_one({"payment_id": payment_id}, {"_id": 0, "status": 1, "version": 1})
+    if current is None:
+        api.abort(404, "Payment not found")
+    if version is not None and current["version"] != version:
+        api.abort(409, f"Payment is at version {current['version']}", version=current["version"])
+    api.abort(409, f"Cannot move a {current['status']} payment to {status}", status=current["status"])
+
 @payment_ns.route('/')
 class PaymentList(Resource):
-    @payment_ns.doc('list_payments')
+    @payment_ns.doc('list_payments', params=LIST_PARAMS)
     def get(self):
-        data = list(mongo.db.payments.find())
-        for item in data:
-            item["_id"] = str(item["_id"])
-            if "timestamp" in item and isinstance(item["timestamp"], datetime):
-                item["timestamp"] = item["timestamp"].isoformat()
-            if "updated" in item and isinstance(item["updated"], datetime):
-                item["updated"] = item["updated"].isoformat()
-        return jsonify(data)
-
-    @payment_ns.doc('create_payment')
+        data, next_cursor = fetch_page(mongo.db.payments, {}, PAYMENT_FIELDS)
+        return page_response(data, next_cursor)
+
+    @payment_ns.doc('create_payment', params={IDEMPOTENCY_HEADER: {
+        'in': 'header', 'description': 'Repeating a key returns the payment first created with it'}})
     @payment_ns.expect(payment_model)
     def post(self):
-        args = api.payload
-        required_fields = ['order_id', 'amount', 'status', 'timestamp', 'updated', 'expired', 'payment_methods']
-        for field in required_fields:
-            if field not in args:
-                api.abort(400, f"Missing required field: {field}")
-        args['payment_id'] = str(uuid.uuid4())
         try:
-            timestamp = datetime.fromisoformat(args['timestamp'])
-            updated = datetime.fromisoformat(args['updated'])
-        except (ValueError, TypeError):
-            api.abort(400, "Invalid timestamp or updated format. Use ISO 8601.")
-
-        document = {
-            "payment_id": args["payment_id"],
-            "order_id": args["order_id"],
-            "amount": float(args["amount"]),
-            "status": args["status"],
-            "timestamp": timestamp,
-            "updated": updated,
-            "expired": args["expired"],
-            "payment_methods": args["payment_methods"]
-        }
-        result = mongo.db.payments.insert_one(document)
-        document["_id"] = str(result.inserted_id)
-        document["timestamp"] = timestamp.isoformat()
-        document["updated"] = updated.isoformat()
+            document = {"payment_id": str(uuid.uuid4()), **validate_payment(api.payload)}
+        except ValueError as exc:
+            api.abort(400, str(exc))
+        # Later statuses are reached through /status, which checks the transition.
+        if document["status"] != PENDING:
+            api.abort(400, f"New payments must be {PENDING}; use PUT /payments/<payment_id>/status to change it")
+        document.update(created=datetime.utcnow(), expired=False, version=1)
+        idempotency_key = request.headers.get(IDEMPOTENCY_HEADER)
+        if idempotency_key:
+            document["idempotency_key"] = idempotency_key
+        try:
+            mongo.db.payments.insert_one(document)
+        except DuplicateKeyError:
+            existing = mongo.db.payments.find_one({"idempotency_key": idempotency_key}) if idempotency_key else None
+            if existing is None:
+                raise
+            return existing, 200, {"Idempotent-Replayed": "true"}
         return document, 201
 
+@payment_ns.route('/export')
+class PaymentExport(Resource):
+    @payment_ns.doc('export_payments', params=EXPORT_PARAMS)
+    def get(self):
+        """Stream payments as NDJSON, optionally filtered by date range"""
+        return export_response(mongo.db.payments, ["timestamp", "updated"], "payments")
+
+@payment_ns.route('/expiry')
+class PaymentExpiry(Resource):
+    @payment_ns.doc('payment_expiry_stats')
+    def get(self):
+        """Throughput and last run of this process's pending-payment sweeper"""
+        return expiry_sweeper.stats(), 200
+
+    @payment_ns.doc('expire_payments')
+    def post(self):
+        """Expire stale pending payments now"""
+        return {"expired": expiry_sweeper.sweep()}, 200
+
+@payment_ns.route('/by_order/<order_id>')
+@payment_ns.doc(params={'order_id': 'The order ID'})
+class PaymentsByOrder(Resource):
+    @payment_ns.doc('lookup_payments_by_order')
+    def get(self, order_id):
+        """An order's payments, newest first"""
+        return list(mongo.db.payments.find({"order_id": order_id})
+                    .sort("timestamp", DESCENDING).limit(BY_ORDER_LIMIT)), 200
+
+@payment_ns.route('/<payment_id>')
+@payment_ns.doc(params={'payment_id': 'The payment ID'})
+class Payment(Resource):
+    @payment_ns.doc('get_payment')
+    def get(self, payment_id):
+        """Get a payment by its ID"""
+        payment = mongo.db.payments.find_one({"payment_id": payment_id})
+        if not payment:
+            api.abort(404, "Payment not found")
+        return payment, 200
+
+@payment_ns.route('/<payment_id>/status')
+@payment_ns.doc(params={'payment_id': 'The payment ID'})
+class PaymentStatus(Resource):
+    @payment_ns.doc('change_payment_status')
+    @payment_ns.expect(status_change_model)
+    def put(self, payment_id):
+        """Authorize, capture or fail a payment: pending -> authorized -> captured, or -> failed"""
+        try:
+            args = validate_status_change(api.payload)
+        except ValueError as exc:
+            api.abort(400, str(exc))
+        return change_status(payment_id, args['status'], args.get('version')), 200
+
+
 if __name__ == "__main__":
-    app.run(host="0.0.0.0", port=5004, debug=True)
\ No newline at end of file
+    def on_startup():
+        ensure_indexes(mongo.db, INDEXES)
+        backfill_versions()
+        backfill_creation_times()
+
+    serve(app, 5004, mongo=mongo, on_startup=on_startup, on_worker_start=expiry_sweeper.start)
@@ -1,67 +1,281 @@
-from flask import Flask, jsonify
-from flask_pymongo import PyMongo
-from flask_restx import Api, Resource, fields
+from flask import request
+from flask_restx import Resource, fields
+from bson import ObjectId
+from bson.errors import InvalidId
+from pymongo import ASCENDING, DESCENDING, TEXT, IndexModel
 import os
 import uuid
 from datetime import datetime
 
-app = Flask(__name__)
-app.config['MONGO_URI'] = os.getenv("MONGO_URI")
-mongo = PyMongo(app)
+from common.app import create_service
+from common.bulk import BULK_PARAMS, bulk_ingest
+from common.indexes import ensure_indexes, register_diagnostics
+from common.invalidation import invalidate_gateway_cache
+from common.pagination import LIST_PARAMS, fetch_page, page_response, parse_limit, parse_projection
+from common.serving import serve
+from common.validation import compile_validator
 
-api = Api(app, title="Product Service API", version="1.0", doc="/")
+app, mongo, api = create_service(__name__, "product", "Product Service API")
 
 product_ns = api.namespace('products', description='Product operations')
 
+MAX_BATCH_SIZE = int(os.getenv("MAX_BATCH_SIZE", "1000"))
+CHANGES_DEFAULT_LIMIT = 1000
+CHANGES_MAX_LIMIT = 10000
+# Deleted products are kept as tombstones long enough for change-feed readers to
+# see them; a reader that falls further behind has to reload the whole catalog.
+TOMBSTONE_TTL_SECONDS = int(os.getenv("PRODUCT_TOMBSTONE_TTL", str(7 * 24 * 3600)))
+# Relevance-ordered search pages by offset, since a text score cannot be used
+# in a range query; this bounds how many matches a deep page has to skip.
+SEARCH_MAX_OFFSET = int(os.getenv("SEARCH_MAX_OFFSET", "10000"))
+SEARCH_SORTS = ("price", "-price", "relevance")
+
 # Product model
 product_model = api.model('Product', {
     'name': fields.String(required=True, description='Product name'),
     'description': fields.String(required=True, description='Product description'),
     'price': fields.Float(required=True, description='Product price'),
-    'updated': fields.String(required=True, description='Last updated timestamp (ISO 8601)'),
+    'updated': fields.DateTime(required=True, description='Last updated timestamp (ISO 8601)'),
     'expired': fields.Boolean(required=True, description='Product expiration status'),
     'categories': fields.List(fields.String, required=True, description='Product categories')
 })
 
+PRODUCT_FIELDS = ['_id', 'product_id', *product_model]
+validate_product = compile_validator(product_model)
+
+INDEXES = {
+    "products": [
+        IndexModel([("product_id", ASCENDING)], unique=True),
+        IndexModel([("modified", ASCENDING), ("product_id", ASCENDING)]),
+        # Search: one text index over name and description, and a price-ordered
+        # index per equality filter so a filtered page is a range scan with no sort.
+        IndexModel([("name", TEXT), ("description", TEXT)], weights={"name": 5, "description": 1},
+                   name="product_text"),
+        IndexModel([("categories", ASCENDING), ("price", ASCENDING), ("_id", ASCENDING)]),
+        IndexModel([("expired", ASCENDING), ("price", ASCENDING), ("_id", ASCENDING)]),
+        IndexModel([("price", ASCENDING), ("_id", ASCENDING)]),
+    ],
+    "product_tombstones": [
+        IndexModel([("modified", ASCENDING)], expireAfterSeconds=TOMBSTONE_TTL_SECONDS),
+    ],
+}
+
+HOT_QUERIES = {
+    "get_product": ("products", {"product_id": ""}, None),
+    "batch_get_products": ("products", {"product_id": {"$in": ["", ""]}}, None),
+    "product_changes": ("products", {"modified": {"$gte": datetime(1970, 1, 1)}},
+                        [("modified", ASCENDING), ("product_id", ASCENDING)]),
+    "search_by_category": ("products", {"categories": "", "price": {"$gte": 0.0}},
+                           [("price", ASCENDING), ("_id", ASCENDING)]),
+    "search_unexpired": ("products", {"expired": False}, [("price", ASCENDING), ("_id", ASCENDING)]),
+    "search_text": ("products", {"$text": {"$search": "product"}}, None),
+}
+
+register_diagnostics(api, mongo, HOT_QUERIES)
+
+product_batch_model = api.model('ProductBatch', {
+    'product_ids': fields.List(fields.String, required=True, description='Product IDs to look up')
+})
+
+def build_product_document(args):
+    """Validate a product payload and return the document to store; raises ValueError."""
+    return {
+        "product_id": str(uuid.uuid4()),
+        **validate_product(args),
+        # Server-side write time for the change feed; ``updated`` is client-supplied.
+        "modified": datetime.utcnow(),
+    }
+
 @product_ns.route('/')
 class ProductList(Resource):
-    @product_ns.doc('list_products')
+    @product_ns.doc('list_products', params=LIST_PARAMS)
     def get(self):
-        data = list(mongo.db.products.find())
-        for item in data:
-            item["_id"] = str(item["_id"])
-            if "updated" in item and isinstance(item["updated"], datetime):
-                item["updated"] = item["updated"].isoformat()
-        return jsonify(data)
+        data, next_cursor = fetch_page(mongo.db.products, {}, PRODUCT_FIELDS)
+        return page_response(data, next_cursor)
 
     @product_ns.doc('create_product')
     @product_ns.expect(product_model)
     def post(self):
-        args = api.payload
-        required_fields = ['name', 'description', 'price', 'updated', 'expired', 'categories']
-        for field in required_fields:
-            if field not in args:
-                api.abort(400, f"Missing required field: {field}")
-        args['product_id'] = str(uuid.uuid4())
         try:
-            updated = datetime.fromisoformat(args['updated'])
-        except (ValueError, TypeError):
-            api.abort(400, "Invalid updated format. Use ISO 8601.")
-
-        document = {
-            "product_id": args["product_id"],
-            "name": args["name"],
-            "description": args["description"],
-            "price": float(args["price"]),
-            "updated": updated,
-            "expired": args["expired"],
-            "categories": args["categories"]
-        }
-        result = mongo.db.products.insert_one(document)
-        document["_id"] = str(result.inserted_id)
-        document["updated"] = updated.isoformat()
+            document = build_product_document(api.payload)
+        except ValueError as exc:
+            api.abort(400, str(exc))
+
+        mongo.db.products.insert_one(document)
+        invalidate_gateway_cache("product", [document["product_id"]])
         return document, 201
 
+@product_ns.route('/bulk')
+class ProductBulk(Resource):
+    @product_ns.doc('bulk_create_products', params=BULK_PARAMS)
+    @product_ns.expect([product_model])
+    def post(self):
+        """Create or upsert products from a JSON array or NDJSON stream"""
+        return bulk_ingest(mongo.db.products, build_product_document, "product_id",
+                           after_chunk=lambda product_ids: invalidate_gateway_cache("product", product_ids))
+
+SEARCH_PARAMS = dict(LIST_PARAMS, **{
+    'q': 'Words to match in the name or description',
+    'category': 'Category to match; repeat or comma-separate to match any of several',
+    'min_price': 'Lowest price to include',
+    'max_price': 'Highest price to include',
+    'expired': 'true or false to filter on the expired flag',
+    'sort': 'price, -price or relevance (default relevance with q, otherwise price)',
+})
+
+def search_query(args):
+    """Build the Mongo filter for a search request's arguments."""
+    query = {}
+    text = args.get('q', '').strip()
+    if text:
+        query["$text"] = {"$search": text}
+    categories = [name.strip() for value in args.getlist('category') for name in value.split(',') if name.strip()]
+    if categories:
+        query["categories"] = categories[0] if len(categories) == 1 else {"$in": categories}
+    price = {}
+    for name, operator in (('min_price', "$gte"), ('max_price', "$lte")):
+        if args.get(name):
+            try:
+                price[operator] = float(args[name])
+            except ValueError:
+                api.abort(400, f"{name} must be a number")
+    if price:
+        query["price"] = price
+    if args.get('expired'):
+        if args['expired'] not in ("true", "false"):
+            api.abort(400, "expired must be true or false")
+        query["expired"] = args['expired'] == "true"
+    return query
+
+def price_cursor_query(cursor, descending):
+    """Filter for the products after a ``<price>_<_id>`` cursor in (price, _id) order."""
+    try:
+        price, last_id = cursor.rsplit("_", 1)
+        price, last_id = float(price), ObjectId(last_id)
+    except (ValueError, InvalidId):
+        api.abort(400, "Invalid after cursor")
+    beyond = "$lt" if descending else "$gt"
+    return {"$or": [{"price": {beyond: price}}, {"price": price, "_id": {beyond: last_id}}]}
+
+@product_ns.route('/search')
+class ProductSearch(Resource):
+    @product_ns.doc('search_products', params=SEARCH_PARAMS)
+    def get(self):
+        """Products matching text, category, price and expired filters, one sorted page at a time"""
+        args = request.args
+        query = search_query(args)
+        sort = args.get('sort') or ("relevance" if "$text" in query else "price")
+        if sort not in SEARCH_SORTS:
+            api.abort(400, f"sort must be one of: {', '.join(SEARCH_SORTS)}")
+        if sort == "relevance" and "$text" not in query:
+            api.abort(400, "sort=relevance needs q")
+        limit = parse_limit()
+        projection = parse_projection(args.get('fields'), PRODUCT_FIELDS)
+        after = args.get('after')
+
+        if sort == "relevance":
+            try:
+                offset = int(after) if after else 0
+            except ValueError:
+                api.abort(400, "Invalid after cursor")
+            if not 0 <= offset <= SEARCH_MAX_OFFSET:
+                api.abort(400, f"Relevance results end after {SEARCH_MAX_OFFSET} matches; narrow the search")
+            projection = dict(projection or {}, score={"$meta": "textScore"})
+            cursor = (mongo.db.products.find(query, projection)
+                      .sort([("score", {"$meta": "textScore"}), ("_id", ASCENDING)])
+                      .skip(offset).limit(limit + 1))
+        else:
+            descending = sort == "-price"
+            if after:
+                query = {"$and": [query, price_cursor_query(after, descending)]}
+            if projection:
+                # The next cursor is built from the last product's price.
+                projection["price"] = 1
+            direction = DESCENDING if descending else ASCENDING
+            cursor = mongo.db.products.find(query, projection).sort([("price", direction), ("_id", direction)]) \
+                .limit(limit + 1)
+
+        try:
+            documents = list(cursor)
+        except NotImplementedError:
+            # The in-memory backend (MONGO_BACKEND=memory) has no text search.
+            api.abort(501, "Text search is not supported by this database backend")
+        next_cursor = None
+        if len(documents) > limit:
+            documents = documents[:limit]
+            last = documents[-1]
+            next_cursor = str(offset + limit) if sort == "relevance" else f"{last.get('price', 0.0)!r}_{last['_id']}"
+        return page_response(documents, next_cursor)
+
+@product_ns.route('/batch')
+class ProductBatch(Resource):
+    @product_ns.doc('batch_get_products')
+    @product_ns.expect(product_batch_model)
+    def post(self):
+        """Get products for several product IDs in one query; unknown IDs map to null"""
+        args = api.payload
+        product_ids = args.get('product_ids') if isinstance(args, dict) else None
+        if not isinstance(product_ids, list) or not all(isinstance(product_id, str) for product_id in product_ids):
+            api.abort(400, "product_ids must be a list of product IDs")
+        if len(product_ids) > MAX_BATCH_SIZE:
+            api.abort(400, f"At most {MAX_BATCH_SIZE} product_ids per request")
+
+        found = {item["product_id"]: item
+                 for item in mongo.db.products.find({"product_id": {"$in": list(set(product_ids))}})}
+        return {product_id: found.get(product_id) for product_id in product_ids}, 200
+
+@product_ns.route('/changes')
+class ProductChanges(Resource):
+    @product_ns.doc('product_changes', params={
+        'since': 'ISO 8601 time; omit to list every product',
+        'after_id': 'Cursor: product_id of the last change already read',
+        'limit': f'Changes per page (default {CHANGES_DEFAULT_LIMIT}, max {CHANGES_MAX_LIMIT})',
+    })
+    def get(self):
+        """Prices of products written since a point in time, plus deletions, for replicas"""
+        try:
+            limit = int(request.args.get('limit', CHANGES_DEFAULT_LIMIT))
+            since = request.args.get('since')
+            since = datetime.fromisoformat(since) if since else None
+        except ValueError:
+            api.abort(400, "limit must be an integer and since an ISO 8601 time")
+        if not 1 <= limit <= CHANGES_MAX_LIMIT:
+            api.abort(400, f"limit must be between 1 and {CHANGES_MAX_LIMIT}")
+        after_id = request.args.get('after_id')
+        server_time = datetime.utcnow()
+
+        # A full listing pages on product_id; a change listing pages on
+        # (modified, product_id), with the cursor's since set to the last
+        # modified time read.
+        deleted = []
+        if since is None:
+            query = {"product_id": {"$gt": after_id}} if after_id else {}
+            sort = [("product_id", ASCENDING)]
+        else:
+            if after_id:
+                query = {"$or": [{"modified": {"$gt": since}}, {"modified": since, "product_id": {"$gt": after_id}}]}
+            else:
+                query = {"modified": {"$gte": since}}
+                deleted = [tombstone["product_id"] for tombstone in
+                           mongo.db.product_tombstones.find({"modified": {"$gte": since}}, {"_id": 0, "product_id": 1})]
+            sort = [("modified", ASCENDING), ("product_id", ASCENDING)]
+        documents = list(mongo.db.products.find(query, {"_id": 0, "product_id": 1, "price": 1, "modified": 1})
+                         .sort(sort).limit(limit))
+
+        cursor = None
+        if len(documents) == limit:
+            last = documents[-1]
+            cursor = {"after_id": last["product_id"]}
+            if since is not None:
+                cursor["since"] = last["modified"]
+        return {
+            "changes": [{"product_id": document["product_id"], "price": document.get("price", 0.0)}
+                        for document in documents],
+            "deleted": deleted,
+            "cursor": cursor,
+            "server_time": server_time,
+        }, 200
+
 @product_ns.route('/<product_id>')
 @product_ns.doc(params={'product_id': 'The product ID'})
 class ProductResource(Resource):
@@ -72,10 +286,6 @@ class ProductResource(Resource):
         if not product:
             api.abort(404, "Product not found")
 
-        product["_id"] = str(product["_id"])
-        if "updated" in product and isinstance(product["updated"], datetime):
-            product["updated"] = product["updated"].isoformat()
-
         return product, 200
 
     @product_ns.doc('delete_product')
@@ -83,9 +293,11 @@ class ProductResource(Resource):
         """Delete a product by its ID"""
         result = mongo.db.products.delete_one({"product_id": product_id})
         if result.deleted_count:
+            mongo.db.product_tombstones.insert_one({"product_id": product_id, "modified": datetime.utcnow()})
+            invalidate_gateway_cache("product", [product_id])
             return {"message": "Product deleted"}, 200
         api.abort(404, "Product not found")
 
 
 if __name__ == "__main__":
-    app.run(host="0.0.0.0", port=5001, debug=True)
\ No newline at end of file
+    serve(app, 5001, mongo=mongo, on_startup=lambda: ensure_indexes(mongo.db, INDEXES))
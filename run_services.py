@@ -1,30 +1,91 @@
-from multiprocessing import Process
+"""Launch the whole stack locally and wait until every service is healthy.
+
+Each service runs in its own process in production serving mode (see
+common/serving.py); export SERVER_MODE=dev to use the Werkzeug dev server.
+Upstream URLs default to the local ports below unless already set. Ctrl-C or
+SIGTERM stops every service gracefully.
+"""
 import os
+import signal
+import subprocess
+import sys
+import time
+import urllib.request
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+SERVICES = [
+    ("customer", "customer/customer_service.py", 5000),
+    ("product", "product/product_service.py", 5001),
+    ("inventory", "inventory/inventory_service.py", 5002),
+    ("order", "order/order_service.py", 5003),
+    ("payment", "payment/payment_service.py", 5004),
+    ("gateway", "api_gateway/api_gateway.py", 8000),
+]
+
+HEALTH_TIMEOUT = float(os.getenv("HEALTH_TIMEOUT", "60"))
+
 
-def run_customer():
-    os.system("python customer/customer_service.py")
+def service_env():
+    env = dict(os.environ)
+    # Services import the shared helpers in common/ from the repository root.
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [ROOT, env.get("PYTHONPATH")]))
+    for name, _, port in SERVICES:
+        key = "GATEWAY_URL" if name == "gateway" else f"{name.upper()}_SERVICE_URL"
+        env.setdefault(key, f"http://127.0.0.1:{port}")
+    return env
 
-def run_product():
-    os.system("python product/product_service.py")
 
-def run_inventory():
-    os.system("python inventory/inventory_service.py")
+def is_healthy(port):
+    try:
+        with urllib.request.urlopen(f"http://127.0.0.1:{port}/swagger.json", timeout=1) as response:
+            return response.status == 200
+    except OSError:
+        return False
 
-def run_order():
-    os.system("python order/order_service.py")
-    
-def run_payment():
-    os.system("python payment/payment_service.py")
 
-def run_gateway():
-    os.system("python api_gateway/api_gateway.py")
+def wait_until_healthy(processes):
+    deadline = time.monotonic() + HEALTH_TIMEOUT
+    pending = {name: port for name, _, port in SERVICES}
+    while pending and time.monotonic() < deadline:
+        for name, process in processes.items():
+            if process.poll() is not None:
+                raise RuntimeError(f"{name} exited with status {process.returncode}")
+        for name, port in list(pending.items()):
+            if is_healthy(port):
+                print(f"{name} is up on port {port}")
+                del pending[name]
+        if pending:
+            time.sleep(0.5)
+    if pending:
+        raise RuntimeError(f"Not healthy after {HEALTH_TIMEOUT:.0f}s: {', '.join(pending)}")
+
+
+def stop(processes):
+    for process in processes.values():
+        if process.poll() is None:
+            process.terminate()
+    for process in processes.values():
+        process.wait()
+
 
 if __name__ == '__main__':
-    services = [run_customer, run_product, run_inventory, run_order,run_payment, run_gateway]
-    processes = [Process(target=srv) for srv in services]
-    
-    for p in processes:
-        p.start()
-    
-    for p in processes:
-        p.join()
+    env = service_env()
+    processes = {}
+    for name, script, port in SERVICES:
+        processes[name] = subprocess.Popen([sys.executable, os.path.join(ROOT, script)],
+                                           env=dict(env, PORT=str(port)))
+
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    try:
+        wait_until_healthy(processes)
+        print("All services are healthy")
+        while all(process.poll() is None for process in processes.values()):
+            time.sleep(1)
+        print("A service exited; stopping the stack")
+    except RuntimeError as exc:
+        print(exc)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stop(processes)
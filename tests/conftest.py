@@ -0,0 +1,44 @@
+"""End-to-end fixtures: the whole stack in this process on the in-memory Mongo stand-in (see local_stack.py)."""
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [ROOT, os.path.join(ROOT, "api_gateway")]
+os.environ.setdefault("MONGO_BACKEND", "memory")
+
+from local_stack import LocalStack  # noqa: E402
+
+
+@pytest.fixture(scope="session")
+def stack():
+    return LocalStack()
+
+
+@pytest.fixture
+def client(stack):
+    return stack.test_client()
+
+
+NOW = "2024-01-01T00:00:00"
+
+
+@pytest.fixture
+def seed(client):
+    """Create a customer and a stocked product through the services; returns their IDs."""
+    from local_stack import mount_path
+
+    def create(stock=100, price=5.0):
+        customer = client.post(f"{mount_path('customer')}/customers/", json={
+            "name": "Ada", "email": "ada@example.com", "address": "1 Main St",
+            "updated": NOW, "confirmed": True, "orders_history": []}).get_json()
+        product = client.post(f"{mount_path('product')}/products/", json={
+            "name": "Widget", "description": "A widget", "price": price,
+            "updated": NOW, "expired": False, "categories": ["tools"]}).get_json()
+        client.post(f"{mount_path('inventory')}/inventory/", json={
+            "product_id": product["product_id"], "stock": stock, "updated": NOW,
+            "warehouse_locations": ["A"]})
+        return customer["customer_id"], product["product_id"]
+
+    return create
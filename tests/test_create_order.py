@@ -0,0 +1,96 @@
+from datetime import datetime
+import uuid
+
+ORDER = {
+    "customer_id": "customer-1",
+    "products": [{"product_id": "product-1", "quantity": 1}],
+    "total_amount": 0,
+    "status": "pending",
+    "timestamp": "2024-01-01T00:00:00",
+    "updated": "2024-01-01T00:00:00",
+    "confirmed": False,
+    "tracking_numbers": [],
+}
+
+
+def test_async_create_with_idempotency_key_replays_job(client):
+    headers = {"Prefer": "respond-async", "Idempotency-Key": str(uuid.uuid4())}
+
+    first = client.post("/create-order", json=ORDER, headers=headers)
+    assert first.status_code == 202
+    job = first.get_json()
+    assert first.headers["Location"].endswith(job["status_url"])
+
+    replay = client.post("/create-order", json=ORDER, headers=headers)
+    assert replay.status_code == 202
+    assert replay.get_json() == job
+    assert replay.headers["Location"] == first.headers["Location"]
+    assert replay.headers["Idempotent-Replayed"] == "true"
+
+
+def test_async_create_rejects_invalid_order(client):
+    response = client.post("/create-order", json=dict(ORDER, timestamp="yesterday"),
+                           headers={"Prefer": "respond-async", "Idempotency-Key": str(uuid.uuid4())})
+    assert response.status_code == 400
+
+
+def order_for(customer_id, product_id, quantity=2):
+    return dict(ORDER, customer_id=customer_id, products=[{"product_id": product_id, "quantity": quantity}])
+
+
+def test_replayed_order_does_not_take_stock_twice(stack, client, seed):
+    customer_id, product_id = seed(stock=10)
+    key = str(uuid.uuid4())
+
+    assert client.post("/create-order", json=order_for(customer_id, product_id),
+                       headers={"Idempotency-Key": key}).status_code == 201
+    # The gateway's record is gone, so the order service sees the key again.
+    stack.modules["gateway"].mongo.db.idempotency_keys.delete_one({"key": key})
+    response = client.post("/create-order", json=order_for(customer_id, product_id),
+                           headers={"Idempotency-Key": key})
+    assert response.status_code == 201
+    assert client.get(f"/inventory/{product_id}").get_json()["stock"] == 8
+    assert len(client.get(f"/orders/{customer_id}").get_json()) == 1
+
+
+def test_order_key_reused_for_a_different_order(stack, client, seed):
+    customer_id, product_id = seed(stock=10)
+    key = str(uuid.uuid4())
+    gateway_keys = stack.modules["gateway"].mongo.db.idempotency_keys
+    orders = stack.modules["order"].mongo.db.orders
+
+    first = client.post("/create-order", json=order_for(customer_id, product_id), headers={"Idempotency-Key": key})
+    gateway_keys.delete_one({"key": key})
+    response = client.post("/create-order", json=order_for(customer_id, product_id, quantity=3),
+                           headers={"Idempotency-Key": key})
+    assert response.status_code == 422
+    assert client.get(f"/inventory/{product_id}").get_json()["stock"] == 8
+
+    # Once the key's lifetime is over it starts a new order.
+    gateway_keys.delete_one({"key": key})
+    orders.update_one({"idempotency_key": key}, {"$set": {"idempotency_expires_at": datetime(2000, 1, 1)}})
+    response = client.post("/create-order", json=order_for(customer_id, product_id, quantity=3),
+                           headers={"Idempotency-Key": key})
+    assert response.status_code == 201
+    assert response.get_json()["order_id"] != first.get_json()["order_id"]
+    assert client.get(f"/inventory/{product_id}").get_json()["stock"] == 5
+
+
+def test_order_without_products_is_rejected(client, seed):
+    customer_id, _ = seed()
+    response = client.post("/create-order", json=dict(ORDER, customer_id=customer_id, products=[]))
+    assert response.status_code == 400
+    assert "at least one product" in response.get_json()["message"]
+
+
+def test_cart_larger_than_a_product_batch(stack):
+    gateway = stack.modules["gateway"]
+    product_ids = [str(uuid.uuid4()) for _ in range(gateway.PRODUCT_BATCH_SIZE + 1)]
+    stack.modules["product"].mongo.db.products.insert_many([
+        {"product_id": product_id, "name": "Bolt", "description": "A bolt", "price": 0.5,
+         "updated": datetime(2024, 1, 1), "expired": False, "categories": ["tools"]} for product_id in product_ids])
+
+    with gateway.app.test_request_context():
+        products = gateway.fetch_products(product_ids, 5.0)
+    assert sorted(products) == sorted(product_ids)
+    assert all(product["price"] == 0.5 for product in products.values())
@@ -0,0 +1,66 @@
+from datetime import datetime
+
+from local_stack import mount_path
+
+INVENTORY = f"{mount_path('inventory')}/inventory"
+
+
+def upsert(client, item):
+    """Upsert ``item`` through the bulk endpoint and return the stored entry."""
+    response = client.post(f"{INVENTORY}/bulk?mode=upsert", json=[item])
+    assert response.status_code == 200
+    assert response.get_json()["results"][0]["status"] in ("created", "updated")
+    return client.get(f"{INVENTORY}/{item['product_id']}").get_json()
+
+
+def test_upsert_without_threshold_keeps_the_stored_one(client, seed):
+    _, product_id = seed(stock=50)
+    assert client.put(f"{INVENTORY}/{product_id}/threshold", json={"low_stock_threshold": 3}).status_code == 200
+
+    entry = upsert(client, {"product_id": product_id, "stock": 5, "updated": "2024-01-02T00:00:00",
+                            "warehouse_locations": ["A"]})
+    assert entry["low_stock_threshold"] == 3
+    assert entry["low_stock_alert"] is False
+
+    entry = upsert(client, {"product_id": product_id, "stock": 5, "updated": "2024-01-02T00:00:00",
+                            "warehouse_locations": ["A"], "low_stock_threshold": 8})
+    assert entry["low_stock_threshold"] == 8
+    assert entry["low_stock_alert"] is True
+
+
+def test_upsert_of_a_new_entry_gets_the_default_threshold(stack, client):
+    entry = upsert(client, {"product_id": "new-product", "stock": 4, "updated": "2024-01-02T00:00:00",
+                            "warehouse_locations": ["A"]})
+    assert entry["low_stock_threshold"] == stack.modules["inventory"].LOW_STOCK_DEFAULT_THRESHOLD
+    assert entry["low_stock_alert"] is True
+
+
+def test_only_entries_created_low_are_reported_as_changes(client, seed):
+    since = datetime.utcnow().isoformat()
+    _, stocked = seed(stock=50)
+    _, low = seed(stock=2)
+    plenty = upsert(client, {"product_id": "plenty-product", "stock": 50, "updated": "2024-01-02T00:00:00",
+                             "warehouse_locations": ["A"]})
+    assert "alert_changed_at" not in plenty
+
+    changes = client.get(f"{INVENTORY}/low-stock/changes", query_string={"since": since}).get_json()
+    changed = [change["product_id"] for change in changes["changes"]]
+    assert low in changed
+    assert stocked not in changed and "plenty-product" not in changed
+
+
+def test_changes_always_return_a_cursor(client, seed):
+    since = datetime.utcnow().isoformat()
+    seed(stock=1)
+    seed(stock=2)
+
+    first = client.get(f"{INVENTORY}/low-stock/changes", query_string={"since": since, "limit": 1}).get_json()
+    assert first["cursor"]["after_id"] == first["changes"][0]["product_id"]
+
+    # Caught up: the cursor steps back from the server time, without an after_id.
+    rest = client.get(f"{INVENTORY}/low-stock/changes", query_string=first["cursor"]).get_json()
+    assert rest["cursor"]["after_id"] is None
+    assert rest["cursor"]["since"] < rest["server_time"]
+    empty = client.get(f"{INVENTORY}/low-stock/changes", query_string={"since": rest["server_time"]}).get_json()
+    assert empty["changes"] == []
+    assert empty["cursor"]["since"] is not None
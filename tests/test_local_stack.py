@@ -0,0 +1,87 @@
+import pytest
+
+from local_stack import mount_path
+
+
+def test_gateway_routes_are_not_shadowed_by_services(client, seed):
+    _, product_id = seed(stock=7)
+
+    response = client.get(f"/inventory/{product_id}")
+    assert response.status_code == 200
+    assert response.get_json()["stock"] == 7
+    assert client.get(f"/products/{product_id}").status_code == 200
+
+
+def test_services_are_mounted_under_their_prefix(client, seed):
+    customer_id, _ = seed()
+
+    assert client.get(f"{mount_path('customer')}/customers/{customer_id}").status_code == 200
+    assert client.get(f"{mount_path('customer')}/swagger.json").status_code == 200
+    assert client.get("/swagger.json").status_code == 200
+
+
+def test_create_order_end_to_end(client, seed):
+    customer_id, product_id = seed(stock=10, price=4.0)
+
+    response = client.post("/create-order", json={
+        "customer_id": customer_id, "products": [{"product_id": product_id, "quantity": 3}],
+        "total_amount": 0, "status": "pending", "timestamp": "2024-01-01T00:00:00",
+        "updated": "2024-01-01T00:00:00", "confirmed": False, "tracking_numbers": []})
+    assert response.status_code == 201
+    assert response.get_json()["total_amount"] == 12.0
+    assert client.get(f"/inventory/{product_id}").get_json()["stock"] == 7
+    assert client.get(f"/orders/{customer_id}").status_code == 200
+
+
+def test_deleting_a_product_invalidates_the_gateway_cache(client, seed):
+    _, product_id = seed()
+    assert client.get(f"/products/{product_id}").status_code == 200
+
+    assert client.delete(f"{mount_path('product')}/products/{product_id}").status_code == 200
+    assert client.get(f"/products/{product_id}").status_code == 404
+
+
+def test_text_search_is_unsupported_in_memory(client, seed):
+    seed(price=3.0)
+    products = f"{mount_path('product')}/products/search"
+
+    assert client.get(f"{products}?q=widget").status_code == 501
+    response = client.get(f"{products}?category=tools&max_price=3")
+    assert response.status_code == 200
+    assert response.get_json()
+
+
+@pytest.mark.parametrize("service", ["customer", "product", "inventory", "order", "payment"])
+def test_query_plans_flag_unexplained_queries(client, service):
+    response = client.get(f"{mount_path(service)}/diagnostics/query-plans")
+    assert response.status_code == 200
+    report = response.get_json()
+    assert report["collscans"] == []
+    assert report["unexplained"] == sorted(report["queries"])
+
+
+BULK_ITEMS = {
+    "customer": ("customers", "customer_id", {
+        "name": "Ada", "email": "ada@example.com", "address": "1 Main St",
+        "updated": "2024-01-01T00:00:00", "confirmed": True, "orders_history": []}),
+    "product": ("products", "product_id", {
+        "name": "Widget", "description": "A widget", "price": 2.0,
+        "updated": "2024-01-01T00:00:00", "expired": False, "categories": ["tools"]}),
+    "inventory": ("inventory", "product_id", {
+        "stock": 5, "updated": "2024-01-01T00:00:00", "warehouse_locations": ["A"]}),
+}
+
+
+@pytest.mark.parametrize("service", sorted(BULK_ITEMS))
+def test_bulk_upsert_in_memory(client, service):
+    resource, key_field, item = BULK_ITEMS[service]
+    url = f"{mount_path(service)}/{resource}/bulk?mode=upsert"
+    items = [dict(item, **{key_field: f"bulk-{service}-{n}"}) for n in range(2)]
+
+    response = client.post(url, json=items)
+    assert response.status_code == 200, response.get_json()
+    assert [result["status"] for result in response.get_json()["results"]] == ["created", "created"]
+
+    response = client.post(url, json=items[:1])
+    assert response.status_code == 200
+    assert response.get_json()["results"][0]["status"] == "updated"
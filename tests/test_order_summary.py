@@ -0,0 +1,44 @@
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from local_stack import mount_path
+
+ORDERS = mount_path("order") + "/orders"
+
+
+def order(customer_id, total_amount=10.0):
+    return {"customer_id": customer_id, "products": [{"product_id": "product-1", "quantity": 1}],
+            "total_amount": total_amount, "status": "pending", "timestamp": "2024-01-01T00:00:00",
+            "updated": "2024-01-01T00:00:00", "confirmed": False, "tracking_numbers": []}
+
+
+def test_concurrent_first_orders_are_each_counted_once(client):
+    customer_id = str(uuid.uuid4())
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        statuses = list(pool.map(lambda _: client.post(f"{ORDERS}/", json=order(customer_id)).status_code, range(8)))
+    assert statuses == [201] * 8
+
+    summary = client.get(f"{ORDERS}/summary/{customer_id}").get_json()
+    assert summary["order_count"] == 8
+    assert summary["total_amount"] == 80.0
+    assert len(summary["recent_orders"]) == 8
+
+
+def test_orders_predating_summaries_are_backfilled(stack, client):
+    module = stack.modules["order"]
+    customer_id = str(uuid.uuid4())
+    module.mongo.db.orders.insert_many([
+        dict(order(customer_id, 5.0), order_id=str(uuid.uuid4()), timestamp=datetime(2024, 1, day))
+        for day in (1, 2)])
+
+    # Reads never write; the summary appears once the backfill runs.
+    assert client.get(f"{ORDERS}/summary/{customer_id}").get_json()["order_count"] == 0
+    module.backfill_order_summaries()
+    summary = client.get(f"{ORDERS}/summary/{customer_id}").get_json()
+    assert summary["order_count"] == 2
+    assert summary["total_amount"] == 10.0
+
+    client.post(f"{ORDERS}/", json=order(customer_id))
+    assert client.get(f"{ORDERS}/summary/{customer_id}").get_json()["order_count"] == 3
@@ -0,0 +1,35 @@
+import uuid
+from datetime import datetime, timedelta
+
+from local_stack import mount_path
+
+PAYMENTS = f"{mount_path('payment')}/payments"
+
+
+def create_payment(client, timestamp):
+    response = client.post(f"{PAYMENTS}/", json={
+        "order_id": str(uuid.uuid4()), "amount": 5.0, "status": "pending",
+        "timestamp": timestamp, "updated": timestamp, "payment_methods": ["card"]})
+    assert response.status_code == 201
+    return response.get_json()["payment_id"]
+
+
+def test_expiry_is_measured_from_when_the_payment_was_recorded(client, stack):
+    payment_id = create_payment(client, "2020-01-01T00:00:00")
+    client.post(f"{PAYMENTS}/expiry")
+    assert client.get(f"{PAYMENTS}/{payment_id}").get_json()["status"] == "pending"
+
+    stack.modules["payment"].mongo.db.payments.update_one(
+        {"payment_id": payment_id}, {"$set": {"created": datetime.utcnow() - timedelta(days=1)}})
+    client.post(f"{PAYMENTS}/expiry")
+    payment = client.get(f"{PAYMENTS}/{payment_id}").get_json()
+    assert payment["status"] == "expired"
+    assert payment["version"] == 2
+
+
+def test_new_payments_must_be_pending(client):
+    for status in ("authorized", "captured", "failed", "expired"):
+        response = client.post(f"{PAYMENTS}/", json={
+            "order_id": str(uuid.uuid4()), "amount": 5.0, "status": status,
+            "timestamp": "2024-01-01T00:00:00", "updated": "2024-01-01T00:00:00", "payment_methods": ["card"]})
+        assert response.status_code == 400, status
@@ -0,0 +1,90 @@
+from datetime import datetime, timedelta
+
+from local_stack import mount_path
+
+INVENTORY = f"{mount_path('inventory')}/inventory"
+
+
+def stock(client, product_id):
+    return client.get(f"{INVENTORY}/{product_id}").get_json()["stock"]
+
+
+def reserve(client, product_id, quantity, **extra):
+    return client.post(f"{INVENTORY}/reservations",
+                       json={"items": [{"product_id": product_id, "quantity": quantity}], **extra})
+
+
+def test_reserve_commit_and_release(client, seed):
+    _, product_id = seed(stock=10)
+
+    held = reserve(client, product_id, 4)
+    assert held.status_code == 201
+    assert held.get_json()["status"] == "held"
+    assert stock(client, product_id) == 6
+    assert "pending_reservations" not in client.get(f"{INVENTORY}/{product_id}").get_json()
+
+    released = client.post(f"{INVENTORY}/reservations/{held.get_json()['reservation_id']}/release")
+    assert released.get_json()["status"] == "released"
+    assert stock(client, product_id) == 10
+
+    committed = reserve(client, product_id, 3).get_json()["reservation_id"]
+    assert client.post(f"{INVENTORY}/reservations/{committed}/commit").get_json()["status"] == "committed"
+    assert client.post(f"{INVENTORY}/reservations/{committed}/release").status_code == 409
+    assert stock(client, product_id) == 7
+
+
+def test_short_item_takes_no_stock(client, seed):
+    _, plenty = seed(stock=10)
+    _, scarce = seed(stock=1)
+
+    response = client.post(f"{INVENTORY}/reservations", json={"items": [
+        {"product_id": plenty, "quantity": 2}, {"product_id": scarce, "quantity": 2}]})
+    assert response.status_code == 409
+    assert (stock(client, plenty), stock(client, scarce)) == (10, 1)
+
+
+def test_interrupted_reservation_is_given_back_by_the_sweeper(client, stack, seed):
+    service = stack.modules["inventory"]
+    _, product_id = seed(stock=10)
+    now = datetime.utcnow()
+    # A request that recorded its reservation and took the stock, then died.
+    reservation = {"reservation_id": "interrupted", "reference": None, "status": "pending",
+                   "items": [{"product_id": product_id, "quantity": 4}],
+                   "created": now, "expires_at": now - timedelta(seconds=1), "updated": now}
+    service.mongo.db.reservations.insert_one(dict(reservation))
+    service.hold_stock("interrupted", product_id, 4, now)
+    assert stock(client, product_id) == 6
+
+    assert client.post(f"{INVENTORY}/reservations/expire").get_json()["released"] >= 1
+    assert stock(client, product_id) == 10
+    assert service.mongo.db.reservations.find_one({"reservation_id": "interrupted"})["status"] == "expired"
+    # Sweeping again gives nothing back twice.
+    client.post(f"{INVENTORY}/reservations/expire")
+    assert stock(client, product_id) == 10
+
+
+def test_expired_reservation_cannot_be_committed(client, stack, seed):
+    _, product_id = seed(stock=10)
+    reservation_id = reserve(client, product_id, 2).get_json()["reservation_id"]
+    stack.modules["inventory"].mongo.db.reservations.update_one(
+        {"reservation_id": reservation_id}, {"$set": {"expires_at": datetime.utcnow() - timedelta(seconds=1)}})
+
+    response = client.post(f"{INVENTORY}/reservations/{reservation_id}/commit")
+    assert response.status_code == 409
+    assert response.get_json()["message"] == "Reservation has expired"
+    client.post(f"{INVENTORY}/reservations/expire")
+    assert stock(client, product_id) == 10
+
+
+def test_list_endpoints_hide_pending_reservations(client, seed):
+    _, product_id = seed(stock=2)
+    assert reserve(client, product_id, 1).status_code == 201
+
+    for url in (f"{INVENTORY}/", f"{INVENTORY}/low-stock"):
+        entries, cursor = [], ""
+        while cursor is not None:
+            page = client.get(url, query_string={"limit": 1000, **({"after": cursor} if cursor else {})})
+            entries += page.get_json()
+            cursor = page.headers.get("X-Next-Cursor")
+        assert product_id in [entry["product_id"] for entry in entries]
+        assert all("pending_reservations" not in entry for entry in entries)
@@ -0,0 +1,56 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import Flask
+
+from upstream import client_from_env
+
+
+def slow_app(delay):
+    app = Flask(__name__)
+
+    @app.route("/customers/<customer_id>")
+    def customer(customer_id):
+        time.sleep(delay)
+        return {"customer_id": customer_id}
+
+    return app
+
+
+def test_gateway_upstreams_admit_as_many_calls_as_the_gateway(stack):
+    gateway = stack.modules["gateway"]
+    for client in gateway.upstreams.values():
+        assert client.max_concurrent == gateway.concurrency_limiter.max_in_flight
+        assert client.pool_size == client.max_concurrent
+
+
+def test_healthy_burst_is_not_rejected_by_the_bulkhead():
+    client = client_from_env("customer", "http://customer.test", max_concurrent=48)
+    client.mount_app(slow_app(0.05))
+
+    with ThreadPoolExecutor(max_workers=40) as pool:
+        statuses = list(pool.map(lambda i: client.get(f"/customers/{i}").status_code, range(40)))
+
+    assert statuses == [200] * 40
+    assert client.stats()["bulkhead_rejected"] == 0
+    assert client.stats()["peak_in_flight"] > 10
+
+
+def test_pool_follows_the_cap_unless_set(monkeypatch):
+    client = client_from_env("customer", "http://customer.test", max_concurrent=48)
+    assert client.adapter._pool_maxsize == 48
+    assert client.adapter._pool_block
+
+    monkeypatch.setenv("CUSTOMER_POOL_SIZE", "8")
+    assert client_from_env("customer", "http://customer.test", max_concurrent=48).pool_size == 8
+
+
+def test_saturation_is_relative_to_the_cap():
+    client = client_from_env("customer", "http://customer.test", max_concurrent=4)
+    client.mount_app(slow_app(0.2))
+
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        calls = [pool.submit(client.get, f"/customers/{i}") for i in range(4)]
+        time.sleep(0.02)
+        assert client.stats()["saturation"] == 1.0
+        assert all(call.result().status_code == 200 for call in calls)